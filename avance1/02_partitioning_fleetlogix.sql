@@ -0,0 +1,327 @@
+-- =====================================================
+-- FLEETLOGIX - PARTICIONAMIENTO MENSUAL DE TRIPS Y DELIVERIES
+-- Range partitioning declarativo (PostgreSQL 12+)
+-- trips por departure_datetime, deliveries por scheduled_datetime
+-- =====================================================
+
+-- Motivación: las ventanas de 2 y 6 meses (queries 4 y 6) y el extract del ETL
+-- recorrían todo el histórico. Con particiones mensuales el planner poda los
+-- meses fuera de la ventana y los meses viejos se pueden desacoplar y archivar.
+--
+-- Cambios de modelo obligados por el particionamiento:
+--   - La PK incluye la clave de partición: (trip_id, departure_datetime)
+--     y (delivery_id, scheduled_datetime).
+--   - tracking_number es UNIQUE junto con scheduled_datetime.
+--   - deliveries.trip_id ya no puede ser FOREIGN KEY hacia trips (la FK exigiría
+--     incluir departure_datetime). La integridad se valida con las consultas de
+--     CreacionBD_fleetlogix.sql y DataGenerator.validate_data_quality().
+
+-- =====================================================
+-- 1. FUNCIONES DE MANTENIMIENTO DE PARTICIONES
+-- =====================================================
+
+-- Crear particiones mensuales <parent>_pYYYY_MM entre dos meses (inclusive)
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, from_month DATE, to_month DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= to_month LOOP
+        partition_name := format('%s_p%s', parent, to_char(month_start, 'YYYY_MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent, month_start, (month_start + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mantener siempre N meses futuros creados (evita que los inserts caigan en DEFAULT).
+-- Programar a diario, p.ej. con pg_cron:
+--   SELECT cron.schedule('fleetlogix-partitions', '0 1 * * *', 'SELECT ensure_future_partitions(3)');
+CREATE OR REPLACE FUNCTION ensure_future_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    horizon DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+BEGIN
+    RETURN create_monthly_partitions('trips', CURRENT_DATE, horizon)
+         + create_monthly_partitions('deliveries', CURRENT_DATE, horizon);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Desacoplar particiones con más de keep_months meses de antigüedad.
+-- Las tablas quedan como tablas normales para exportarlas (pg_dump / S3) y borrarlas.
+-- Fuera de una transacción se puede usar DETACH PARTITION ... CONCURRENTLY a mano.
+CREATE OR REPLACE FUNCTION detach_old_partitions(parent TEXT, keep_months INTEGER)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => keep_months))::date;
+    child TEXT;
+BEGIN
+    FOR child IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent::regclass
+          AND c.relname ~ '_p[0-9]{4}_[0-9]{2}$'
+          AND to_date(right(c.relname, 7), 'YYYY_MM') < cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', parent, child);
+        RETURN NEXT child;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- 2. MIGRACIÓN DE TABLAS EXISTENTES
+-- =====================================================
+-- Ejecutar en una ventana de mantenimiento: todo corre en una sola transacción
+-- y si los conteos no coinciden se revierte completa.
+
+BEGIN;
+
+ALTER TABLE deliveries RENAME TO deliveries_legacy;
+ALTER TABLE trips RENAME TO trips_legacy;
+
+CREATE TABLE trips (
+    trip_id INTEGER NOT NULL DEFAULT nextval('trips_trip_id_seq'),
+    vehicle_id INTEGER REFERENCES vehicles(vehicle_id),
+    driver_id INTEGER REFERENCES drivers(driver_id),
+    route_id INTEGER REFERENCES routes(route_id),
+    departure_datetime TIMESTAMP NOT NULL,
+    arrival_datetime TIMESTAMP,
+    fuel_consumed_liters DECIMAL(10,2),
+    total_weight_kg DECIMAL(10,2),
+    status VARCHAR(20) DEFAULT 'in_progress'
+) PARTITION BY RANGE (departure_datetime);
+
+CREATE TABLE deliveries (
+    delivery_id INTEGER NOT NULL DEFAULT nextval('deliveries_delivery_id_seq'),
+    trip_id INTEGER NOT NULL,
+    tracking_number VARCHAR(50) NOT NULL,
+    customer_name VARCHAR(200) NOT NULL,
+    delivery_address TEXT NOT NULL,
+    package_weight_kg DECIMAL(10,2),
+    scheduled_datetime TIMESTAMP,
+    delivered_datetime TIMESTAMP,
+    delivery_status VARCHAR(20) DEFAULT 'pending',
+    recipient_signature BOOLEAN DEFAULT FALSE,
+    -- avance4/04_dynamo_sync.sql (sincronización incremental a DynamoDB)
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (scheduled_datetime);
+
+ALTER SEQUENCE trips_trip_id_seq OWNED BY trips.trip_id;
+ALTER SEQUENCE deliveries_delivery_id_seq OWNED BY deliveries.delivery_id;
+
+-- Particiones: todo el histórico (mínimo 24 meses, lo que genera DataGenerator)
+-- más 3 meses futuros, y una DEFAULT para fechas fuera de rango o NULL
+SELECT create_monthly_partitions(
+    'trips',
+    LEAST(COALESCE((SELECT MIN(departure_datetime) FROM trips_legacy)::date, CURRENT_DATE),
+          (CURRENT_DATE - INTERVAL '24 months')::date),
+    (CURRENT_DATE + INTERVAL '3 months')::date
+);
+SELECT create_monthly_partitions(
+    'deliveries',
+    LEAST(COALESCE((SELECT MIN(scheduled_datetime) FROM deliveries_legacy)::date, CURRENT_DATE),
+          (CURRENT_DATE - INTERVAL '24 months')::date),
+    (CURRENT_DATE + INTERVAL '3 months')::date
+);
+CREATE TABLE trips_default PARTITION OF trips DEFAULT;
+CREATE TABLE deliveries_default PARTITION OF deliveries DEFAULT;
+
+-- Si avance4/04_dynamo_sync.sql todavía no corrió, la tabla legacy no tiene
+-- updated_at: se agrega igual que allí para que la copia tenga la misma forma
+ALTER TABLE deliveries_legacy ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+-- Copia ordenada por la clave de partición (escritura secuencial por partición).
+-- Columnas explícitas: un SELECT * depende del orden físico de las columnas,
+-- que cambia con cada ALTER TABLE ... ADD COLUMN sobre la tabla legacy
+INSERT INTO trips (
+    trip_id, vehicle_id, driver_id, route_id, departure_datetime, arrival_datetime,
+    fuel_consumed_liters, total_weight_kg, status
+)
+SELECT
+    trip_id, vehicle_id, driver_id, route_id, departure_datetime, arrival_datetime,
+    fuel_consumed_liters, total_weight_kg, status
+FROM trips_legacy
+ORDER BY departure_datetime;
+
+INSERT INTO deliveries (
+    delivery_id, trip_id, tracking_number, customer_name, delivery_address, package_weight_kg,
+    scheduled_datetime, delivered_datetime, delivery_status, recipient_signature, updated_at
+)
+SELECT
+    delivery_id, trip_id, tracking_number, customer_name, delivery_address, package_weight_kg,
+    scheduled_datetime, delivered_datetime, delivery_status, recipient_signature, updated_at
+FROM deliveries_legacy
+ORDER BY scheduled_datetime;
+
+DO $$
+BEGIN
+    IF (SELECT COUNT(*) FROM trips) <> (SELECT COUNT(*) FROM trips_legacy)
+       OR (SELECT COUNT(*) FROM deliveries) <> (SELECT COUNT(*) FROM deliveries_legacy) THEN
+        RAISE EXCEPTION 'Migración abortada: los conteos no coinciden';
+    END IF;
+END;
+$$;
+
+DROP TABLE deliveries_legacy;
+DROP TABLE trips_legacy;
+
+-- Constraints e índices después de la carga (se propagan a cada partición)
+ALTER TABLE trips ADD CONSTRAINT trips_pkey PRIMARY KEY (trip_id, departure_datetime);
+ALTER TABLE deliveries ADD CONSTRAINT deliveries_pkey PRIMARY KEY (delivery_id, scheduled_datetime);
+ALTER TABLE deliveries ADD CONSTRAINT deliveries_tracking_number_key UNIQUE (tracking_number, scheduled_datetime);
+
+-- Búsqueda por id sin clave de partición y JOIN deliveries -> trips
+CREATE INDEX idx_trips_trip_id ON trips(trip_id);
+CREATE INDEX idx_deliveries_trip_id ON deliveries(trip_id);
+
+-- Índices de CreacionBD_fleetlogix.sql y 03_optimization_indexes.sql
+CREATE INDEX idx_trips_departure ON trips(departure_datetime);
+CREATE INDEX idx_deliveries_status ON deliveries(delivery_status);
+CREATE INDEX idx_trips_composite_joins ON trips(vehicle_id, driver_id, route_id, departure_datetime)
+WHERE status = 'completed';
+CREATE INDEX idx_deliveries_scheduled_datetime ON deliveries(scheduled_datetime, delivery_status)
+WHERE delivery_status = 'delivered';
+CREATE INDEX idx_deliveries_delivered_datetime ON deliveries(delivered_datetime);
+-- Rango de la sincronización incremental de avance4/04_dynamo_sync.sql
+CREATE INDEX idx_deliveries_updated_at ON deliveries(updated_at);
+
+COMMENT ON TABLE trips IS 'Registro de viajes realizados (particionada por mes de departure_datetime)';
+COMMENT ON TABLE deliveries IS 'Entregas individuales asociadas a cada viaje (particionada por mes de scheduled_datetime)';
+
+-- Los triggers de avance2/04_kpi_summary_tables.sql y 06_high_water_marks.sql vivían en las tablas legacy
+DO $$
+BEGIN
+    IF to_regproc('kpi_mark_trips_dirty') IS NOT NULL THEN
+        CREATE TRIGGER trg_kpi_trips_ins AFTER INSERT ON trips
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_trips_dirty();
+        CREATE TRIGGER trg_kpi_trips_upd AFTER UPDATE ON trips
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_trips_dirty();
+        CREATE TRIGGER trg_kpi_trips_del AFTER DELETE ON trips
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_trips_dirty();
+        CREATE TRIGGER trg_kpi_deliveries_ins AFTER INSERT ON deliveries
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_deliveries_dirty();
+        CREATE TRIGGER trg_kpi_deliveries_upd AFTER UPDATE ON deliveries
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_deliveries_dirty();
+        CREATE TRIGGER trg_kpi_deliveries_del AFTER DELETE ON deliveries
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_deliveries_dirty();
+    END IF;
+
+    -- Triggers de avance2/06_high_water_marks.sql
+    IF to_regproc('hw_track_changes') IS NOT NULL THEN
+        CREATE TRIGGER trg_hw_trips_ins AFTER INSERT ON trips
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('departure_datetime');
+        CREATE TRIGGER trg_hw_trips_upd AFTER UPDATE ON trips
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('departure_datetime');
+        CREATE TRIGGER trg_hw_trips_del AFTER DELETE ON trips
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('departure_datetime');
+        CREATE TRIGGER trg_hw_trips_truncate AFTER TRUNCATE ON trips
+            FOR EACH STATEMENT EXECUTE FUNCTION hw_reset();
+        CREATE TRIGGER trg_hw_deliveries_ins AFTER INSERT ON deliveries
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('scheduled_datetime', 'delivered_datetime');
+        CREATE TRIGGER trg_hw_deliveries_upd AFTER UPDATE ON deliveries
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('scheduled_datetime', 'delivered_datetime');
+        CREATE TRIGGER trg_hw_deliveries_del AFTER DELETE ON deliveries
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('scheduled_datetime', 'delivered_datetime');
+        CREATE TRIGGER trg_hw_deliveries_truncate AFTER TRUNCATE ON deliveries
+            FOR EACH STATEMENT EXECUTE FUNCTION hw_reset();
+    END IF;
+
+    -- Trigger de avance4/04_dynamo_sync.sql (BEFORE por fila en una tabla
+    -- particionada: PostgreSQL 13+)
+    IF to_regproc('deliveries_touch_updated_at') IS NOT NULL THEN
+        CREATE TRIGGER trg_deliveries_updated_at BEFORE UPDATE ON deliveries
+            FOR EACH ROW EXECUTE FUNCTION deliveries_touch_updated_at();
+    END IF;
+END;
+$$;
+
+COMMIT;
+
+ANALYZE trips;
+ANALYZE deliveries;
+
+-- =====================================================
+-- 3. VERIFICACIÓN
+-- =====================================================
+
+-- Filas por partición
+SELECT
+    i.inhparent::regclass AS tabla,
+    c.relname AS particion,
+    c.reltuples::bigint AS filas_estimadas
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent IN ('trips'::regclass, 'deliveries'::regclass)
+ORDER BY 1, 2;
+
+-- Deliveries sin trip válido (reemplaza a la FK deliveries -> trips)
+SELECT COUNT(*)
+FROM deliveries d
+LEFT JOIN trips t ON d.trip_id = t.trip_id
+WHERE t.trip_id IS NULL;
+
+-- =====================================================
+-- 4. QUERIES CON PODA DE PARTICIONES
+-- =====================================================
+-- La ventana de las queries 4 y 6 filtra por delivered_datetime, que no es la
+-- clave de partición. Se agrega un predicado redundante sobre scheduled_datetime:
+-- DataGenerator entrega como máximo 180 min después de lo programado, así que
+-- 1 día de margen no cambia el resultado y permite podar en ejecución
+-- (el plan muestra las particiones viejas como "never executed").
+
+--Query 4 (particionada): Total de entregas por ciudad (últimos 2 meses)
+
+explain ANALYZE
+select
+	count(d.delivery_id) as volumen_de_entregas,
+	SUM(d.package_weight_kg) as peso_total,
+	r.destination_city
+from deliveries as d
+inner join trips as t
+on t.trip_id = d.trip_id
+inner join routes as r
+on r.route_id = t.route_id
+where d.delivered_datetime  >= (select max(departure_Datetime) from trips) - interval '2 months'
+and d.scheduled_datetime >= (select max(departure_Datetime) from trips) - interval '2 months' - interval '1 day'
+group by r.destination_city;
+
+--Query 6 (particionada): Promedio de entregas por conductor (6 meses)
+
+explain ANALYZE
+select
+	concat(dr.first_name, ' ', dr.last_name) as full_name,
+	count(d.delivery_id) as total_deliveries,
+	COUNT(d.delivery_id) / 6 AS promedio_mensual_entregas
+from drivers as dr
+left join trips as t
+on t.driver_id = dr.driver_id
+left join deliveries as d
+on d.trip_id = t.trip_id
+where d.delivered_datetime >= (select max(delivered_datetime) from deliveries) - INTERVAL '6 months'
+and d.scheduled_datetime >= (select max(delivered_datetime) from deliveries) - INTERVAL '6 months' - INTERVAL '1 day'
+group by dr.first_name, dr.last_name
+order by total_deliveries desc;
@@ -0,0 +1,321 @@
+-- =====================================================
+-- FLEETLOGIX - TABLAS RESUMEN DE KPIs (REFRESCO INCREMENTAL)
+-- Pre-agregados por conductor / ruta / vehículo y día
+-- Objetivo: queries 6, 7, 9 y 10 en milisegundos sin importar el histórico
+-- =====================================================
+
+-- Las queries 6, 7 y 10 de 02_queries_analysis.sql re-agregan todo el JOIN
+-- deliveries ⋈ trips ⋈ drivers en cada ejecución (180-200 ms aun con índices).
+-- Aquí se materializa ese JOIN a granularidad diaria y se refresca solo
+-- para los días tocados por inserts/updates/deletes (cola kpi_dirty_days).
+
+-- =====================================================
+-- 1. TABLAS RESUMEN
+-- =====================================================
+
+-- Entregas por conductor y día de entrega (delivered_datetime::date)
+-- Beneficia: Query 6 (6 meses), Query 10 (ranking de eficiencia)
+CREATE TABLE IF NOT EXISTS kpi_driver_daily (
+    driver_id INTEGER NOT NULL,
+    kpi_date DATE NOT NULL,
+    deliveries_delivered INTEGER NOT NULL,      -- delivered_datetime IS NOT NULL
+    deliveries_scored INTEGER NOT NULL,         -- con scheduled y delivered
+    deliveries_on_time INTEGER NOT NULL,        -- delivered <= scheduled
+    total_kg DECIMAL(14,2) NOT NULL,            -- peso de las entregas con scheduled y delivered
+    PRIMARY KEY (driver_id, kpi_date)
+);
+
+-- Viajes por ruta y día de salida (departure_datetime::date)
+-- Beneficia: Query 7 (consumo por ruta)
+CREATE TABLE IF NOT EXISTS kpi_route_daily (
+    route_id INTEGER NOT NULL,
+    kpi_date DATE NOT NULL,
+    trips INTEGER NOT NULL,
+    total_distance_km DECIMAL(14,2) NOT NULL,
+    total_fuel_liters DECIMAL(14,2) NOT NULL,
+    PRIMARY KEY (route_id, kpi_date)
+);
+
+-- Viajes por vehículo y día de salida
+-- Beneficia: Query 9 (costo de mantenimiento por km)
+CREATE TABLE IF NOT EXISTS kpi_vehicle_daily (
+    vehicle_id INTEGER NOT NULL,
+    kpi_date DATE NOT NULL,
+    trips INTEGER NOT NULL,
+    total_distance_km DECIMAL(14,2) NOT NULL,
+    total_fuel_liters DECIMAL(14,2) NOT NULL,
+    PRIMARY KEY (vehicle_id, kpi_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_kpi_driver_daily_date ON kpi_driver_daily(kpi_date);
+
+-- Cola de días pendientes de recalcular
+CREATE TABLE IF NOT EXISTS kpi_dirty_days (
+    kpi_date DATE PRIMARY KEY
+);
+
+-- El refresco por día filtra deliveries por rango de delivered_datetime
+CREATE INDEX IF NOT EXISTS idx_deliveries_delivered_datetime ON deliveries(delivered_datetime);
+
+-- =====================================================
+-- 2. TRIGGERS: MARCAR DÍAS MODIFICADOS
+-- =====================================================
+-- Triggers por sentencia con transition tables: un INSERT masivo de
+-- DataGenerator (execute_batch) marca cada día una sola vez, sin costo por fila.
+
+CREATE OR REPLACE FUNCTION kpi_mark_trips_dirty() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO kpi_dirty_days
+        SELECT DISTINCT departure_datetime::date FROM new_rows
+        ON CONFLICT DO NOTHING;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO kpi_dirty_days
+        SELECT DISTINCT departure_datetime::date FROM old_rows
+        ON CONFLICT DO NOTHING;
+
+        -- Cambiar el conductor de un viaje afecta a los días de sus entregas
+        INSERT INTO kpi_dirty_days
+        SELECT DISTINCT del.delivered_datetime::date
+        FROM old_rows o
+        JOIN deliveries del ON del.trip_id = o.trip_id
+        WHERE del.delivered_datetime IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION kpi_mark_deliveries_dirty() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO kpi_dirty_days
+        SELECT DISTINCT delivered_datetime::date FROM new_rows
+        WHERE delivered_datetime IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO kpi_dirty_days
+        SELECT DISTINCT delivered_datetime::date FROM old_rows
+        WHERE delivered_datetime IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- PostgreSQL exige un trigger por evento cuando se usan transition tables
+DROP TRIGGER IF EXISTS trg_kpi_trips_ins ON trips;
+DROP TRIGGER IF EXISTS trg_kpi_trips_upd ON trips;
+DROP TRIGGER IF EXISTS trg_kpi_trips_del ON trips;
+CREATE TRIGGER trg_kpi_trips_ins AFTER INSERT ON trips
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_trips_dirty();
+CREATE TRIGGER trg_kpi_trips_upd AFTER UPDATE ON trips
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_trips_dirty();
+CREATE TRIGGER trg_kpi_trips_del AFTER DELETE ON trips
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_trips_dirty();
+
+DROP TRIGGER IF EXISTS trg_kpi_deliveries_ins ON deliveries;
+DROP TRIGGER IF EXISTS trg_kpi_deliveries_upd ON deliveries;
+DROP TRIGGER IF EXISTS trg_kpi_deliveries_del ON deliveries;
+CREATE TRIGGER trg_kpi_deliveries_ins AFTER INSERT ON deliveries
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_deliveries_dirty();
+CREATE TRIGGER trg_kpi_deliveries_upd AFTER UPDATE ON deliveries
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_deliveries_dirty();
+CREATE TRIGGER trg_kpi_deliveries_del AFTER DELETE ON deliveries
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION kpi_mark_deliveries_dirty();
+
+-- =====================================================
+-- 3. REFRESCO INCREMENTAL
+-- =====================================================
+-- Recalcula solo los días en kpi_dirty_days (DELETE + INSERT por día).
+-- Programar cada pocos minutos, p.ej. con pg_cron:
+--   SELECT cron.schedule('kpi-refresh', '*/5 * * * *', 'SELECT refresh_kpi_summaries()');
+
+CREATE OR REPLACE FUNCTION refresh_kpi_summaries() RETURNS INTEGER AS $$
+DECLARE
+    dirty DATE[];
+BEGIN
+    -- Tomar y vaciar la cola en un solo paso
+    WITH taken AS (
+        DELETE FROM kpi_dirty_days RETURNING kpi_date
+    )
+    SELECT array_agg(kpi_date) INTO dirty FROM taken;
+
+    IF dirty IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    DELETE FROM kpi_driver_daily WHERE kpi_date = ANY(dirty);
+    INSERT INTO kpi_driver_daily
+    SELECT
+        t.driver_id,
+        d.day,
+        COUNT(*),
+        COUNT(del.scheduled_datetime),
+        SUM(CASE WHEN del.delivered_datetime <= del.scheduled_datetime THEN 1 ELSE 0 END),
+        COALESCE(SUM(del.package_weight_kg) FILTER (WHERE del.scheduled_datetime IS NOT NULL), 0)
+    FROM unnest(dirty) AS d(day)
+    JOIN deliveries del
+        ON del.delivered_datetime >= d.day
+        AND del.delivered_datetime < d.day + 1
+    JOIN trips t ON t.trip_id = del.trip_id
+    WHERE t.driver_id IS NOT NULL
+    GROUP BY t.driver_id, d.day;
+
+    DELETE FROM kpi_route_daily WHERE kpi_date = ANY(dirty);
+    INSERT INTO kpi_route_daily
+    SELECT
+        t.route_id,
+        d.day,
+        COUNT(*),
+        COALESCE(SUM(r.distance_km), 0),
+        COALESCE(SUM(t.fuel_consumed_liters), 0)
+    FROM unnest(dirty) AS d(day)
+    JOIN trips t
+        ON t.departure_datetime >= d.day
+        AND t.departure_datetime < d.day + 1
+    JOIN routes r ON r.route_id = t.route_id
+    GROUP BY t.route_id, d.day;
+
+    DELETE FROM kpi_vehicle_daily WHERE kpi_date = ANY(dirty);
+    INSERT INTO kpi_vehicle_daily
+    SELECT
+        t.vehicle_id,
+        d.day,
+        COUNT(*),
+        COALESCE(SUM(r.distance_km), 0),
+        COALESCE(SUM(t.fuel_consumed_liters), 0)
+    FROM unnest(dirty) AS d(day)
+    JOIN trips t
+        ON t.departure_datetime >= d.day
+        AND t.departure_datetime < d.day + 1
+    JOIN routes r ON r.route_id = t.route_id
+    WHERE t.vehicle_id IS NOT NULL
+    GROUP BY t.vehicle_id, d.day;
+
+    RETURN array_length(dirty, 1);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carga inicial: marcar todo el histórico y refrescar una vez
+INSERT INTO kpi_dirty_days
+SELECT DISTINCT departure_datetime::date FROM trips
+UNION
+SELECT DISTINCT delivered_datetime::date FROM deliveries WHERE delivered_datetime IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+SELECT refresh_kpi_summaries() AS dias_refrescados;
+
+ANALYZE kpi_driver_daily;
+ANALYZE kpi_route_daily;
+ANALYZE kpi_vehicle_daily;
+
+-- =====================================================
+-- 4. QUERIES REESCRITAS SOBRE LAS TABLAS RESUMEN
+-- =====================================================
+
+--Query 6 (resumen): Promedio de entregas por conductor (6 meses)
+--Nota: la ventana se ancla al último día con entregas (granularidad diaria),
+--no al timestamp exacto de max(delivered_datetime).
+
+explain ANALYZE
+select
+	concat(dr.first_name, ' ', dr.last_name) as full_name,
+	sum(k.deliveries_delivered) as total_deliveries,
+	sum(k.deliveries_delivered) / 6 AS promedio_mensual_entregas
+from kpi_driver_daily as k
+join drivers as dr
+on dr.driver_id = k.driver_id
+where k.kpi_date >= ((select max(kpi_date) from kpi_driver_daily) - INTERVAL '6 months')::date
+group by dr.first_name, dr.last_name
+order by total_deliveries desc;
+
+--Query 7 (resumen): Rutas con mayor consumo de combustible
+--Nota: el refresh guarda COALESCE(..., 0) en total_fuel_liters, así que una ruta
+--sin consumo registrado suma 0; NULLIF evita la división por cero y la deja al final.
+
+explain ANALYZE
+select
+	concat(r.origin_City, ' a ', r.destination_city),
+	sum(k.total_distance_km) as distancia_Recorrida,
+	sum(k.total_fuel_liters) as combustible_consumido,
+	(sum(k.total_distance_km) / NULLIF(sum(k.total_fuel_liters), 0) * 100) as litros_100km
+from kpi_route_daily as k
+inner join routes as r
+on r.route_id = k.route_id
+group by r.origin_city, r.destination_city
+order by litros_100km desc nulls last
+limit 10;
+
+--Query 9 (resumen): Costo de mantenimiento por kilómetro
+
+explain ANALYZE
+with km_por_vehiculos as (
+	select
+		vehicle_id,
+		SUM(total_distance_km) as total_km
+	from kpi_vehicle_daily
+	group by vehicle_id
+	),
+	costo_mantenimiento_por_vehiculo as (
+	select
+		v.vehicle_id,
+		v.vehicle_type,
+		sum(m.cost) as costo_mantenimiento
+	from maintenance m
+	join vehicles as v
+	on v.vehicle_id = m.vehicle_id
+	group by v.vehicle_id
+	)
+select
+	c.vehicle_type,
+	round(sum(c.costo_mantenimiento)/sum(k.total_km),2) as costo_mantenimiento_km,
+	sum(k.total_km) as total_km,
+	sum(c.costo_mantenimiento) as costo_mantenimiento_total
+from costo_mantenimiento_por_vehiculo as c
+join km_por_vehiculos as k
+on k.vehicle_id = c.vehicle_id
+group by c.vehicle_type ;
+
+--Query 10 (resumen): Ranking de conductores por eficiencia
+
+explain ANALYZE
+WITH driver_ranking AS (
+  SELECT
+    d.driver_id,
+    d.first_name,
+    d.last_name,
+    SUM(k.total_kg) AS total_kg,
+    SUM(k.deliveries_on_time) AS entregas_a_tiempo,
+    SUM(k.deliveries_scored) AS entregas_totales
+  FROM kpi_driver_daily as k
+  JOIN drivers as d
+  		ON d.driver_id = k.driver_id
+  GROUP BY d.driver_id, d.first_name, d.last_name
+  HAVING SUM(k.deliveries_scored) > 0
+)
+SELECT
+  RANK() OVER (
+    ORDER BY (total_kg * (entregas_a_tiempo::numeric / nullif (entregas_totales, 0))) DESC
+  ) AS rank,
+  driver_id,
+  concat(first_name, ' ' ,last_name),
+  total_kg,
+  entregas_a_tiempo,
+  entregas_totales,
+  ROUND(100.0 *(entregas_a_tiempo::numeric / nullif(entregas_totales, 0)), 2) AS porcent_a_tiempo
+FROM driver_ranking
+ORDER BY rank
+LIMIT 20;
@@ -0,0 +1,76 @@
+-- =====================================================
+-- FLEETLOGIX - ÍNDICES BRIN Y COVERING PARA COLUMNAS DE TIEMPO
+-- trips y deliveries se insertan casi en orden cronológico
+-- (append-only), así que un BRIN de pocos KB reemplaza a los
+-- B-tree de varios cientos de MB sobre las columnas datetime
+-- Requiere: CreacionBD_fleetlogix.sql y 03_optimization_indexes.sql
+-- Compatible con 02_partitioning_fleetlogix.sql (BRIN por partición)
+-- Medir antes/después con: python benchmark_time_indexes.py
+-- =====================================================
+
+BEGIN;
+
+-- =====================================================
+-- 1. Quitar los B-tree sobre columnas de tiempo
+-- =====================================================
+DROP INDEX IF EXISTS idx_trips_departure;
+DROP INDEX IF EXISTS idx_deliveries_scheduled_datetime;
+DROP INDEX IF EXISTS idx_deliveries_delivered_datetime;   -- 04_kpi_summary_tables.sql
+
+-- =====================================================
+-- 2. BRIN para los rangos de fechas
+-- =====================================================
+-- Justificación: queries 4, 6 y 10, el extract del ETL y el refresh de KPIs
+-- filtran por ventanas de tiempo; con datos en orden físico cada rango de
+-- 32 páginas guarda solo min/max y el bitmap descarta el resto de la tabla.
+-- autosummarize resume los rangos nuevos sin esperar al VACUUM.
+CREATE INDEX idx_trips_departure_brin ON trips
+USING brin (departure_datetime) WITH (pages_per_range = 32, autosummarize = on);
+
+CREATE INDEX idx_deliveries_scheduled_brin ON deliveries
+USING brin (scheduled_datetime) WITH (pages_per_range = 32, autosummarize = on);
+
+CREATE INDEX idx_deliveries_delivered_brin ON deliveries
+USING brin (delivered_datetime) WITH (pages_per_range = 32, autosummarize = on);
+
+-- =====================================================
+-- 3. B-tree covering para los JOIN del extract del ETL
+-- =====================================================
+-- Justificación: el extract de avance3_dw.py une deliveries ⋈ trips por
+-- trip_id y solo lee estas columnas de trips; con INCLUDE el lado de trips
+-- se resuelve con Index Only Scan sin visitar el heap.
+-- Reemplaza a idx_trips_trip_id / idx_deliveries_trip_id del particionamiento.
+DROP INDEX IF EXISTS idx_trips_trip_id;
+DROP INDEX IF EXISTS idx_deliveries_trip_id;
+
+CREATE INDEX idx_trips_trip_id_covering ON trips(trip_id)
+INCLUDE (vehicle_id, driver_id, route_id, departure_datetime, arrival_datetime, fuel_consumed_liters);
+
+CREATE INDEX idx_deliveries_trip_id_covering ON deliveries(trip_id)
+INCLUDE (delivery_status, package_weight_kg, scheduled_datetime, delivered_datetime);
+
+COMMIT;
+
+-- CREATE INDEX ya resume todos los rangos existentes
+ANALYZE trips;
+ANALYZE deliveries;
+
+-- =====================================================
+-- COMANDOS PARA VERIFICAR TAMAÑOS
+-- =====================================================
+SELECT
+    relname AS tabla,
+    indexrelname AS indice,
+    pg_size_pretty(pg_relation_size(indexrelid)) AS tamaño
+FROM pg_stat_user_indexes
+WHERE relname LIKE 'trips%' OR relname LIKE 'deliveries%'
+ORDER BY pg_relation_size(indexrelid) DESC;
+
+-- =====================================================
+-- VOLVER A B-TREE (si alguna query empeora)
+-- =====================================================
+-- DROP INDEX idx_trips_departure_brin, idx_deliveries_scheduled_brin, idx_deliveries_delivered_brin;
+-- CREATE INDEX idx_trips_departure ON trips(departure_datetime);
+-- CREATE INDEX idx_deliveries_scheduled_datetime ON deliveries(scheduled_datetime, delivery_status)
+-- WHERE delivery_status = 'delivered';
+-- CREATE INDEX idx_deliveries_delivered_datetime ON deliveries(delivered_datetime);
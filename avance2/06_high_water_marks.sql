@@ -0,0 +1,198 @@
+-- =====================================================
+-- FLEETLOGIX - HIGH-WATER MARKS (MÁXIMOS PRECALCULADOS)
+-- Timestamp máximo y conteo de filas por tabla, mantenidos por triggers
+-- Objetivo: que las queries 4 y 6 y el extract del ETL no recalculen
+-- max() en cada ejecución
+-- =====================================================
+
+-- Query 4 ancla su ventana en (select max(departure_Datetime) from trips),
+-- Query 6 en (select max(delivered_datetime) from deliveries) y el ETL en
+-- (select max(scheduled_datetime) from deliveries). Cada llamada hace un
+-- probe extra al índice (o un Seq Scan completo sin índice) y bajo
+-- concurrencia de dashboards esos probes se acumulan.
+-- Aquí el máximo se lee de una fila de high_water_marks.
+
+-- =====================================================
+-- 1. TABLA DE METADATOS
+-- =====================================================
+
+-- Una fila por columna de tiempo; row_count es el conteo de la tabla
+-- (se repite en cada columna de la misma tabla)
+CREATE TABLE IF NOT EXISTS high_water_marks (
+    table_name VARCHAR(50) NOT NULL,
+    column_name VARCHAR(50) NOT NULL,
+    max_value TIMESTAMP,
+    row_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (table_name, column_name)
+);
+
+COMMENT ON TABLE high_water_marks IS 'Máximo timestamp y conteo de filas por tabla, mantenidos por triggers';
+
+-- =====================================================
+-- 2. TRIGGERS DE MANTENIMIENTO
+-- =====================================================
+
+-- Triggers por sentencia con transition tables: un UPDATE por columna
+-- y por sentencia (no por fila). Los argumentos del trigger son las
+-- columnas de tiempo a seguir.
+-- Nota: la fila de high_water_marks queda bloqueada hasta el COMMIT, así que
+-- dos transacciones que insertan en la misma tabla se serializan en ese punto.
+CREATE OR REPLACE FUNCTION hw_track_changes() RETURNS TRIGGER AS $$
+DECLARE
+    col TEXT;
+    new_max TIMESTAMP;
+    old_max TIMESTAMP;
+    new_count BIGINT;
+    old_count BIGINT;
+    current_max TIMESTAMP;
+BEGIN
+    FOREACH col IN ARRAY TG_ARGV LOOP
+        new_max := NULL; old_max := NULL;
+        new_count := 0; old_count := 0;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            EXECUTE format('SELECT max(%I), count(*) FROM new_rows', col) INTO new_max, new_count;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            EXECUTE format('SELECT max(%I), count(*) FROM old_rows', col) INTO old_max, old_count;
+        END IF;
+
+        UPDATE high_water_marks
+        SET max_value = GREATEST(max_value, new_max),
+            row_count = row_count + new_count - old_count,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE table_name = TG_TABLE_NAME AND column_name = col
+        RETURNING max_value INTO current_max;
+
+        -- Se borró o modificó la fila del máximo (raro en tablas append-only): recalcular
+        IF old_max IS NOT NULL AND old_max >= current_max THEN
+            EXECUTE format('SELECT max(%I) FROM %I', col, TG_TABLE_NAME) INTO current_max;
+            UPDATE high_water_marks
+            SET max_value = current_max
+            WHERE table_name = TG_TABLE_NAME AND column_name = col;
+        END IF;
+    END LOOP;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- TRUNCATE no tiene transition tables: se reinicia la tabla completa
+CREATE OR REPLACE FUNCTION hw_reset() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE high_water_marks
+    SET max_value = NULL, row_count = 0, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+BEGIN;
+
+-- Bloquear escrituras mientras se toma el conteo inicial y se crean los triggers
+LOCK TABLE trips, deliveries IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_hw_trips_ins ON trips;
+DROP TRIGGER IF EXISTS trg_hw_trips_upd ON trips;
+DROP TRIGGER IF EXISTS trg_hw_trips_del ON trips;
+DROP TRIGGER IF EXISTS trg_hw_trips_truncate ON trips;
+DROP TRIGGER IF EXISTS trg_hw_deliveries_ins ON deliveries;
+DROP TRIGGER IF EXISTS trg_hw_deliveries_upd ON deliveries;
+DROP TRIGGER IF EXISTS trg_hw_deliveries_del ON deliveries;
+DROP TRIGGER IF EXISTS trg_hw_deliveries_truncate ON deliveries;
+
+CREATE TRIGGER trg_hw_trips_ins AFTER INSERT ON trips
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('departure_datetime');
+CREATE TRIGGER trg_hw_trips_upd AFTER UPDATE ON trips
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('departure_datetime');
+CREATE TRIGGER trg_hw_trips_del AFTER DELETE ON trips
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('departure_datetime');
+CREATE TRIGGER trg_hw_trips_truncate AFTER TRUNCATE ON trips
+    FOR EACH STATEMENT EXECUTE FUNCTION hw_reset();
+
+CREATE TRIGGER trg_hw_deliveries_ins AFTER INSERT ON deliveries
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('scheduled_datetime', 'delivered_datetime');
+CREATE TRIGGER trg_hw_deliveries_upd AFTER UPDATE ON deliveries
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('scheduled_datetime', 'delivered_datetime');
+CREATE TRIGGER trg_hw_deliveries_del AFTER DELETE ON deliveries
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION hw_track_changes('scheduled_datetime', 'delivered_datetime');
+CREATE TRIGGER trg_hw_deliveries_truncate AFTER TRUNCATE ON deliveries
+    FOR EACH STATEMENT EXECUTE FUNCTION hw_reset();
+
+-- =====================================================
+-- 3. CARGA INICIAL
+-- =====================================================
+INSERT INTO high_water_marks (table_name, column_name, max_value, row_count)
+SELECT 'trips', 'departure_datetime', max(departure_datetime), count(*) FROM trips
+UNION ALL
+SELECT 'deliveries', 'scheduled_datetime', max(scheduled_datetime), count(*) FROM deliveries
+UNION ALL
+SELECT 'deliveries', 'delivered_datetime', max(delivered_datetime), count(*) FROM deliveries
+ON CONFLICT (table_name, column_name) DO UPDATE
+SET max_value = EXCLUDED.max_value,
+    row_count = EXCLUDED.row_count,
+    updated_at = CURRENT_TIMESTAMP;
+
+COMMIT;
+
+-- =====================================================
+-- 4. VERIFICACIÓN
+-- =====================================================
+
+-- Debe coincidir con max()/count(*) reales
+SELECT
+    h.table_name,
+    h.column_name,
+    h.max_value,
+    h.row_count,
+    h.updated_at
+FROM high_water_marks h
+ORDER BY h.table_name, h.column_name;
+
+-- =====================================================
+-- 5. QUERIES REESCRITAS (mismo resultado que 02_queries_analysis.sql)
+-- =====================================================
+
+--Query 4 (high-water): Total de entregas por ciudad (últimos 2 meses, 60 días)
+
+explain ANALYZE
+select
+	count(d.delivery_id) as volumen_de_entregas,
+	SUM(d.package_weight_kg) as peso_total,
+	r.destination_city
+from deliveries as d
+inner join trips as t
+on t.trip_id = d.trip_id
+inner join routes as r
+on r.route_id = t.route_id
+where d.delivered_datetime >= (
+	select max_value from high_water_marks
+	where table_name = 'trips' and column_name = 'departure_datetime'
+) - interval '2 months'
+group by r.destination_city;
+
+--Query 6 (high-water): Promedio de entregas por conductor (6 meses)
+
+explain ANALYZE
+select
+	concat(dr.first_name, ' ', dr.last_name) as full_name,
+	count(d.delivery_id) as total_deliveries,
+	COUNT(d.delivery_id) / 6 AS promedio_mensual_entregas
+from drivers as dr
+left join trips as t
+on t.driver_id = dr.driver_id
+left join deliveries as d
+on d.trip_id = t.trip_id
+where d.delivered_datetime >= (
+	select max_value from high_water_marks
+	where table_name = 'deliveries' and column_name = 'delivered_datetime'
+) - INTERVAL '6 months'
+group by dr.first_name, dr.last_name
+order by total_deliveries desc;
@@ -0,0 +1,249 @@
+"""
+FleetLogix - Benchmark de Queries de Análisis
+Ejecuta las queries numeradas de 02_queries_analysis.sql con warmup y
+varias repeticiones, captura EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+y compara mediana/p95 contra un baseline guardado
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SQL_FILE = os.path.join(BASE_DIR, '02_queries_analysis.sql')
+DATA_GENERATION_FILE = os.path.join(BASE_DIR, '..', 'avance1', '01.data_generation.py')
+
+POSTGRES_CONFIG = {
+    'host': os.getenv('POSTGRES_HOST', 'localhost'),
+    'database': os.getenv('POSTGRES_DB', 'fleetlogix'),
+    'user': os.getenv('POSTGRES_USER', 'postgres'),
+    'password': os.getenv('POSTGRES_PASSWORD'),
+    'port': int(os.getenv('POSTGRES_PORT', '5432'))
+}
+
+# Volúmenes de main() en 01.data_generation.py (escala 1.0)
+BASE_VOLUMES = {
+    'trips': 100000,
+    'deliveries': 400000,
+    'maintenance': 5000
+}
+
+QUERY_HEADER = re.compile(r'^--\s*Query\s+(\d+[^:]*):\s*(.*)$', re.IGNORECASE)
+EXPLAIN_PREFIX = re.compile(r'^\s*explain\s+analyze\b\s*', re.IGNORECASE)
+
+
+def load_queries(sql_file: str) -> List[Dict]:
+    """
+    Extraer las queries numeradas del archivo SQL.
+    Cada bloque empieza con '--Query N: título' y la query es la sentencia
+    'explain ANALYZE ...;' que le sigue (sin el prefijo EXPLAIN).
+    """
+    with open(sql_file, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+
+    queries = []
+    current = None
+    statement = []
+    for line in lines:
+        header = QUERY_HEADER.match(line.strip())
+        if header:
+            current = {'id': header.group(1).strip(), 'title': header.group(2).strip()}
+            statement = []
+            continue
+        if current is None:
+            continue
+        if not statement and not EXPLAIN_PREFIX.match(line):
+            continue
+        statement.append(line)
+        if line.rstrip().endswith(';'):
+            sql = EXPLAIN_PREFIX.sub('', '\n'.join(statement), count=1).rstrip().rstrip(';')
+            queries.append(dict(current, sql=sql))
+            current = None
+            statement = []
+    return queries
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil con interpolación lineal (pct entre 0 y 100)"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def run_query(cursor, sql: str, warmup: int, runs: int) -> Dict:
+    """Ejecutar una query con warmup y devolver estadísticas de N corridas"""
+    explain = f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"
+    for _ in range(warmup):
+        cursor.execute(explain)
+        cursor.fetchall()
+
+    execution_ms, planning_ms, hit_blocks, read_blocks = [], [], [], []
+    for _ in range(runs):
+        cursor.execute(explain)
+        result = cursor.fetchone()[0]
+        plan = (json.loads(result) if isinstance(result, str) else result)[0]
+        execution_ms.append(plan['Execution Time'])
+        planning_ms.append(plan['Planning Time'])
+        hit_blocks.append(plan['Plan'].get('Shared Hit Blocks', 0))
+        read_blocks.append(plan['Plan'].get('Shared Read Blocks', 0))
+
+    return {
+        'runs': runs,
+        'median_ms': round(statistics.median(execution_ms), 3),
+        'p95_ms': round(percentile(execution_ms, 95), 3),
+        'min_ms': round(min(execution_ms), 3),
+        'max_ms': round(max(execution_ms), 3),
+        'planning_median_ms': round(statistics.median(planning_ms), 3),
+        'shared_hit_blocks': int(statistics.median(hit_blocks)),
+        'shared_read_blocks': int(statistics.median(read_blocks)),
+        'root_node': plan['Plan']['Node Type']
+    }
+
+
+def generate_database(config: Dict, scale: float):
+    """Regenerar los datos con DataGenerator (avance1) a la escala indicada"""
+    spec = importlib.util.spec_from_file_location('data_generation', DATA_GENERATION_FILE)
+    data_generation = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(data_generation)
+
+    generator = data_generation.DataGenerator(config)
+    if not generator.connect():
+        raise RuntimeError("No se pudo conectar para generar datos")
+    try:
+        generator.cursor.execute("""
+            TRUNCATE maintenance, deliveries, trips, routes, drivers, vehicles
+            RESTART IDENTITY CASCADE
+        """)
+        generator.connection.commit()
+
+        generator.generate_vehicles(200)
+        generator.generate_drivers(400)
+        generator.generate_routes(50)
+        generator.generate_trips(max(1, int(BASE_VOLUMES['trips'] * scale)))
+        generator.generate_deliveries(max(1, int(BASE_VOLUMES['deliveries'] * scale)))
+        generator.generate_maintenance(max(1, int(BASE_VOLUMES['maintenance'] * scale)))
+
+        for table in ['vehicles', 'drivers', 'routes', 'trips', 'deliveries', 'maintenance']:
+            generator.cursor.execute(f"ANALYZE {table}")
+        generator.connection.commit()
+    finally:
+        generator.close()
+
+
+def compare_with_baseline(results: Dict, baseline: Dict, threshold_pct: float) -> List[str]:
+    """Comparar medianas contra el baseline; devuelve las queries que empeoraron"""
+    regressions = []
+    for query_id, current in results['queries'].items():
+        previous = baseline.get('queries', {}).get(query_id)
+        if not previous:
+            current['baseline_median_ms'] = None
+            continue
+        delta_pct = (current['median_ms'] - previous['median_ms']) / previous['median_ms'] * 100
+        current['baseline_median_ms'] = previous['median_ms']
+        current['delta_pct'] = round(delta_pct, 2)
+        # Solo es regresión si supera el umbral y queda fuera del p95 anterior
+        if delta_pct > threshold_pct and current['median_ms'] > previous['p95_ms']:
+            regressions.append(query_id)
+    return regressions
+
+
+def print_report(results: Dict):
+    """Imprimir tabla resumen"""
+    print(f"\n{'Query':<16}{'Mediana ms':>12}{'p95 ms':>10}{'Hit blk':>10}{'Read blk':>10}{'Baseline':>11}{'Delta':>9}")
+    print("-" * 78)
+    for query_id, r in results['queries'].items():
+        baseline = f"{r['baseline_median_ms']:.3f}" if r.get('baseline_median_ms') else '-'
+        delta = f"{r['delta_pct']:+.1f}%" if 'delta_pct' in r else '-'
+        print(f"{query_id:<16}{r['median_ms']:>12.3f}{r['p95_ms']:>10.3f}"
+              f"{r['shared_hit_blocks']:>10}{r['shared_read_blocks']:>10}{baseline:>11}{delta:>9}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de queries de análisis FleetLogix')
+    parser.add_argument('--sql-file', default=DEFAULT_SQL_FILE, help='Archivo con bloques --Query N')
+    parser.add_argument('--queries', nargs='*', help='IDs a ejecutar (por defecto todas)')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--generate', action='store_true', help='Regenerar datos antes de medir (TRUNCATE)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Escala de volúmenes de DataGenerator')
+    parser.add_argument('--baseline', help='JSON de un benchmark anterior para comparar')
+    parser.add_argument('--threshold', type=float, default=10.0, help='%% de empeoramiento tolerado')
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        logging.info(f" Generando datos a escala {args.scale}...")
+        generate_database(POSTGRES_CONFIG, args.scale)
+
+    queries = load_queries(args.sql_file)
+    if args.queries:
+        queries = [q for q in queries if q['id'] in args.queries]
+    logging.info(f" {len(queries)} queries cargadas de {os.path.basename(args.sql_file)}")
+
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("SHOW server_version")
+    server_version = cursor.fetchone()[0]
+
+    results = {
+        'timestamp': datetime.now().isoformat(),
+        'sql_file': os.path.basename(args.sql_file),
+        'server_version': server_version,
+        'scale': args.scale if args.generate else None,
+        'runs': args.runs,
+        'warmup': args.warmup,
+        'queries': {}
+    }
+
+    try:
+        for query in queries:
+            logging.info(f" Query {query['id']}: {query['title']}")
+            stats = run_query(cursor, query['sql'], args.warmup, args.runs)
+            stats['title'] = query['title']
+            results['queries'][query['id']] = stats
+    finally:
+        cursor.close()
+        conn.close()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.threshold)
+
+    print_report(results)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logging.info(f" Resultados guardados en {args.output}")
+
+    if regressions:
+        logging.warning(f" Regresiones (> {args.threshold}%): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+FleetLogix - Benchmark de Índices de Tiempo (B-tree vs BRIN)
+Aplica cada variante de índices sobre trips/deliveries y mide latencia
+de las queries de ventana temporal, tamaño de los índices y costo de
+inserción masiva. --grow-to agrega entregas sintéticas en orden
+cronológico para medir a 10M+ filas.
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import psycopg2
+
+from benchmark_queries import DEFAULT_SQL_FILE, POSTGRES_CONFIG, load_queries, run_query
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+# Índices de tiempo/join que cambian entre variantes (ver 05_time_indexes_brin.sql);
+# 'none' es la referencia para medir cuánto frena cada variante a la inserción
+VARIANTS = {
+    'none': {},
+    'btree': {
+        'idx_trips_departure': "CREATE INDEX idx_trips_departure ON trips(departure_datetime)",
+        'idx_deliveries_scheduled_datetime': """
+            CREATE INDEX idx_deliveries_scheduled_datetime ON deliveries(scheduled_datetime, delivery_status)
+            WHERE delivery_status = 'delivered'""",
+        'idx_deliveries_delivered_datetime':
+            "CREATE INDEX idx_deliveries_delivered_datetime ON deliveries(delivered_datetime)",
+        'idx_trips_trip_id': "CREATE INDEX idx_trips_trip_id ON trips(trip_id)",
+        'idx_deliveries_trip_id': "CREATE INDEX idx_deliveries_trip_id ON deliveries(trip_id)"
+    },
+    'brin': {
+        'idx_trips_departure_brin': """
+            CREATE INDEX idx_trips_departure_brin ON trips
+            USING brin (departure_datetime) WITH (pages_per_range = 32, autosummarize = on)""",
+        'idx_deliveries_scheduled_brin': """
+            CREATE INDEX idx_deliveries_scheduled_brin ON deliveries
+            USING brin (scheduled_datetime) WITH (pages_per_range = 32, autosummarize = on)""",
+        'idx_deliveries_delivered_brin': """
+            CREATE INDEX idx_deliveries_delivered_brin ON deliveries
+            USING brin (delivered_datetime) WITH (pages_per_range = 32, autosummarize = on)""",
+        'idx_trips_trip_id_covering': """
+            CREATE INDEX idx_trips_trip_id_covering ON trips(trip_id)
+            INCLUDE (vehicle_id, driver_id, route_id, departure_datetime, arrival_datetime, fuel_consumed_liters)""",
+        'idx_deliveries_trip_id_covering': """
+            CREATE INDEX idx_deliveries_trip_id_covering ON deliveries(trip_id)
+            INCLUDE (delivery_status, package_weight_kg, scheduled_datetime, delivered_datetime)"""
+    }
+}
+
+# 4 entregas por viaje, en orden cronológico a continuación de los datos existentes
+INSERT_TRIPS = """
+    INSERT INTO trips (vehicle_id, driver_id, route_id, departure_datetime, arrival_datetime,
+                       fuel_consumed_liters, total_weight_kg, status)
+    SELECT
+        v.ids[1 + i %% array_length(v.ids, 1)],
+        d.ids[1 + i %% array_length(d.ids, 1)],
+        r.ids[1 + i %% array_length(r.ids, 1)],
+        s.start_at + i * INTERVAL '10 seconds',
+        s.start_at + i * INTERVAL '10 seconds' + INTERVAL '8 hours',
+        40 + i %% 160,
+        500 + i %% 4500,
+        'completed'
+    FROM generate_series(1, %s) AS i,
+         (SELECT array_agg(vehicle_id) AS ids FROM vehicles) v,
+         (SELECT array_agg(driver_id) AS ids FROM drivers) d,
+         (SELECT array_agg(route_id) AS ids FROM routes) r,
+         (SELECT COALESCE(max(departure_datetime), now()) AS start_at FROM trips) s
+    RETURNING trip_id
+"""
+
+INSERT_DELIVERIES = """
+    INSERT INTO deliveries (trip_id, tracking_number, customer_name, delivery_address,
+                            package_weight_kg, scheduled_datetime, delivered_datetime,
+                            delivery_status, recipient_signature)
+    SELECT
+        t.trip_id,
+        'BENCH' || t.trip_id || '-' || k,
+        'Cliente ' || k,
+        'Dirección sintética',
+        5 + (t.trip_id * k) %% 95,
+        t.departure_datetime + k * INTERVAL '1 hour',
+        t.departure_datetime + k * INTERVAL '1 hour' + INTERVAL '20 minutes',
+        'delivered',
+        TRUE
+    FROM trips t
+    CROSS JOIN generate_series(1, 4) AS k
+    WHERE t.trip_id >= %s
+"""
+
+
+def apply_variant(cursor, variant: str):
+    """Eliminar los índices de todas las variantes y crear los de la elegida"""
+    for name in [n for indexes in VARIANTS.values() for n in indexes]:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    for ddl in VARIANTS[variant].values():
+        cursor.execute(ddl)
+    cursor.execute("ANALYZE trips")
+    cursor.execute("ANALYZE deliveries")
+
+
+def index_sizes(cursor, names: List[str]) -> Dict[str, int]:
+    """Tamaño en bytes de cada índice (suma de particiones si la tabla está particionada)"""
+    sizes = {}
+    for name in names:
+        cursor.execute("""
+            SELECT COALESCE(SUM(pg_relation_size(relid)), pg_relation_size(%s::regclass))
+            FROM pg_partition_tree(%s::regclass)
+        """, (name, name))
+        sizes[name] = int(cursor.fetchone()[0])
+    return sizes
+
+
+def insert_synthetic(cursor, trips: int) -> int:
+    """Insertar viajes + 4 entregas por viaje; devuelve entregas insertadas"""
+    cursor.execute(INSERT_TRIPS, (trips,))
+    first_trip = min(row[0] for row in cursor.fetchall())
+    cursor.execute(INSERT_DELIVERIES, (first_trip,))
+    return cursor.rowcount
+
+
+def grow_to(conn, target_deliveries: int, chunk_trips: int = 250000):
+    """Crecer deliveries hasta target_deliveries filas (se confirma por lotes)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT count(*) FROM deliveries")
+    current = cursor.fetchone()[0]
+    while current < target_deliveries:
+        trips = min(chunk_trips, (target_deliveries - current + 3) // 4)
+        current += insert_synthetic(cursor, trips)
+        conn.commit()
+        logging.info(f" deliveries: {current:,} filas")
+    cursor.execute("ANALYZE trips")
+    cursor.execute("ANALYZE deliveries")
+    conn.commit()
+
+
+def measure_bulk_insert(conn, deliveries: int, repeats: int = 3) -> Dict:
+    """Mediana del tiempo de insertar N entregas (y sus viajes) con la variante activa; se revierte"""
+    cursor = conn.cursor()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        inserted = insert_synthetic(cursor, max(1, deliveries // 4))
+        timings.append(time.perf_counter() - start)
+        conn.rollback()
+    elapsed = statistics.median(timings)
+    return {
+        'rows': inserted,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(inserted / elapsed) if elapsed else None
+    }
+
+
+def benchmark_variant(conn, variant: str, queries: List[Dict], runs: int, warmup: int,
+                      insert_rows: int) -> Dict:
+    cursor = conn.cursor()
+    logging.info(f" Aplicando variante {variant}...")
+    start = time.perf_counter()
+    apply_variant(cursor, variant)
+    conn.commit()
+    build_seconds = time.perf_counter() - start
+
+    sizes = index_sizes(cursor, list(VARIANTS[variant]))
+    result = {
+        'build_seconds': round(build_seconds, 3),
+        'index_bytes': sizes,
+        'total_index_mb': round(sum(sizes.values()) / 1024 / 1024, 2),
+        'queries': {}
+    }
+    for query in queries:
+        stats = run_query(cursor, query['sql'], warmup, runs)
+        result['queries'][query['id']] = {'median_ms': stats['median_ms'], 'p95_ms': stats['p95_ms']}
+        logging.info(f"   Query {query['id']}: {stats['median_ms']} ms")
+    conn.rollback()
+
+    result['bulk_insert'] = measure_bulk_insert(conn, insert_rows)
+    logging.info(f"   Inserción: {result['bulk_insert']['rows_per_second']} filas/s")
+    return result
+
+
+def print_report(results: Dict):
+    variants = list(results['variants'])
+    print(f"\n{'Métrica':<28}" + ''.join(f"{v:>14}" for v in variants))
+    print("-" * (28 + 14 * len(variants)))
+    print(f"{'Tamaño índices (MB)':<28}" + ''.join(
+        f"{results['variants'][v]['total_index_mb']:>14.2f}" for v in variants))
+    print(f"{'Creación índices (s)':<28}" + ''.join(
+        f"{results['variants'][v]['build_seconds']:>14.2f}" for v in variants))
+    print(f"{'Inserción (filas/s)':<28}" + ''.join(
+        f"{results['variants'][v]['bulk_insert']['rows_per_second'] or 0:>14,}" for v in variants))
+    if 'none' in variants:
+        base = results['variants']['none']['bulk_insert']['seconds']
+        print(f"{'Inserción vs sin índices (%)':<28}" + ''.join(
+            f"{(results['variants'][v]['bulk_insert']['seconds'] - base) / base * 100:>+14.1f}" for v in variants))
+    for query_id in results['variants'][variants[0]]['queries']:
+        print(f"{'Query ' + query_id + ' mediana (ms)':<28}" + ''.join(
+            f"{results['variants'][v]['queries'][query_id]['median_ms']:>14.3f}" for v in variants))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark B-tree vs BRIN en columnas de tiempo')
+    parser.add_argument('--sql-file', default=DEFAULT_SQL_FILE)
+    parser.add_argument('--queries', nargs='*', default=['4', '6', '10'],
+                        help='Queries de ventana temporal a medir')
+    parser.add_argument('--variants', nargs='*', default=['none', 'btree', 'brin'], choices=list(VARIANTS))
+    parser.add_argument('--grow-to', type=int, help='Crecer deliveries hasta N filas antes de medir (permanente)')
+    parser.add_argument('--insert-rows', type=int, default=100000, help='Entregas del test de inserción')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--output', default='time_indexes_results.json')
+    args = parser.parse_args(argv)
+
+    queries = [q for q in load_queries(args.sql_file) if q['id'] in args.queries]
+
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    try:
+        if args.grow_to:
+            logging.info(f" Creciendo deliveries hasta {args.grow_to:,} filas...")
+            grow_to(conn, args.grow_to)
+
+        cursor = conn.cursor()
+        cursor.execute("SELECT count(*) FROM deliveries")
+        results = {
+            'timestamp': datetime.now().isoformat(),
+            'deliveries_rows': cursor.fetchone()[0],
+            'variants': {}
+        }
+        conn.rollback()
+
+        for variant in args.variants:
+            results['variants'][variant] = benchmark_variant(
+                conn, variant, queries, args.runs, args.warmup, args.insert_rows
+            )
+    finally:
+        conn.close()
+
+    print_report(results)
+    logging.info(f" Variante activa al terminar: {args.variants[-1]}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logging.info(f" Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
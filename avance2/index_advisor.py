@@ -0,0 +1,431 @@
+"""
+FleetLogix - Asesor de Índices
+Reproduce el workload de reportes, recolecta planes (y pg_stat_statements
+si está disponible), genera índices candidatos (B-tree, covering INCLUDE,
+parciales y BRIN en columnas datetime) y los evalúa con costeo hipotético
+(HypoPG) o con índices reales dentro de una transacción que se revierte
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+import psycopg2
+
+from benchmark_queries import DEFAULT_SQL_FILE, POSTGRES_CONFIG, load_queries, run_query
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+# Costo relativo de mantener el índice por tupla escrita (B-tree = 1)
+WRITE_FACTOR = {'btree': 1.0, 'brin': 0.05}
+MAX_INCLUDE_COLUMNS = 4
+
+QUALIFIED_COLUMN = re.compile(r'\b([a-z_][a-z0-9_]*)\.([a-z_][a-z0-9_]*)\b')
+EQUALS_LITERAL = re.compile(r"\(?([a-z_][a-z0-9_]*)\.([a-z_][a-z0-9_]*)\)?(?:::\w+)?\s*=\s*('[^']*')")
+
+
+class Candidate:
+    """Índice candidato normalizado (tabla, método, columnas, INCLUDE, WHERE)"""
+
+    def __init__(self, table: str, columns: Tuple[str, ...], method: str = 'btree',
+                 include: Tuple[str, ...] = (), where: Optional[str] = None, reason: str = ''):
+        self.table = table
+        self.columns = columns
+        self.method = method
+        self.include = include
+        self.where = where
+        self.reasons = {reason} if reason else set()
+
+    @property
+    def signature(self):
+        return (self.table, self.method, self.columns, self.include, self.where)
+
+    def ddl(self, name: str) -> str:
+        sql = f"CREATE INDEX {name} ON {self.table} USING {self.method} ({', '.join(self.columns)})"
+        if self.include:
+            sql += f" INCLUDE ({', '.join(self.include)})"
+        if self.where:
+            sql += f" WHERE {self.where}"
+        return sql
+
+
+class IndexAdvisor:
+    def __init__(self, conn, mode: str = 'auto'):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.mode = mode
+        self.column_types: Dict[Tuple[str, str], str] = {}
+        self.parents: Dict[str, str] = {}
+        self.existing: Set[Tuple] = set()
+
+    # -------------------------------------------------
+    # Metadatos
+    # -------------------------------------------------
+    def load_catalog(self):
+        """Tipos de columnas, padres de particiones e índices existentes"""
+        self.cursor.execute("""
+            SELECT table_name, column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+        """)
+        self.column_types = {(t, c): dt for t, c, dt in self.cursor.fetchall()}
+
+        self.cursor.execute("""
+            SELECT c.relname, p.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+        """)
+        self.parents = dict(self.cursor.fetchall())
+
+        self.cursor.execute("""
+            SELECT
+                t.relname,
+                am.amname,
+                ARRAY(
+                    SELECT a.attname
+                    FROM unnest(ix.indkey) WITH ORDINALITY AS k(attnum, pos)
+                    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+                    ORDER BY k.pos
+                ),
+                ix.indnkeyatts,
+                pg_get_expr(ix.indpred, ix.indrelid)
+            FROM pg_index ix
+            JOIN pg_class t ON t.oid = ix.indrelid
+            JOIN pg_class i ON i.oid = ix.indexrelid
+            JOIN pg_am am ON am.oid = i.relam
+            JOIN pg_namespace n ON n.oid = t.relnamespace
+            WHERE n.nspname = 'public'
+        """)
+        for table, method, columns, nkey, predicate in self.cursor.fetchall():
+            self.existing.add((table, method, tuple(columns[:nkey]), tuple(columns[nkey:]), predicate))
+
+    def has_hypopg(self) -> bool:
+        self.cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")
+        return self.cursor.fetchone() is not None
+
+    def pg_stat_statements(self, limit: int) -> List[Dict]:
+        """
+        Top statements por tiempo total (vacío si la extensión no está instalada).
+        Los contadores son acumulados desde el último pg_stat_statements_reset().
+        """
+        self.cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+        if self.cursor.fetchone() is None:
+            return []
+        self.cursor.execute("""
+            SELECT queryid, query, calls, total_exec_time, mean_exec_time,
+                   shared_blks_hit, shared_blks_read
+            FROM pg_stat_statements
+            WHERE query ILIKE 'select%%' OR query ILIKE 'with%%'
+            ORDER BY total_exec_time DESC
+            LIMIT %s
+        """, (limit,))
+        columns = [c[0] for c in self.cursor.description]
+        return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+
+    def table_write_ratio(self) -> Dict[str, float]:
+        """Fracción de operaciones de escritura por tabla desde el último reset de estadísticas"""
+        self.cursor.execute("""
+            SELECT relname,
+                   n_tup_ins + n_tup_upd + n_tup_del AS writes,
+                   COALESCE(seq_tup_read, 0) + COALESCE(idx_tup_fetch, 0) AS reads
+            FROM pg_stat_user_tables
+        """)
+        ratios = {}
+        for table, writes, reads in self.cursor.fetchall():
+            table = self.parents.get(table, table)
+            prev_writes, prev_reads = ratios.get(table, (0, 0))
+            ratios[table] = (prev_writes + writes, prev_reads + reads)
+        return {t: (w / (w + r) if (w + r) else 0.0) for t, (w, r) in ratios.items()}
+
+    # -------------------------------------------------
+    # Planes y candidatos
+    # -------------------------------------------------
+    def explain(self, sql: str, generic: bool = False) -> Dict:
+        options = 'FORMAT JSON, VERBOSE' + (', GENERIC_PLAN' if generic else '')
+        self.cursor.execute(f"EXPLAIN ({options}) {sql}")
+        result = self.cursor.fetchone()[0]
+        return (json.loads(result) if isinstance(result, str) else result)[0]['Plan']
+
+    def _walk(self, node: Dict, aliases: Dict[str, str], scans: List[Dict], conditions: List[str]):
+        if 'Relation Name' in node:
+            table = self.parents.get(node['Relation Name'], node['Relation Name'])
+            aliases[node.get('Alias', table)] = table
+            scans.append(node)
+        for key in ('Hash Cond', 'Merge Cond', 'Join Filter', 'Filter', 'Index Cond', 'Recheck Cond'):
+            if key in node:
+                conditions.append(node[key])
+        for child in node.get('Plans', []):
+            self._walk(child, aliases, scans, conditions)
+
+    def candidates_for_plan(self, plan: Dict) -> List[Candidate]:
+        aliases, scans, conditions = {}, [], []
+        self._walk(plan, aliases, scans, conditions)
+
+        # Columnas referenciadas por tabla: filtros/joins y salida del scan
+        filtered: Dict[str, List[str]] = {}
+        joined: Dict[str, List[str]] = {}
+        output: Dict[str, List[str]] = {}
+        partial: Dict[str, Set[Tuple[str, str]]] = {}
+
+        for condition in conditions:
+            is_join = len({a for a, _ in QUALIFIED_COLUMN.findall(condition) if a in aliases}) > 1
+            for alias, column in QUALIFIED_COLUMN.findall(condition):
+                if alias not in aliases:
+                    continue
+                target = joined if is_join else filtered
+                columns = target.setdefault(aliases[alias], [])
+                if column not in columns:
+                    columns.append(column)
+            for alias, column, literal in EQUALS_LITERAL.findall(condition):
+                if alias in aliases:
+                    partial.setdefault(aliases[alias], set()).add((column, literal))
+
+        for scan in scans:
+            table = self.parents.get(scan['Relation Name'], scan['Relation Name'])
+            for expr in scan.get('Output', []):
+                for _, column in QUALIFIED_COLUMN.findall(expr):
+                    if (table, column) in self.column_types and column not in output.setdefault(table, []):
+                        output[table].append(column)
+
+        candidates = []
+        for table, columns in filtered.items():
+            predicates = partial.get(table, set())
+            equality_columns = {c for c, _ in predicates}
+            for column in columns:
+                # Columnas fijadas por igualdad a un literal van al WHERE del parcial, no a la clave
+                if column in equality_columns:
+                    continue
+                candidates.append(Candidate(table, (column,), reason='filtro'))
+                if 'timestamp' in self.column_types.get((table, column), ''):
+                    candidates.append(Candidate(table, (column,), method='brin', reason='rango datetime'))
+                for predicate_column, literal in sorted(predicates):
+                    candidates.append(Candidate(table, (column,), where=f"{predicate_column} = {literal}",
+                                                reason='parcial'))
+
+        for table, columns in joined.items():
+            for column in columns:
+                candidates.append(Candidate(table, (column,), reason='join'))
+                include = tuple(c for c in output.get(table, []) if c != column)[:MAX_INCLUDE_COLUMNS]
+                if include:
+                    candidates.append(Candidate(table, (column,), include=include, reason='covering join'))
+        return candidates
+
+    # -------------------------------------------------
+    # Costeo
+    # -------------------------------------------------
+    def _cost(self, workload: List[Dict]) -> Dict[str, float]:
+        return {q['id']: self.explain(q['sql'], q.get('generic', False))['Total Cost'] for q in workload}
+
+    def evaluate(self, candidate: Candidate, workload: List[Dict], use_hypopg: bool) -> Tuple[Dict[str, float], int]:
+        """Costos del workload con el índice candidato y tamaño estimado en bytes"""
+        if use_hypopg:
+            self.cursor.execute("SELECT indexrelid FROM hypopg_create_index(%s)", (candidate.ddl('advisor_candidate'),))
+            index_oid = self.cursor.fetchone()[0]
+            try:
+                self.cursor.execute("SELECT hypopg_relation_size(%s)", (index_oid,))
+                size = self.cursor.fetchone()[0]
+                return self._cost(workload), size
+            finally:
+                self.cursor.execute("SELECT hypopg_reset()")
+
+        # Sin HypoPG: índice real dentro de una transacción que se revierte
+        self.cursor.execute(candidate.ddl('advisor_candidate'))
+        try:
+            self.cursor.execute("ANALYZE " + candidate.table)
+            self.cursor.execute("""
+                SELECT COALESCE(SUM(pg_relation_size(relid)), pg_relation_size('advisor_candidate'::regclass))
+                FROM pg_partition_tree('advisor_candidate'::regclass)
+            """)
+            size = int(self.cursor.fetchone()[0])
+            return self._cost(workload), size
+        finally:
+            self.conn.rollback()
+
+    def recommend(self, workload: List[Dict], min_gain_pct: float = 1.0,
+                  storage_weight: float = 0.01, write_weight: float = 0.5) -> Dict:
+        """
+        Ranking de candidatos:
+          gain_ms   = Σ peso_q × (costo_base_q - costo_q) / costo_base_q
+          score     = gain_pct - storage_weight × MB - write_weight × (%% escrituras de la tabla × factor del método)
+        El peso de cada query es su tiempo total en la ventana de medición
+        (ms medios por ejecución × ejecuciones), igual para el workload y pg_stat_statements.
+        """
+        use_hypopg = self.mode == 'hypopg' or (self.mode == 'auto' and self.has_hypopg())
+        logging.info(f" Costeo con {'HypoPG (índices hipotéticos)' if use_hypopg else 'índices reales + ROLLBACK'}")
+
+        candidates: Dict[Tuple, Candidate] = {}
+        for query in workload:
+            for candidate in self.candidates_for_plan(self.explain(query['sql'], query.get('generic', False))):
+                if candidate.signature in self.existing:
+                    continue
+                if candidate.signature in candidates:
+                    candidates[candidate.signature].reasons |= candidate.reasons
+                else:
+                    candidates[candidate.signature] = candidate
+        logging.info(f" {len(candidates)} índices candidatos")
+
+        self.conn.rollback()
+        base_costs = self._cost(workload)
+        total_weight = sum(q['weight_ms'] for q in workload) or 1.0
+        write_ratio = self.table_write_ratio()
+
+        ranking = []
+        for candidate in candidates.values():
+            try:
+                costs, size = self.evaluate(candidate, workload, use_hypopg)
+            except psycopg2.Error as e:
+                self.conn.rollback()
+                logging.warning(f" Candidato descartado ({candidate.ddl('idx')}): {e}")
+                continue
+
+            improved = {}
+            gain_ms = 0.0
+            for query in workload:
+                base = base_costs[query['id']]
+                if base > 0 and costs[query['id']] < base:
+                    reduction = (base - costs[query['id']]) / base
+                    improved[query['id']] = round(reduction * 100, 2)
+                    gain_ms += query['weight_ms'] * reduction
+
+            gain_pct = gain_ms / total_weight * 100
+            if gain_pct < min_gain_pct:
+                continue
+
+            size_mb = size / 1024 / 1024
+            write_cost = write_ratio.get(candidate.table, 0.0) * 100 * WRITE_FACTOR.get(candidate.method, 1.0)
+            ranking.append({
+                'ddl': candidate.ddl(self._index_name(candidate)) + ';',
+                'reasons': sorted(candidate.reasons),
+                'queries_improved': improved,
+                'estimated_gain_ms': round(gain_ms, 3),
+                'estimated_gain_pct': round(gain_pct, 2),
+                'size_mb': round(size_mb, 2),
+                'write_cost': round(write_cost, 2),
+                'score': round(gain_pct - storage_weight * size_mb - write_weight * write_cost, 2)
+            })
+
+        ranking.sort(key=lambda r: r['score'], reverse=True)
+        return {'costing': 'hypopg' if use_hypopg else 'real', 'recommendations': ranking}
+
+    @staticmethod
+    def _index_name(candidate: Candidate) -> str:
+        parts = ['idx', candidate.table] + list(candidate.columns)
+        if candidate.method != 'btree':
+            parts.append(candidate.method)
+        if candidate.include:
+            parts.append('covering')
+        if candidate.where:
+            parts.append('partial')
+        return '_'.join(parts)[:63]
+
+    def unused_indexes(self, plans: List[Dict]) -> List[str]:
+        """
+        Índices idx_* existentes que no aparecen en ningún plan del workload.
+        Un índice sobre una tabla particionada aparece en el plan con el nombre del
+        índice de cada partición, así que se resuelven sus hijos con pg_partition_tree
+        (vacío para índices de tablas sin particionar).
+        """
+        used = set()
+
+        def collect(node):
+            if 'Index Name' in node:
+                used.add(node['Index Name'])
+            for child in node.get('Plans', []):
+                collect(child)
+
+        for plan in plans:
+            collect(plan)
+
+        self.cursor.execute("""
+            SELECT i.relname, COALESCE(c.relname, i.relname)
+            FROM pg_class i
+            JOIN pg_namespace n ON n.oid = i.relnamespace
+            LEFT JOIN LATERAL pg_partition_tree(i.oid) t ON true
+            LEFT JOIN pg_class c ON c.oid = t.relid
+            WHERE n.nspname = 'public'
+              AND i.relkind IN ('i', 'I')
+              AND NOT i.relispartition
+              AND i.relname LIKE 'idx\\_%%'
+        """)
+        tree: Dict[str, Set[str]] = {}
+        for index, member in self.cursor.fetchall():
+            tree.setdefault(index, set()).add(member)
+        return sorted(i for i, members in tree.items() if not members & used)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Asesor de índices FleetLogix')
+    parser.add_argument('--sql-file', default=DEFAULT_SQL_FILE)
+    parser.add_argument('--queries', nargs='*', help='IDs del workload (por defecto todas)')
+    parser.add_argument('--runs', type=int, default=3, help='Repeticiones para medir el peso de cada query')
+    parser.add_argument('--pg-stat-statements', type=int, default=0,
+                        help='Agregar al workload los N statements más costosos de pg_stat_statements')
+    parser.add_argument('--workload-calls', type=int, default=1,
+                        help='Ejecuciones de cada query del workload en la ventana de pg_stat_statements')
+    parser.add_argument('--mode', choices=['auto', 'hypopg', 'real'], default='auto')
+    parser.add_argument('--min-gain', type=float, default=1.0, help='%% mínimo de mejora del workload')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--output', default='index_recommendations.json')
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    advisor = IndexAdvisor(conn, args.mode)
+    advisor.load_catalog()
+
+    # 1. Reproducir el workload y medir el peso de cada query
+    #    (peso = ms por ejecución × ejecuciones en la ventana, la misma unidad que pg_stat_statements)
+    workload = load_queries(args.sql_file)
+    if args.queries:
+        workload = [q for q in workload if q['id'] in args.queries]
+    for query in workload:
+        query['mean_ms'] = run_query(advisor.cursor, query['sql'], warmup=1, runs=args.runs)['median_ms']
+        query['calls'] = args.workload_calls
+        query['weight_ms'] = query['mean_ms'] * query['calls']
+        logging.info(f" Query {query['id']}: {query['mean_ms']} ms × {query['calls']}")
+    conn.rollback()
+
+    # 2. Statements reales del servidor (planes genéricos para los parametrizados)
+    statements = advisor.pg_stat_statements(args.pg_stat_statements) if args.pg_stat_statements else []
+    for stmt in statements:
+        workload.append({
+            'id': f"pgss_{stmt['queryid']}",
+            'sql': stmt['query'],
+            'mean_ms': float(stmt['mean_exec_time']),
+            'calls': int(stmt['calls']),
+            'weight_ms': float(stmt['mean_exec_time']) * int(stmt['calls']),
+            'generic': '$1' in stmt['query']
+        })
+
+    # 3. Candidatos y costeo
+    plans = [advisor.explain(q['sql'], q.get('generic', False)) for q in workload]
+    result = advisor.recommend(workload, min_gain_pct=args.min_gain)
+    result['unused_existing_indexes'] = advisor.unused_indexes(plans)
+    result['workload'] = {q['id']: q['weight_ms'] for q in workload}
+    conn.close()
+
+    print(f"\n{'#':<4}{'Score':>8}{'Mejora %':>10}{'MB':>8}{'Escritura':>11}  DDL")
+    print("-" * 100)
+    for i, rec in enumerate(result['recommendations'][:args.top], 1):
+        print(f"{i:<4}{rec['score']:>8.2f}{rec['estimated_gain_pct']:>10.2f}{rec['size_mb']:>8.2f}"
+              f"{rec['write_cost']:>11.2f}  {rec['ddl']}")
+    if result['unused_existing_indexes']:
+        print(f"\nÍndices existentes sin uso en el workload: {', '.join(result['unused_existing_indexes'])}")
+
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2, default=str)
+    logging.info(f" Recomendaciones guardadas en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
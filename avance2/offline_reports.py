@@ -0,0 +1,318 @@
+"""
+FleetLogix - Reportes Offline (Parquet + DuckDB)
+Toma un snapshot de las tablas operativas a archivos Parquet y ejecuta los
+reportes de 02_queries_analysis.sql con DuckDB (motor columnar vectorizado)
+sin conexión a PostgreSQL. --check compara cada reporte contra el resultado
+de ReportService sobre PostgreSQL.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from benchmark_queries import POSTGRES_CONFIG
+from pg_router import router_from_env
+from report_service import REPORTS, ReportService
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+SNAPSHOT_TABLES = ['vehicles', 'drivers', 'routes', 'trips', 'deliveries', 'maintenance']
+DEFAULT_SNAPSHOT_DIR = 'snapshot'
+SNAPSHOT_BATCH_ROWS = 100000
+
+# OID de tipo PostgreSQL -> tipo Arrow (numeric usa precisión/escala de la columna)
+PG_TO_ARROW = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    25: pa.string(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1043: pa.string(),
+    1082: pa.date32(),
+    1114: pa.timestamp('us')
+}
+
+# Mismos reportes que report_service.REPORTS, en dialecto DuckDB
+# (división entera con //, DOUBLE en las razones y porcentajes)
+OFFLINE_REPORTS: Dict[str, str] = {
+    'vehicles_by_type': """
+        select vehicle_type, count(*)
+        from vehicles
+        group by vehicle_type
+        order by vehicle_type
+    """,
+    'expiring_licenses': """
+        select license_expiry, concat(first_name, ' ', last_name), license_number
+        from drivers
+        where license_expiry < current_date + $1 * INTERVAL '1 day'
+        order by license_expiry
+    """,
+    'trips_by_status': """
+        select status, count(*)
+        from trips
+        group by status
+        order by status
+    """,
+    'deliveries_by_city': """
+        select r.destination_city, count(d.delivery_id), sum(d.package_weight_kg)
+        from deliveries as d
+        join trips as t on t.trip_id = d.trip_id
+        join routes as r on r.route_id = t.route_id
+        where d.delivered_datetime >= (select max(departure_datetime) from trips) - $1 * INTERVAL '1 month'
+        group by r.destination_city
+        order by count(d.delivery_id) desc
+    """,
+    'driver_workload': """
+        select concat(d.first_name, ' ', d.last_name), count(t.trip_id) as total_viajes
+        from drivers as d
+        join trips as t on t.driver_id = d.driver_id
+        where d.status = 'active'
+        group by d.first_name, d.last_name
+        order by total_viajes desc
+    """,
+    'driver_monthly_deliveries': """
+        select concat(dr.first_name, ' ', dr.last_name),
+               count(d.delivery_id) as total_deliveries,
+               count(d.delivery_id) // $1
+        from drivers as dr
+        join trips as t on t.driver_id = dr.driver_id
+        join deliveries as d on d.trip_id = t.trip_id
+        where d.delivered_datetime >= (select max(delivered_datetime) from deliveries) - $1 * INTERVAL '1 month'
+        group by dr.first_name, dr.last_name
+        order by total_deliveries desc
+    """,
+    'fuel_by_route': """
+        select concat(r.origin_city, ' a ', r.destination_city),
+               sum(r.distance_km),
+               sum(t.fuel_consumed_liters),
+               (sum(r.distance_km)::DOUBLE / sum(t.fuel_consumed_liters)::DOUBLE * 100) as litros_100km
+        from routes as r
+        join trips as t on t.route_id = r.route_id
+        group by r.origin_city, r.destination_city
+        order by litros_100km desc
+        limit $1
+    """,
+    'maintenance_cost_per_km': """
+        with km_por_vehiculos as (
+            select t.vehicle_id, sum(r.distance_km) as total_km
+            from trips as t
+            join routes as r on r.route_id = t.route_id
+            group by t.vehicle_id
+        ),
+        costo_mantenimiento_por_vehiculo as (
+            select v.vehicle_id, v.vehicle_type, sum(m.cost) as costo_mantenimiento
+            from maintenance m
+            join vehicles as v on v.vehicle_id = m.vehicle_id
+            group by v.vehicle_id, v.vehicle_type
+        )
+        select c.vehicle_type,
+               round(sum(c.costo_mantenimiento)::DOUBLE / sum(k.total_km)::DOUBLE, 2),
+               sum(k.total_km),
+               sum(c.costo_mantenimiento)
+        from costo_mantenimiento_por_vehiculo as c
+        join km_por_vehiculos as k on k.vehicle_id = c.vehicle_id
+        group by c.vehicle_type
+        order by c.vehicle_type
+    """,
+    'driver_ranking': """
+        with driver_ranking as (
+            select d.driver_id, d.first_name, d.last_name,
+                   sum(del.package_weight_kg) as total_kg,
+                   sum(case when del.delivered_datetime <= del.scheduled_datetime then 1 else 0 end) as entregas_a_tiempo,
+                   count(*) as entregas_totales
+            from drivers as d
+            join trips as t on t.driver_id = d.driver_id
+            join deliveries as del on del.trip_id = t.trip_id
+            where del.delivered_datetime is not null
+              and del.scheduled_datetime is not null
+            group by d.driver_id, d.first_name, d.last_name
+        )
+        select rank() over (
+                   order by (total_kg::DOUBLE * (entregas_a_tiempo::DOUBLE / nullif(entregas_totales, 0))) desc
+               ) as rank,
+               driver_id,
+               concat(first_name, ' ', last_name),
+               total_kg,
+               entregas_a_tiempo,
+               entregas_totales,
+               round(100.0 * (entregas_a_tiempo::DOUBLE / nullif(entregas_totales, 0)), 2)
+        from driver_ranking
+        order by rank, driver_id
+        limit $1
+    """
+}
+
+# Parámetros por defecto de cada reporte (los mismos de ReportService)
+DEFAULT_PARAMS = {
+    'expiring_licenses': (30,),
+    'deliveries_by_city': (2,),
+    'driver_monthly_deliveries': (6,),
+    'fuel_by_route': (10,),
+    'driver_ranking': (20,)
+}
+
+
+def _arrow_schema(description) -> pa.Schema:
+    fields = []
+    for column in description:
+        if column.type_code == 1700:
+            precision = column.precision if column.precision and column.precision > 0 else 38
+            scale = column.scale if column.scale and column.scale > 0 else 6
+            arrow_type = pa.decimal128(precision, scale)
+        else:
+            arrow_type = PG_TO_ARROW.get(column.type_code, pa.string())
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def snapshot_tables(pg_conn, snapshot_dir: str, tables: List[str] = None) -> Dict:
+    """
+    Copiar cada tabla a <snapshot_dir>/<tabla>.parquet por lotes (cursor del
+    lado del servidor). Todas las tablas se leen en una misma transacción
+    REPEATABLE READ, así el snapshot es consistente entre tablas.
+    """
+    pg_conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest = {'taken_at': datetime.now().isoformat(), 'tables': {}}
+
+    for table in tables or SNAPSHOT_TABLES:
+        start = time.perf_counter()
+        cursor = pg_conn.cursor(name=f'snapshot_{table}')
+        cursor.itersize = SNAPSHOT_BATCH_ROWS
+        cursor.execute(f"SELECT * FROM {table}")
+
+        rows = cursor.fetchmany(SNAPSHOT_BATCH_ROWS)
+        schema = _arrow_schema(cursor.description)
+        path = os.path.join(snapshot_dir, f'{table}.parquet')
+        total = 0
+        with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+            while rows:
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                    schema=schema
+                ))
+                total += len(rows)
+                rows = cursor.fetchmany(SNAPSHOT_BATCH_ROWS)
+            if total == 0:
+                writer.write_table(schema.empty_table())
+        cursor.close()
+
+        manifest['tables'][table] = {'rows': total, 'seconds': round(time.perf_counter() - start, 3)}
+        logging.info(f" {table}: {total:,} filas -> {path}")
+
+    pg_conn.rollback()
+
+    with open(os.path.join(snapshot_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class OfflineReports:
+    """Reportes sobre un snapshot Parquet con DuckDB en memoria"""
+
+    def __init__(self, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+        self.conn = duckdb.connect(':memory:')
+        for table in SNAPSHOT_TABLES:
+            path = os.path.join(snapshot_dir, f'{table}.parquet')
+            self.conn.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{path}')")
+
+    def run(self, name: str, *params) -> Tuple:
+        """Ejecutar un reporte; devuelve filas con el mismo NamedTuple que ReportService"""
+        row_type = REPORTS[name][2]
+        rows = self.conn.execute(OFFLINE_REPORTS[name], list(params) if params else None).fetchall()
+        return tuple(row_type(*row) for row in rows)
+
+    def close(self):
+        self.conn.close()
+
+
+def _normalize(value):
+    """Valores comparables entre PostgreSQL (Decimal) y DuckDB (DECIMAL/DOUBLE)"""
+    if isinstance(value, (Decimal, float)):
+        return round(float(value), 4)
+    return value
+
+
+def rows_match(expected: Tuple, actual: Tuple, rel_tol: float = 1e-6) -> bool:
+    """Mismas filas sin importar el orden entre empates"""
+    if len(expected) != len(actual):
+        return False
+    key = lambda row: tuple(str(_normalize(v)) for v in row)
+    for exp_row, act_row in zip(sorted(expected, key=key), sorted(actual, key=key)):
+        for exp, act in zip(exp_row, act_row):
+            exp, act = _normalize(exp), _normalize(act)
+            if isinstance(exp, float) and isinstance(act, float):
+                if not math.isclose(exp, act, rel_tol=rel_tol, abs_tol=1e-4):
+                    return False
+            elif exp != act:
+                return False
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Reportes FleetLogix offline sobre Parquet + DuckDB')
+    parser.add_argument('--snapshot-dir', default=DEFAULT_SNAPSHOT_DIR)
+    parser.add_argument('--snapshot', action='store_true', help='Tomar un snapshot nuevo desde PostgreSQL')
+    parser.add_argument('--check', action='store_true', help='Comparar contra PostgreSQL (ReportService)')
+    args = parser.parse_args(argv)
+
+    # ReportService sólo para --check; el snapshot usa su propia conexión
+    service = None
+    if args.check:
+        service = ReportService()
+        service.connect()
+    if args.snapshot:
+        pg_conn = router_from_env(POSTGRES_CONFIG).reader()
+        snapshot_tables(pg_conn, args.snapshot_dir)
+        pg_conn.close()
+
+    offline = OfflineReports(args.snapshot_dir)
+    mismatches = []
+    print(f"\n{'Reporte':<28}{'Filas':>7}{'DuckDB ms':>11}{'PostgreSQL ms':>15}{'Coincide':>10}")
+    print("-" * 71)
+    for name in OFFLINE_REPORTS:
+        params = DEFAULT_PARAMS.get(name, ())
+        start = time.perf_counter()
+        rows = offline.run(name, *params)
+        offline_ms = (time.perf_counter() - start) * 1000
+
+        pg_ms, match = '-', '-'
+        if args.check:
+            start = time.perf_counter()
+            expected = service.run(name, *params)
+            pg_ms = f"{(time.perf_counter() - start) * 1000:.1f}"
+            match = 'sí' if rows_match(expected, rows) else 'NO'
+            if match == 'NO':
+                mismatches.append(name)
+        print(f"{name:<28}{len(rows):>7}{offline_ms:>11.1f}{pg_ms:>15}{match:>10}")
+
+    offline.close()
+    if service:
+        service.close()
+    if mismatches:
+        logging.warning(f" Reportes con diferencias: {', '.join(mismatches)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+FleetLogix - Enrutamiento Primario / Réplicas de PostgreSQL
+Las escrituras (DataGenerator, inserts de viajes/entregas) van al primario;
+las queries analíticas y el extract del ETL van a réplicas de streaming
+replication siempre que su lag no supere un máximo. Si ninguna réplica
+cumple, se usa el primario en modo solo lectura.
+
+Variables de entorno:
+    POSTGRES_REPLICA_DSNS            DSNs separados por ';' (libpq o URI)
+    POSTGRES_MAX_REPLICA_LAG_SECONDS lag máximo tolerado (default 30)
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import sys
+from typing import Dict, List, Optional
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+# Lag en segundos; 0 si la réplica ya aplicó todo lo recibido (evita falsos
+# positivos cuando el primario está ocioso y no hay transacciones nuevas).
+# Eso solo vale mientras el walreceiver está en streaming: desconectada, lo
+# recibido puede ser viejo y el lag se mide por la última transacción aplicada
+# (infinito si no aplicó ninguna). pg_stat_wal_receiver.status requiere
+# pg_read_all_stats; sin ese rol se toma siempre la medida conservadora.
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+             AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8, 'Infinity'::float8)
+    END
+"""
+
+
+class ConnectionRouter:
+    def __init__(self, primary_config: Dict, replica_dsns: List[str] = None, max_lag_seconds: float = 30.0):
+        self.primary_config = primary_config
+        self.replica_configs = [self._replica_config(dsn) for dsn in (replica_dsns or [])]
+        self.max_lag_seconds = max_lag_seconds
+        self._next_replica = itertools.cycle(range(len(self.replica_configs)))
+        self.stats = {'primary': 0, 'replica': 0, 'fallback': 0}
+
+    def _replica_config(self, dsn: str) -> Dict:
+        """Completar el DSN de la réplica con usuario/clave/base del primario"""
+        replica = parse_dsn(dsn)
+        config = {k: v for k, v in self.primary_config.items() if k not in ('host', 'port')}
+        if 'dbname' in replica:
+            config.pop('database', None)
+        config.update(replica)
+        return config
+
+    @staticmethod
+    def replica_lag(conn) -> float:
+        cursor = conn.cursor()
+        cursor.execute(REPLICA_LAG_QUERY)
+        lag = float(cursor.fetchone()[0])
+        cursor.close()
+        conn.rollback()
+        return lag
+
+    def primary(self):
+        """Conexión de escritura"""
+        self.stats['primary'] += 1
+        return psycopg2.connect(**self.primary_config)
+
+    def reader(self):
+        """
+        Conexión de solo lectura: la primera réplica (round-robin) que
+        responda y tenga lag <= max_lag_seconds; si no, el primario.
+        """
+        for _ in range(len(self.replica_configs)):
+            index = next(self._next_replica)
+            config = self.replica_configs[index]
+            label = f"{config.get('host', 'localhost')}:{config.get('port', 5432)}"
+            try:
+                conn = psycopg2.connect(**config)
+            except psycopg2.OperationalError as e:
+                logging.warning(f" Réplica {label} no disponible: {e}")
+                continue
+
+            try:
+                lag = self.replica_lag(conn)
+            except psycopg2.Error as e:
+                logging.warning(f" Réplica {label} no pudo medir su lag: {e}")
+                conn.close()
+                continue
+            if lag > self.max_lag_seconds:
+                logging.warning(f" Réplica {label} con lag {lag:.1f}s > {self.max_lag_seconds}s, se descarta")
+                conn.close()
+                continue
+
+            conn.set_session(readonly=True)
+            self.stats['replica'] += 1
+            logging.info(f" Lecturas enrutadas a réplica {label} (lag {lag:.1f}s)")
+            return conn
+
+        if self.replica_configs:
+            self.stats['fallback'] += 1
+            logging.warning(" Ninguna réplica utilizable, lecturas al primario")
+        conn = psycopg2.connect(**self.primary_config)
+        conn.set_session(readonly=True)
+        return conn
+
+
+def router_from_env(primary_config: Dict) -> ConnectionRouter:
+    """Router configurado por POSTGRES_REPLICA_DSNS / POSTGRES_MAX_REPLICA_LAG_SECONDS"""
+    dsns = [d.strip() for d in os.getenv('POSTGRES_REPLICA_DSNS', '').split(';') if d.strip()]
+    return ConnectionRouter(
+        primary_config,
+        dsns,
+        float(os.getenv('POSTGRES_MAX_REPLICA_LAG_SECONDS', '30'))
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Estado de las réplicas configuradas')
+    parser.parse_args(argv)
+
+    from benchmark_queries import POSTGRES_CONFIG
+    router = router_from_env(POSTGRES_CONFIG)
+    print(f"\n{'Servidor':<30}{'Rol':<10}{'Lag (s)':>10}")
+    print("-" * 50)
+    targets = [('primario', POSTGRES_CONFIG)] + [('réplica', c) for c in router.replica_configs]
+    for role, config in targets:
+        label = f"{config.get('host', 'localhost')}:{config.get('port', 5432)}"
+        try:
+            conn = psycopg2.connect(**config)
+        except psycopg2.OperationalError:
+            lag = 'caída'
+        else:
+            try:
+                lag = f"{router.replica_lag(conn):.1f}"
+            except psycopg2.Error:
+                lag = 'error'
+            finally:
+                conn.close()
+        print(f"{label:<30}{role:<10}{lag:>10}")
+    print(f"\nLag máximo tolerado: {router.max_lag_seconds}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,545 @@
+"""
+FleetLogix - Servicio de Reportes
+Expone las queries de 02_queries_analysis.sql como funciones tipadas
+respaldadas por prepared statements del servidor (PREPARE/EXECUTE), con
+caché TTL/LRU por parámetros que se invalida cuando cambia high_water_marks
+(06_high_water_marks.sql)
+"""
+
+import argparse
+import logging
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from benchmark_queries import POSTGRES_CONFIG
+from pg_router import router_from_env
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+
+# -------------------------------------------------
+# Tipos de resultado
+# -------------------------------------------------
+class VehicleTypeCount(NamedTuple):
+    vehicle_type: str
+    total: int
+
+
+class ExpiringLicense(NamedTuple):
+    license_expiry: date
+    full_name: str
+    license_number: str
+
+
+class TripStatusCount(NamedTuple):
+    status: str
+    trip_count: int
+
+
+class CityDeliveries(NamedTuple):
+    destination_city: str
+    deliveries: int
+    total_kg: Decimal
+
+
+class DriverWorkload(NamedTuple):
+    full_name: str
+    total_trips: int
+
+
+class DriverMonthlyDeliveries(NamedTuple):
+    full_name: str
+    total_deliveries: int
+    monthly_average: int
+
+
+class RouteFuel(NamedTuple):
+    route: str
+    distance_km: Decimal
+    fuel_liters: Decimal
+    litros_100km: Decimal
+
+
+class MaintenanceCostPerKm(NamedTuple):
+    vehicle_type: str
+    cost_per_km: Decimal
+    total_km: Decimal
+    total_cost: Decimal
+
+
+class DriverRank(NamedTuple):
+    rank: int
+    driver_id: int
+    full_name: str
+    total_kg: Decimal
+    on_time: int
+    total: int
+    on_time_pct: Decimal
+
+
+# Modo aproximado (muestreo de deliveries): estimación ± error al 95%
+class DriverDeliveriesSample(NamedTuple):
+    full_name: str
+    sampled: int
+
+
+class DriverRankingSample(NamedTuple):
+    driver_id: int
+    full_name: str
+    sampled: int
+    sum_kg: Decimal
+    sum_kg_squared: Decimal
+    on_time: int
+
+
+class ApproxDriverDeliveries(NamedTuple):
+    full_name: str
+    total_deliveries: int
+    total_deliveries_error: int
+    monthly_average: int
+
+
+class ApproxDriverRank(NamedTuple):
+    rank: int
+    driver_id: int
+    full_name: str
+    total_kg: float
+    total_kg_error: float
+    on_time_pct: float
+    on_time_pct_error: float
+    sample_size: int
+
+
+Z_95 = 1.96
+SAMPLE_METHODS = ('system', 'bernoulli')
+
+# Anclas de ventana: high_water_marks si existe, max() si no
+HIGH_WATER_ANCHORS = {
+    'trips.departure_datetime': (
+        "(select max_value from high_water_marks "
+        "where table_name = 'trips' and column_name = 'departure_datetime')",
+        "(select max(departure_datetime) from trips)"
+    ),
+    'deliveries.delivered_datetime': (
+        "(select max_value from high_water_marks "
+        "where table_name = 'deliveries' and column_name = 'delivered_datetime')",
+        "(select max(delivered_datetime) from deliveries)"
+    )
+}
+
+# nombre -> (tipos de parámetros, SQL con $n, tipo de fila)
+REPORTS: Dict[str, Tuple[Tuple[str, ...], str, type]] = {
+    # Query 1
+    'vehicles_by_type': ((), """
+        select vehicle_type, count(*)
+        from vehicles
+        group by vehicle_type
+        order by vehicle_type
+    """, VehicleTypeCount),
+
+    # Query 2
+    'expiring_licenses': (('integer',), """
+        select license_expiry, concat(first_name, ' ', last_name), license_number
+        from drivers
+        where license_expiry < CURRENT_DATE + $1 * INTERVAL '1 day'
+        order by license_expiry
+    """, ExpiringLicense),
+
+    # Query 3
+    'trips_by_status': ((), """
+        select status, count(*)
+        from trips
+        group by status
+        order by status
+    """, TripStatusCount),
+
+    # Query 4
+    'deliveries_by_city': (('integer',), """
+        select r.destination_city, count(d.delivery_id), sum(d.package_weight_kg)
+        from deliveries as d
+        inner join trips as t on t.trip_id = d.trip_id
+        inner join routes as r on r.route_id = t.route_id
+        where d.delivered_datetime >= {trips.departure_datetime} - $1 * INTERVAL '1 month'
+        group by r.destination_city
+        order by count(d.delivery_id) desc
+    """, CityDeliveries),
+
+    # Query 5
+    'driver_workload': ((), """
+        select concat(d.first_name, ' ', d.last_name), count(t.trip_id) as total_viajes
+        from drivers as d
+        inner join trips as t on t.driver_id = d.driver_id
+        where d.status = 'active'
+        group by d.first_name, d.last_name
+        order by total_viajes desc
+    """, DriverWorkload),
+
+    # Query 6
+    'driver_monthly_deliveries': (('integer',), """
+        select concat(dr.first_name, ' ', dr.last_name),
+               count(d.delivery_id) as total_deliveries,
+               count(d.delivery_id) / $1
+        from drivers as dr
+        join trips as t on t.driver_id = dr.driver_id
+        join deliveries as d on d.trip_id = t.trip_id
+        where d.delivered_datetime >= {deliveries.delivered_datetime} - $1 * INTERVAL '1 month'
+        group by dr.first_name, dr.last_name
+        order by total_deliveries desc
+    """, DriverMonthlyDeliveries),
+
+    # Query 7
+    'fuel_by_route': (('integer',), """
+        select concat(r.origin_city, ' a ', r.destination_city),
+               sum(r.distance_km),
+               sum(t.fuel_consumed_liters),
+               (sum(r.distance_km) / sum(t.fuel_consumed_liters) * 100) as litros_100km
+        from routes as r
+        inner join trips as t on t.route_id = r.route_id
+        group by r.origin_city, r.destination_city
+        order by litros_100km desc
+        limit $1
+    """, RouteFuel),
+
+    # Query 9
+    'maintenance_cost_per_km': ((), """
+        with km_por_vehiculos as (
+            select t.vehicle_id, sum(r.distance_km) as total_km
+            from trips as t
+            inner join routes as r on r.route_id = t.route_id
+            group by t.vehicle_id
+        ),
+        costo_mantenimiento_por_vehiculo as (
+            select v.vehicle_id, v.vehicle_type, sum(m.cost) as costo_mantenimiento
+            from maintenance m
+            join vehicles as v on v.vehicle_id = m.vehicle_id
+            group by v.vehicle_id
+        )
+        select c.vehicle_type,
+               round(sum(c.costo_mantenimiento) / sum(k.total_km), 2),
+               sum(k.total_km),
+               sum(c.costo_mantenimiento)
+        from costo_mantenimiento_por_vehiculo as c
+        join km_por_vehiculos as k on k.vehicle_id = c.vehicle_id
+        group by c.vehicle_type
+        order by c.vehicle_type
+    """, MaintenanceCostPerKm),
+
+    # Query 10
+    'driver_ranking': (('integer',), """
+        with driver_ranking as (
+            select d.driver_id, d.first_name, d.last_name,
+                   sum(del.package_weight_kg) as total_kg,
+                   sum(case when del.delivered_datetime <= del.scheduled_datetime then 1 else 0 end) as entregas_a_tiempo,
+                   count(*) as entregas_totales
+            from drivers as d
+            join trips as t on t.driver_id = d.driver_id
+            join deliveries as del on del.trip_id = t.trip_id
+            where del.delivered_datetime is not null
+              and del.scheduled_datetime is not null
+            group by d.driver_id, d.first_name, d.last_name
+        )
+        select rank() over (
+                   order by (total_kg * (entregas_a_tiempo::numeric / nullif(entregas_totales, 0))) desc
+               ) as rank,
+               driver_id,
+               concat(first_name, ' ', last_name),
+               total_kg,
+               entregas_a_tiempo,
+               entregas_totales,
+               round(100.0 * (entregas_a_tiempo::numeric / nullif(entregas_totales, 0)), 2)
+        from driver_ranking
+        order by rank, driver_id
+        limit $1
+    """, DriverRank)
+}
+
+# Queries 6 y 10 sobre una muestra de deliveries (TABLESAMPLE con porcentaje y semilla).
+# SYSTEM muestrea páginas completas (lee solo ese % de la tabla, más rápido pero con
+# entregas correlacionadas por página); BERNOULLI muestrea filas (recorre toda la tabla).
+SAMPLE_REPORTS = {
+    'driver_deliveries_sample': (('integer', 'real', 'integer'), """
+        select concat(dr.first_name, ' ', dr.last_name), count(*)
+        from deliveries as d TABLESAMPLE {method} ($2) REPEATABLE ($3)
+        join trips as t on t.trip_id = d.trip_id
+        join drivers as dr on dr.driver_id = t.driver_id
+        where d.delivered_datetime >= {deliveries.delivered_datetime} - $1 * INTERVAL '1 month'
+        group by dr.first_name, dr.last_name
+    """, DriverDeliveriesSample),
+
+    'driver_ranking_sample': (('real', 'integer'), """
+        select d.driver_id,
+               concat(d.first_name, ' ', d.last_name),
+               count(*),
+               coalesce(sum(del.package_weight_kg), 0),
+               coalesce(sum(del.package_weight_kg * del.package_weight_kg), 0),
+               sum(case when del.delivered_datetime <= del.scheduled_datetime then 1 else 0 end)
+        from deliveries as del TABLESAMPLE {method} ($1) REPEATABLE ($2)
+        join trips as t on t.trip_id = del.trip_id
+        join drivers as d on d.driver_id = t.driver_id
+        where del.delivered_datetime is not null
+          and del.scheduled_datetime is not null
+        group by d.driver_id, d.first_name, d.last_name
+    """, DriverRankingSample)
+}
+
+for _name, (_types, _sql, _row_type) in SAMPLE_REPORTS.items():
+    for _method in SAMPLE_METHODS:
+        REPORTS[f'{_name}_{_method}'] = (_types, _sql.replace('{method}', _method.upper()), _row_type)
+
+
+class ReportCache:
+    """Caché LRU con expiración por TTL; las entradas se guardan como tuplas inmutables"""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ReportService:
+    """
+    Reportes de análisis con prepared statements y caché.
+    Cada `hw_check_seconds` se consulta high_water_marks; si cambió (hubo
+    escrituras en trips/deliveries) se vacía la caché. Entre chequeos,
+    un hit de caché no llega a PostgreSQL. Los cambios en vehicles, drivers,
+    routes y maintenance no mueven el high-water mark: los cubre el TTL.
+    """
+
+    def __init__(self, conn=None, cache: ReportCache = None, hw_check_seconds: float = 5.0):
+        self.conn = conn
+        self.cache = cache or ReportCache()
+        self.hw_check_seconds = hw_check_seconds
+        self._prepared = set()
+        self._has_high_water = None
+        self._hw_token = None
+        self._hw_checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        if self.conn is None or self.conn.closed:
+            # Solo lecturas: réplica si hay una con lag aceptable (pg_router.py)
+            self.conn = router_from_env(POSTGRES_CONFIG).reader()
+            self._prepared.clear()
+        self.conn.autocommit = True
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT to_regclass('high_water_marks') IS NOT NULL")
+        self._has_high_water = cursor.fetchone()[0]
+        cursor.close()
+        logging.info(f" Conectado a PostgreSQL (high_water_marks: {'sí' if self._has_high_water else 'no'})")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+    # -------------------------------------------------
+    # Ejecución
+    # -------------------------------------------------
+    def _check_high_water(self):
+        """Vaciar la caché si cambió el high-water mark (como máximo una consulta por intervalo)"""
+        if not self._has_high_water:
+            return
+        now = time.monotonic()
+        if now - self._hw_checked_at < self.hw_check_seconds:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT max(updated_at), sum(row_count) FROM high_water_marks")
+        token = cursor.fetchone()
+        cursor.close()
+        self._hw_checked_at = now
+        if token != self._hw_token:
+            if self._hw_token is not None:
+                logging.info(" high_water_marks cambió: caché invalidada")
+            self.cache.clear()
+            self._hw_token = token
+
+    def _prepare(self, cursor, name: str):
+        param_types, sql, _ = REPORTS[name]
+        anchors = {key: values[0 if self._has_high_water else 1] for key, values in HIGH_WATER_ANCHORS.items()}
+        for key, anchor in anchors.items():
+            sql = sql.replace('{' + key + '}', anchor)
+        types = f"({', '.join(param_types)})" if param_types else ''
+        cursor.execute(f"PREPARE report_{name}{types} AS {sql}")
+        self._prepared.add(name)
+
+    def run(self, name: str, *params) -> Tuple:
+        """Ejecutar un reporte por nombre; devuelve una tupla de filas tipadas"""
+        with self._lock:
+            if self._has_high_water is None:
+                self.connect()
+            self._check_high_water()
+
+            key = (name, params)
+            hit, rows = self.cache.get(key)
+            if hit:
+                return rows
+
+            cursor = self.conn.cursor()
+            try:
+                if name not in self._prepared:
+                    self._prepare(cursor, name)
+                placeholders = f"({', '.join(['%s'] * len(params))})" if params else ''
+                cursor.execute(f"EXECUTE report_{name}{placeholders}", params)
+                row_type = REPORTS[name][2]
+                rows = tuple(row_type(*row) for row in cursor.fetchall())
+            finally:
+                cursor.close()
+
+            self.cache.put(key, rows)
+            return rows
+
+    # -------------------------------------------------
+    # Reportes
+    # -------------------------------------------------
+    def vehicles_by_type(self) -> Tuple[VehicleTypeCount, ...]:
+        return self.run('vehicles_by_type')
+
+    def expiring_licenses(self, days: int = 30) -> Tuple[ExpiringLicense, ...]:
+        return self.run('expiring_licenses', days)
+
+    def trips_by_status(self) -> Tuple[TripStatusCount, ...]:
+        return self.run('trips_by_status')
+
+    def deliveries_by_city(self, months: int = 2) -> Tuple[CityDeliveries, ...]:
+        return self.run('deliveries_by_city', months)
+
+    def driver_workload(self) -> Tuple[DriverWorkload, ...]:
+        return self.run('driver_workload')
+
+    def driver_monthly_deliveries(self, months: int = 6) -> Tuple[DriverMonthlyDeliveries, ...]:
+        return self.run('driver_monthly_deliveries', months)
+
+    def fuel_by_route(self, limit: int = 10) -> Tuple[RouteFuel, ...]:
+        return self.run('fuel_by_route', limit)
+
+    def maintenance_cost_per_km(self) -> Tuple[MaintenanceCostPerKm, ...]:
+        return self.run('maintenance_cost_per_km')
+
+    def driver_ranking(self, limit: int = 20) -> Tuple[DriverRank, ...]:
+        return self.run('driver_ranking', limit)
+
+    # -------------------------------------------------
+    # Modo aproximado
+    # -------------------------------------------------
+    @staticmethod
+    def _sample_fraction(sample_pct: float, method: str) -> float:
+        """Fracción muestreada; valida el método y el porcentaje antes de ir a PostgreSQL"""
+        if method not in SAMPLE_METHODS:
+            raise ValueError(f"Método de muestreo no soportado: {method!r} (usar {', '.join(SAMPLE_METHODS)})")
+        if not 0 < sample_pct <= 100:
+            raise ValueError(f"sample_pct debe estar en (0, 100]: {sample_pct}")
+        return sample_pct / 100
+
+    def driver_monthly_deliveries_approx(self, months: int = 6, sample_pct: float = 10.0,
+                                         method: str = 'system', seed: int = 0) -> Tuple[ApproxDriverDeliveries, ...]:
+        """
+        Query 6 sobre una muestra del sample_pct% de deliveries. Cada conteo se
+        escala por 100/sample_pct; el error es el intervalo al 95% de un conteo
+        bajo muestreo Bernoulli (con SYSTEM es optimista si hay correlación por página).
+        """
+        q = self._sample_fraction(sample_pct, method)
+        rows = self.run(f'driver_deliveries_sample_{method}', months, sample_pct, seed)
+        result = [
+            ApproxDriverDeliveries(
+                row.full_name,
+                round(row.sampled / q),
+                round(Z_95 * math.sqrt(row.sampled * (1 - q)) / q),
+                int(row.sampled / q) // months
+            )
+            for row in rows
+        ]
+        return tuple(sorted(result, key=lambda r: r.total_deliveries, reverse=True))
+
+    def driver_ranking_approx(self, limit: int = 20, sample_pct: float = 10.0,
+                              method: str = 'system', seed: int = 0) -> Tuple[ApproxDriverRank, ...]:
+        """
+        Query 10 sobre una muestra: total_kg se estima con Horvitz-Thompson
+        (suma / q, error con Σx²) y el % a tiempo como proporción de la muestra.
+        """
+        q = self._sample_fraction(sample_pct, method)
+        rows = self.run(f'driver_ranking_sample_{method}', sample_pct, seed)
+
+        estimates = []
+        for row in rows:
+            total_kg = float(row.sum_kg) / q
+            kg_error = Z_95 * math.sqrt((1 - q) * float(row.sum_kg_squared)) / q
+            ratio = row.on_time / row.sampled
+            ratio_error = Z_95 * math.sqrt(ratio * (1 - ratio) / row.sampled * (1 - q))
+            estimates.append((total_kg * ratio, row, total_kg, kg_error, ratio, ratio_error))
+        estimates.sort(key=lambda e: (-e[0], e[1].driver_id))
+
+        result = []
+        rank = 0
+        previous_score = None
+        for position, (score, row, total_kg, kg_error, ratio, ratio_error) in enumerate(estimates, 1):
+            if score != previous_score:
+                rank, previous_score = position, score
+            result.append(ApproxDriverRank(
+                rank, row.driver_id, row.full_name,
+                round(total_kg, 2), round(kg_error, 2),
+                round(100 * ratio, 2), round(100 * ratio_error, 2),
+                row.sampled
+            ))
+        return tuple(result[:limit])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Servicio de reportes FleetLogix (demo de caché)')
+    parser.add_argument('--repeat', type=int, default=3, help='Llamadas por reporte')
+    args = parser.parse_args(argv)
+
+    service = ReportService()
+    service.connect()
+    print(f"\n{'Reporte':<28}{'Filas':>7}{'1ra ms':>10}{'Cacheada ms':>13}")
+    print("-" * 58)
+    for name in REPORTS:
+        if not hasattr(service, name):
+            continue
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            rows = getattr(service, name)()
+            timings.append((time.perf_counter() - start) * 1000)
+        cached = min(timings[1:]) if len(timings) > 1 else float('nan')
+        print(f"{name:<28}{len(rows):>7}{timings[0]:>10.3f}{cached:>13.4f}")
+    print(f"\nCaché: {service.cache.hits} hits, {service.cache.misses} misses ({datetime.now():%H:%M:%S})")
+    service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
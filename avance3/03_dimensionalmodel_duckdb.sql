@@ -0,0 +1,223 @@
+-- =====================================================
+-- FLEETLOGIX - DATA WAREHOUSE DIMENSIONAL MODEL (DuckDB)
+-- Mismo modelo estrella de 03_dimensionalmodel.sql para ejecución local
+-- Se usa desde dw_backends.DuckDBBackend (ETL offline, CI, benchmarks)
+-- =====================================================
+
+-- DuckDB no soporta IDENTITY: las claves surrogadas usan secuencias
+CREATE SEQUENCE IF NOT EXISTS seq_vehicle_key START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_driver_key START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_route_key START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_customer_key START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_customer_id START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_delivery_key START 1;
+
+-- =====================================================
+-- DIMENSIONES
+-- =====================================================
+
+-- Dimensión Fecha
+CREATE TABLE IF NOT EXISTS dim_date (
+    date_key INT PRIMARY KEY,
+    full_date DATE NOT NULL,
+    day_of_week INT,
+    day_name VARCHAR(10),
+    day_of_month INT,
+    day_of_year INT,
+    week_of_year INT,
+    month_num INT,
+    month_name VARCHAR(10),
+    quarter INT,
+    year INT,
+    is_weekend BOOLEAN,
+    is_holiday BOOLEAN,
+    holiday_name VARCHAR(50),
+    fiscal_quarter INT,
+    fiscal_year INT
+);
+
+-- Dimensión Tiempo (para análisis por hora)
+CREATE TABLE IF NOT EXISTS dim_time (
+    time_key INT PRIMARY KEY,
+    hour INT,
+    minute INT,
+    second INT,
+    time_of_day VARCHAR(20),
+    hour_24 VARCHAR(5),
+    hour_12 VARCHAR(8),
+    am_pm VARCHAR(2),
+    is_business_hour BOOLEAN,
+    shift VARCHAR(20)
+);
+
+-- Dimensión Vehículo
+CREATE TABLE IF NOT EXISTS dim_vehicle (
+    vehicle_key INT PRIMARY KEY DEFAULT nextval('seq_vehicle_key'),
+    vehicle_id INT NOT NULL,
+    license_plate VARCHAR(20),
+    vehicle_type VARCHAR(50),
+    capacity_kg DECIMAL(10,2),
+    fuel_type VARCHAR(20),
+    acquisition_date DATE,
+    age_months INT,
+    status VARCHAR(20),
+    last_maintenance_date DATE,
+    valid_from DATE,
+    valid_to DATE,
+    is_current BOOLEAN
+);
+
+-- Dimensión Conductor
+CREATE TABLE IF NOT EXISTS dim_driver (
+    driver_key INT PRIMARY KEY DEFAULT nextval('seq_driver_key'),
+    driver_id INT NOT NULL,
+    employee_code VARCHAR(20),
+    full_name VARCHAR(200),
+    license_number VARCHAR(50),
+    license_expiry DATE,
+    phone VARCHAR(20),
+    hire_date DATE,
+    experience_months INT,
+    status VARCHAR(20),
+    performance_category VARCHAR(20),
+    valid_from DATE,
+    valid_to DATE,
+    is_current BOOLEAN
+);
+
+-- Dimensión Ruta
+CREATE TABLE IF NOT EXISTS dim_route (
+    route_key INT PRIMARY KEY DEFAULT nextval('seq_route_key'),
+    route_id INT NOT NULL,
+    route_code VARCHAR(20),
+    origin_city VARCHAR(100),
+    destination_city VARCHAR(100),
+    distance_km DECIMAL(10,2),
+    estimated_duration_hours DECIMAL(5,2),
+    toll_cost DECIMAL(10,2),
+    difficulty_level VARCHAR(20),
+    route_type VARCHAR(20)
+);
+
+-- Dimensión Cliente
+CREATE TABLE IF NOT EXISTS dim_customer (
+    customer_key INT PRIMARY KEY DEFAULT nextval('seq_customer_key'),
+    customer_id INT DEFAULT nextval('seq_customer_id'),
+    customer_name VARCHAR(200),
+    customer_type VARCHAR(50),
+    city VARCHAR(100),
+    first_delivery_date DATE,
+    total_deliveries INT,
+    customer_category VARCHAR(20)
+);
+
+-- =====================================================
+-- TABLA DE HECHOS
+-- =====================================================
+
+-- Sin FOREIGN KEY: DuckDB las valida fila a fila y penaliza la carga masiva
+CREATE TABLE IF NOT EXISTS fact_deliveries (
+    -- Keys
+    delivery_key INT PRIMARY KEY DEFAULT nextval('seq_delivery_key'),
+    date_key INT,
+    scheduled_time_key INT,
+    delivered_time_key INT,
+    vehicle_key INT,
+    driver_key INT,
+    route_key INT,
+    customer_key INT,
+
+    -- Degenerate dimensions
+    delivery_id INT NOT NULL,
+    trip_id INT NOT NULL,
+    tracking_number VARCHAR(50),
+
+    -- Métricas
+    package_weight_kg DECIMAL(10,2),
+    distance_km DECIMAL(10,2),
+    fuel_consumed_liters DECIMAL(10,2),
+    delivery_time_minutes INT,
+    delay_minutes INT,
+
+    -- Métricas calculadas
+    deliveries_per_hour DECIMAL(5,2),
+    fuel_efficiency_km_per_liter DECIMAL(5,2),
+    cost_per_delivery DECIMAL(10,2),
+    revenue_per_delivery DECIMAL(10,2),
+
+    -- Indicadores
+    is_on_time BOOLEAN,
+    is_damaged BOOLEAN,
+    has_signature BOOLEAN,
+    delivery_status VARCHAR(20),
+
+    -- Auditoría
+    etl_batch_id BIGINT,
+    etl_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- =====================================================
+-- TABLAS AUXILIARES
+-- =====================================================
+
+-- Tabla de staging para ETL
+CREATE TABLE IF NOT EXISTS staging_daily_load (
+    delivery_id INT,
+    driver_id INT,
+    vehicle_id INT,
+    route_id INT,
+    load_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabla de totales pre-calculados
+CREATE TABLE IF NOT EXISTS daily_delivery_totals (
+    date_key INT PRIMARY KEY,
+    total_deliveries INT,
+    total_distance_km DECIMAL(12,2),
+    total_fuel_liters DECIMAL(12,2),
+    on_time_deliveries INT,
+    total_delayed INT,
+    avg_delay_minutes DECIMAL(8,2),
+    total_revenue DECIMAL(15,2),
+    total_cost DECIMAL(15,2),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- =====================================================
+-- VISTAS POR ROL (DuckDB no tiene SECURE VIEW ni roles)
+-- =====================================================
+
+-- Vista para Ventas (solo sus clientes)
+CREATE OR REPLACE VIEW v_sales_deliveries AS
+SELECT
+    d.full_date,
+    c.customer_name,
+    c.customer_type,
+    f.package_weight_kg,
+    f.delivery_status,
+    f.revenue_per_delivery
+FROM fact_deliveries f
+JOIN dim_date d ON f.date_key = d.date_key
+JOIN dim_customer c ON f.customer_key = c.customer_key
+WHERE c.customer_type != 'Gobierno';
+
+-- Vista para Operaciones (todo)
+CREATE OR REPLACE VIEW v_operations_deliveries AS
+SELECT
+    d.full_date,
+    t.hour_24 as hora,
+    v.license_plate,
+    dr.full_name as conductor,
+    r.route_code,
+    c.customer_name,
+    f.delivery_time_minutes,
+    f.delay_minutes,
+    f.is_on_time,
+    f.fuel_consumed_liters
+FROM fact_deliveries f
+JOIN dim_date d ON f.date_key = d.date_key
+JOIN dim_time t ON f.scheduled_time_key = t.time_key
+JOIN dim_vehicle v ON f.vehicle_key = v.vehicle_key
+JOIN dim_driver dr ON f.driver_key = dr.driver_key
+JOIN dim_route r ON f.route_key = r.route_key
+JOIN dim_customer c ON f.customer_key = c.customer_key;
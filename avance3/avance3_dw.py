@@ -1,11 +1,11 @@
 """
 FleetLogix - Pipeline ETL Automático
-Extrae de PostgreSQL, Transforma y Carga en Snowflake
+Extrae de PostgreSQL, Transforma y Carga en Snowflake (o DuckDB local)
 Ejecución diaria automatizada
 """
 
+import importlib.util
 import psycopg2
-import snowflake.connector
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -16,6 +16,7 @@ import json
 import os
 from typing import Dict, List, Tuple
 from dotenv import load_dotenv
+from dw_backends import WarehouseBackend, create_backend
 
 # Cargar variables de entorno
 load_dotenv()
@@ -48,38 +49,87 @@ SNOWFLAKE_CONFIG = {
     'schema': os.getenv('SNOWFLAKE_SCHEMA')
 }
 
+# Backend del Data Warehouse: 'snowflake' (producción) o 'duckdb' (local/CI)
+DW_BACKEND = os.getenv('DW_BACKEND', 'snowflake')
+DUCKDB_PATH = os.getenv('DUCKDB_PATH', 'fleetlogix_dw.duckdb')
+
+# Data Lake: p.ej. s3://fleetlogix-data/processed-data/fact_deliveries o una ruta local
+# (vacío = exportación deshabilitada). S3_ENDPOINT_URL apunta a MinIO/moto en local.
+LAKE_URI = os.getenv('LAKE_URI')
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+
+# Perfil de velocidades para la Lambda calcular-eta, p.ej.
+# s3://fleetlogix-data/models/speed_profile.npz (vacío = no se publica)
+SPEED_PROFILE_URI = os.getenv('SPEED_PROFILE_URI')
+
+# Réplicas de lectura para el extract (ver avance2/pg_router.py); vacío = primario
+POSTGRES_REPLICA_DSNS = os.getenv('POSTGRES_REPLICA_DSNS')
+ROUTER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'avance2', 'pg_router.py')
+
+# Columnas de carga de fact_deliveries y daily_delivery_totals
+FACT_COLUMNS = [
+    'date_key', 'scheduled_time_key', 'delivered_time_key',
+    'vehicle_key', 'driver_key', 'route_key', 'customer_key',
+    'delivery_id', 'trip_id', 'tracking_number',
+    'package_weight_kg', 'distance_km', 'fuel_consumed_liters',
+    'delivery_time_minutes', 'delay_minutes', 'deliveries_per_hour',
+    'fuel_efficiency_km_per_liter', 'cost_per_delivery', 'revenue_per_delivery',
+    'is_on_time', 'is_damaged', 'has_signature', 'delivery_status',
+    'etl_batch_id'
+]
+
+DAILY_TOTALS_COLUMNS = [
+    'date_key', 'total_deliveries', 'total_distance_km', 'total_fuel_liters',
+    'on_time_deliveries', 'total_delayed', 'avg_delay_minutes',
+    'total_revenue', 'total_cost', 'created_at'
+]
+
 class FleetLogixETL:
-    def __init__(self):
+    def __init__(self, warehouse: WarehouseBackend = None):
         self.pg_conn = None
-        self.sf_conn = None
+        self.dw_conn = warehouse
         self.batch_id = int(datetime.now().timestamp())
         self.metrics = {
             'records_extracted': 0,
             'records_transformed': 0,
             'records_loaded': 0,
+            'records_exported': 0,
             'errors': 0
         }
     
     def connect_databases(self):
-        """Establecer conexiones con PostgreSQL y Snowflake"""
+        """Establecer conexiones con PostgreSQL y el Data Warehouse"""
         try:
-            # PostgreSQL
-            self.pg_conn = psycopg2.connect(**POSTGRES_CONFIG)
+            # PostgreSQL (el ETL solo lee: réplica si hay una con lag aceptable)
+            if POSTGRES_REPLICA_DSNS:
+                self.pg_conn = self._load_router().reader()
+            else:
+                self.pg_conn = psycopg2.connect(**POSTGRES_CONFIG)
             logging.info(" Conectado a PostgreSQL")
             
-            # Snowflake
-            self.sf_conn = snowflake.connector.connect(**SNOWFLAKE_CONFIG)
-            logging.info(" Conectado a Snowflake")
+            # Data Warehouse (Snowflake o DuckDB según DW_BACKEND)
+            if self.dw_conn is None:
+                self.dw_conn = create_backend(DW_BACKEND, SNOWFLAKE_CONFIG, DUCKDB_PATH)
+            self.dw_conn.connect()
+            logging.info(f" Conectado a {self.dw_conn.name}")
             
             return True
         except Exception as e:
             logging.error(f" Error en conexión: {e}")
             return False
     
+    @staticmethod
+    def _load_router():
+        """Cargar ConnectionRouter de avance2/pg_router.py"""
+        spec = importlib.util.spec_from_file_location('pg_router', ROUTER_FILE)
+        pg_router = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(pg_router)
+        return pg_router.router_from_env(POSTGRES_CONFIG)
+
     def populate_dim_date(self):
         """Poblar dimensión de fechas"""
         logging.info(" Poblando dim_date...")
-        cursor = self.sf_conn.cursor()
+        cursor = self.dw_conn.cursor()
         try:
             cursor.execute("SELECT COUNT(*) FROM dim_date")
             count = cursor.fetchone()[0]
@@ -104,14 +154,14 @@ class FleetLogixETL:
                 quarter, year, is_weekend, is_holiday, fiscal_quarter, fiscal_year)
                 VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
             """, date_data)
-            self.sf_conn.commit()
+            self.dw_conn.commit()
             logging.info(f" dim_date poblada con {len(date_data)} registros")
         except Exception as e:
             logging.error(f" Error en dim_date: {e}")
     
     def populate_dim_time(self):
         """Poblar dimensión de tiempo"""
-        cursor = self.sf_conn.cursor()
+        cursor = self.dw_conn.cursor()
         try:
             cursor.execute("SELECT COUNT(*) FROM dim_time")
             count = cursor.fetchone()[0]
@@ -137,11 +187,22 @@ class FleetLogixETL:
                 time_of_day, hour_24, hour_12, am_pm, is_business_hour, shift)
                 VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
             """, time_data)
-            self.sf_conn.commit()
+            self.dw_conn.commit()
             logging.info(f" dim_time poblada con {len(time_data)} registros")
         except Exception as e:
             logging.error(f" Error en dim_time: {e}")
     
+    def _scheduled_anchor(self) -> str:
+        """Máximo scheduled_datetime: desde high_water_marks si existe (avance2/06_high_water_marks.sql)"""
+        cursor = self.pg_conn.cursor()
+        cursor.execute("SELECT to_regclass('high_water_marks') IS NOT NULL")
+        has_high_water = cursor.fetchone()[0]
+        cursor.close()
+        if has_high_water:
+            return ("select max_value from high_water_marks "
+                    "where table_name = 'deliveries' and column_name = 'scheduled_datetime'")
+        return "select max(scheduled_datetime) from deliveries"
+
     def extract_daily_data(self) -> pd.DataFrame:
         """Extraer datos del día anterior de PostgreSQL"""
         logging.info(" Iniciando extracción de datos...")
@@ -173,11 +234,11 @@ class FleetLogixETL:
         JOIN routes as t3
             ON t3.route_id = t2.route_id
         WHERE delivery_status ='delivered'
-        AND scheduled_datetime >= (select max(scheduled_datetime) from deliveries) - INTERVAL '1 day'
+        AND scheduled_datetime >= ({anchor}) - INTERVAL '1 day'
         """
 
         try:
-            df = pd.read_sql(query, self.pg_conn)
+            df = pd.read_sql(query.format(anchor=self._scheduled_anchor()), self.pg_conn)
             self.metrics['records_extracted'] = len(df)
             logging.info(f" Extraídos {len(df)} registros")
             return df
@@ -254,10 +315,10 @@ class FleetLogixETL:
             return pd.DataFrame()
     
     def load_dimensions(self, df: pd.DataFrame):
-        """Cargar o actualizar dimensiones en Snowflake"""
+        """Cargar o actualizar dimensiones en el Data Warehouse"""
         logging.info(" Cargando dimensiones...")
         
-        cursor = self.sf_conn.cursor()
+        cursor = self.dw_conn.cursor()
         pg_cursor = self.pg_conn.cursor()
         
         try:
@@ -333,19 +394,19 @@ class FleetLogixETL:
             else:
                 logging.info(" No hay clientes nuevos")
             
-            self.sf_conn.commit()
+            self.dw_conn.commit()
             logging.info(" Dimensiones cargadas")
             
         except Exception as e:
             logging.error(f" Error cargando dimensiones: {e}")
-            self.sf_conn.rollback()
+            self.dw_conn.rollback()
             self.metrics['errors'] += 1
     
     def load_facts(self, df: pd.DataFrame):
-        """Cargar hechos en Snowflake"""
+        """Cargar hechos en el Data Warehouse"""
         logging.info(" Cargando tabla de hechos...")
         
-        cursor = self.sf_conn.cursor()
+        cursor = self.dw_conn.cursor()
         
         try:
             # Obtener TODOS los keys de dimensiones en memoria (1 query por dimensión)
@@ -409,27 +470,16 @@ class FleetLogixETL:
                     self.batch_id
                 ))
             
-            # Insertar en batch
-            cursor.executemany("""
-                INSERT INTO fact_deliveries (
-                    date_key, scheduled_time_key, delivered_time_key,
-                    vehicle_key, driver_key, route_key, customer_key,
-                    delivery_id, trip_id, tracking_number,
-                    package_weight_kg, distance_km, fuel_consumed_liters,
-                    delivery_time_minutes, delay_minutes, deliveries_per_hour,
-                    fuel_efficiency_km_per_liter, cost_per_delivery, revenue_per_delivery,
-                    is_on_time, is_damaged, has_signature, delivery_status,
-                    etl_batch_id
-                ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            """, fact_data)
-            
-            self.sf_conn.commit()
+            # Insertar en batch (carga columnar en DuckDB, executemany en Snowflake)
+            self.dw_conn.bulk_insert('fact_deliveries', FACT_COLUMNS, fact_data)
+            
+            self.dw_conn.commit()
             self.metrics['records_loaded'] = len(fact_data)
             logging.info(f" Cargados {len(fact_data)} registros en fact_deliveries")
             
         except Exception as e:
             logging.error(f" Error cargando hechos: {e}")
-            self.sf_conn.rollback()
+            self.dw_conn.rollback()
             self.metrics['errors'] += 1
     
     def run_etl(self):
@@ -453,9 +503,16 @@ class FleetLogixETL:
                 if not df_transformed.empty:
                     self.load_dimensions(df_transformed)
                     self.load_facts(df_transformed)
+                    if LAKE_URI:
+                        self.export_to_lake(df_transformed)
             
-            # Calcular totales para reportes (opcional)
-            # self._calculate_daily_totals()
+            # Calcular totales para reportes (merge por date_key: reprocesar un batch no duplica)
+            if self.metrics['records_loaded'] > 0:
+                self._calculate_daily_totals()
+            
+            # Perfil de velocidades para las ETAs de las Lambdas
+            if SPEED_PROFILE_URI:
+                self.publish_speed_profile()
             
             # Cerrar conexiones
             self.close_connections()
@@ -470,29 +527,59 @@ class FleetLogixETL:
             self.metrics['errors'] += 1
             self.close_connections()
     
+    def export_to_lake(self, df: pd.DataFrame):
+        """Exportar hechos a Parquet particionado por date_key (processed-data/)"""
+        logging.info(" Exportando hechos al Data Lake...")
+        
+        try:
+            from lake_export import export_fact_partitions
+            self.metrics['records_exported'] = export_fact_partitions(
+                df, LAKE_URI, self.batch_id, endpoint_url=S3_ENDPOINT_URL
+            )
+        except Exception as e:
+            logging.error(f" Error exportando al Data Lake: {e}")
+            self.metrics['errors'] += 1
+    
+    def publish_speed_profile(self):
+        """Reconstruir el perfil ruta × día × hora desde trips y publicarlo"""
+        logging.info(" Publicando perfil de velocidades...")
+        
+        try:
+            from speed_profiles import build_speed_profile, publish_speed_profile
+            profile = build_speed_profile(self.pg_conn)
+            publish_speed_profile(profile, SPEED_PROFILE_URI, endpoint_url=S3_ENDPOINT_URL)
+        except Exception as e:
+            logging.error(f" Error publicando perfil de velocidades: {e}")
+            self.metrics['errors'] += 1
+    
     def _calculate_daily_totals(self):
         """Pre-calcular totales para reportes rápidos"""
-        cursor = self.sf_conn.cursor()
+        cursor = self.dw_conn.cursor()
         
         try:
-            # Insertar totales del día
+            # Recalcular los días tocados por este batch (merge por date_key)
             cursor.execute("""
-                INSERT INTO daily_delivery_totals 
                 SELECT
                     DATE_KEY,
                     COUNT(*) as TOTAL_DELIVERIES,
+                    SUM(DISTANCE_KM) as TOTAL_DISTANCE_KM,
+                    SUM(FUEL_CONSUMED_LITERS) as TOTAL_FUEL_LITERS,
                     SUM(CASE WHEN IS_ON_TIME THEN 1 ELSE 0 END) as ON_TIME_DELIVERIES,
                     SUM(CASE WHEN NOT IS_ON_TIME THEN 1 ELSE 0 END) as TOTAL_DELAYED,
                     AVG(DELAY_MINUTES) as AVG_DELAY_MINUTES,
                     SUM(REVENUE_PER_DELIVERY) as TOTAL_REVENUE,
                     SUM(COST_PER_DELIVERY) as TOTAL_COST,
-                    CURRENT_TIMESTAMP() as ETL_TIMESTAMP
+                    CURRENT_TIMESTAMP as CREATED_AT
                 FROM fact_deliveries
-                WHERE ETL_BATCH_ID = %s
+                WHERE DATE_KEY IN (
+                    SELECT DISTINCT DATE_KEY FROM fact_deliveries WHERE ETL_BATCH_ID = %s
+                )
                 GROUP BY DATE_KEY
             """, (self.batch_id,))
+            totals = cursor.fetchall()
             
-            self.sf_conn.commit()
+            self.dw_conn.merge('daily_delivery_totals', ['date_key'], DAILY_TOTALS_COLUMNS, totals)
+            self.dw_conn.commit()
             logging.info(" Totales diarios calculados")
             
         except Exception as e:
@@ -502,8 +589,8 @@ class FleetLogixETL:
         """Cerrar conexiones a bases de datos"""
         if self.pg_conn:
             self.pg_conn.close()
-        if self.sf_conn:
-            self.sf_conn.close()
+        if self.dw_conn:
+            self.dw_conn.close()
         logging.info(" Conexiones cerradas")
 
 def job():
@@ -0,0 +1,218 @@
+"""
+FleetLogix - Backends del Data Warehouse
+Adaptadores intercambiables para cargar el modelo estrella
+en Snowflake (producción) o DuckDB (local, CI y benchmarks)
+"""
+
+import os
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+DUCKDB_DDL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '03_dimensionalmodel_duckdb.sql')
+
+
+class WarehouseBackend(ABC):
+    """
+    Interfaz común del Data Warehouse usada por FleetLogixETL.
+    Expone la misma API DB-API que usaba el ETL (cursor/commit/rollback/close)
+    más operaciones de carga masiva y merge por clave.
+    """
+    name = 'warehouse'
+
+    def __init__(self):
+        self.conn = None
+
+    @abstractmethod
+    def connect(self):
+        """Abrir la conexión (self.conn) y devolver self"""
+
+    def create_schema(self):
+        """Crear el modelo estrella si el backend lo soporta (no-op por defecto)"""
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def bulk_insert(self, table: str, columns: Sequence[str], rows: List[tuple]):
+        """Insertar filas en batch (executemany por defecto)"""
+        if not rows:
+            return
+        placeholders = ','.join(['%s'] * len(columns))
+        self.cursor().executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            rows
+        )
+
+    @abstractmethod
+    def merge(self, table: str, key_columns: Sequence[str], columns: Sequence[str], rows: List[tuple]):
+        """Insertar o actualizar filas según key_columns (upsert)"""
+
+    def fetch_df(self, query: str, params: Optional[tuple] = None) -> pd.DataFrame:
+        """Ejecutar una consulta (p.ej. sobre las vistas) y devolver un DataFrame"""
+        cursor = self.cursor()
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        columns = [col[0].lower() for col in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+
+class SnowflakeBackend(WarehouseBackend):
+    """Data Warehouse en Snowflake (esquema creado con 03_dimensionalmodel.sql)"""
+    name = 'Snowflake'
+
+    def __init__(self, config: Dict):
+        super().__init__()
+        self.config = config
+
+    def connect(self):
+        # Import diferido: el backend local no requiere el conector de Snowflake
+        import snowflake.connector
+        self.conn = snowflake.connector.connect(**self.config)
+        return self
+
+    def merge(self, table, key_columns, columns, rows):
+        if not rows:
+            return
+        source = ', '.join(f"%s AS {col}" for col in columns)
+        on = ' AND '.join(f"t.{col} = s.{col}" for col in key_columns)
+        updates = ', '.join(f"t.{col} = s.{col}" for col in columns if col not in key_columns)
+        self.cursor().executemany(f"""
+            MERGE INTO {table} t
+            USING (SELECT {source}) s
+            ON {on}
+            WHEN MATCHED THEN UPDATE SET {updates}
+            WHEN NOT MATCHED THEN INSERT ({', '.join(columns)})
+            VALUES ({', '.join(f's.{col}' for col in columns)})
+        """, rows)
+
+
+class _DuckDBCursor:
+    """
+    Cursor compatible con el SQL del ETL sobre una conexión DuckDB.
+    Traduce el paramstyle %s a ? y convierte escalares numpy a tipos Python.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    @staticmethod
+    def _sql(query: str) -> str:
+        return query.replace('%s', '?')
+
+    @staticmethod
+    def _row(row) -> tuple:
+        return tuple(v.item() if isinstance(v, np.generic) else v for v in row)
+
+    @property
+    def description(self):
+        return self._conn.description
+
+    def execute(self, query, params=None):
+        self._conn.execute(self._sql(query), self._row(params) if params else None)
+        return self
+
+    def executemany(self, query, rows):
+        self._conn.executemany(self._sql(query), [self._row(r) for r in rows])
+        return self
+
+    def fetchone(self):
+        return self._conn.fetchone()
+
+    def fetchall(self):
+        return self._conn.fetchall()
+
+    def close(self):
+        pass
+
+
+class DuckDBBackend(WarehouseBackend):
+    """
+    Data Warehouse local en DuckDB (motor columnar embebido).
+    Crea el mismo modelo estrella y vistas desde 03_dimensionalmodel_duckdb.sql.
+    Usar ':memory:' para pruebas de CI sin archivo en disco.
+    """
+    name = 'DuckDB'
+
+    def __init__(self, path: str = ':memory:'):
+        super().__init__()
+        self.path = path
+
+    def connect(self):
+        import duckdb
+        self.conn = duckdb.connect(self.path)
+        self.create_schema()
+        # Igual que DB-API: siempre hay una transacción abierta hasta commit/rollback
+        self.conn.begin()
+        return self
+
+    def create_schema(self):
+        with open(DUCKDB_DDL_PATH, encoding='utf-8') as f:
+            self.conn.execute(f.read())
+        logging.info(f" Modelo estrella listo en DuckDB ({self.path})")
+
+    def cursor(self):
+        # Un único cursor sobre la misma conexión para compartir la transacción
+        return _DuckDBCursor(self.conn)
+
+    def commit(self):
+        self.conn.commit()
+        self.conn.begin()
+
+    def rollback(self):
+        self.conn.rollback()
+        self.conn.begin()
+
+    def close(self):
+        if self.conn:
+            self.conn.commit()
+        super().close()
+
+    def bulk_insert(self, table, columns, rows):
+        # Carga columnar vía DataFrame: mucho más rápida que executemany en DuckDB
+        if not rows:
+            return
+        frame = pd.DataFrame(rows, columns=list(columns))
+        self.conn.register('_bulk_rows', frame)
+        try:
+            self.conn.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM _bulk_rows"
+            )
+        finally:
+            self.conn.unregister('_bulk_rows')
+
+    def merge(self, table, key_columns, columns, rows):
+        if not rows:
+            return
+        updates = ', '.join(f"{col} = excluded.{col}" for col in columns if col not in key_columns)
+        self.cursor().executemany(f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            VALUES ({','.join(['%s'] * len(columns))})
+            ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}
+        """, rows)
+
+
+def create_backend(kind: str, snowflake_config: Optional[Dict] = None,
+                   duckdb_path: str = ':memory:') -> WarehouseBackend:
+    """Crear el backend según DW_BACKEND ('snowflake' o 'duckdb')"""
+    kind = (kind or 'snowflake').lower()
+    if kind == 'duckdb':
+        return DuckDBBackend(duckdb_path)
+    if kind == 'snowflake':
+        return SnowflakeBackend(snowflake_config or {})
+    raise ValueError(f"Backend de Data Warehouse no soportado: {kind}")
@@ -0,0 +1,128 @@
+"""
+FleetLogix - Exportación al Data Lake
+Escribe los hechos transformados como Parquet (ZSTD) particionado por date_key
+en el layout processed-data/ del bucket S3 (o en un directorio local)
+"""
+
+import logging
+import os
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+# Columnas exportadas: claves naturales (independientes de las surrogadas del DW)
+LAKE_COLUMNS = [
+    'delivery_id', 'trip_id', 'tracking_number',
+    'vehicle_id', 'driver_id', 'route_id',
+    'customer_name', 'destination_city',
+    'package_weight_kg', 'distance_km', 'fuel_consumed_liters',
+    'scheduled_datetime', 'delivered_datetime',
+    'delivery_time_minutes', 'delay_minutes', 'deliveries_per_hour',
+    'fuel_efficiency_km_per_liter', 'cost_per_delivery', 'revenue_per_delivery',
+    'is_on_time', 'recipient_signature', 'delivery_status'
+]
+
+PARTITION_FILE = 'part-0.parquet'
+ROW_GROUP_SIZE = 64 * 1024
+# Columnas que no cuentan como cambio al comparar con la partición existente
+CHANGE_IGNORED_COLUMNS = {'etl_batch_id'}
+
+
+def resolve_filesystem(base_uri: str, endpoint_url: Optional[str] = None) -> Tuple[pafs.FileSystem, str]:
+    """
+    Resolver el filesystem destino:
+    - 's3://bucket/processed-data/...' -> S3 (endpoint_url para MinIO/moto locales)
+    - cualquier otra ruta -> filesystem local
+    """
+    parsed = urlparse(base_uri)
+    if parsed.scheme == 's3':
+        if endpoint_url:
+            endpoint = urlparse(endpoint_url)
+            fs = pafs.S3FileSystem(
+                endpoint_override=endpoint.netloc,
+                scheme=endpoint.scheme or 'http',
+                region=os.getenv('AWS_REGION', 'us-east-1')
+            )
+        else:
+            fs = pafs.S3FileSystem(region=os.getenv('AWS_REGION', 'us-east-1'))
+        return fs, f"{parsed.netloc}{parsed.path}".rstrip('/')
+    return pafs.LocalFileSystem(), os.path.abspath(base_uri)
+
+
+def build_lake_frame(df: pd.DataFrame, batch_id: int) -> pd.DataFrame:
+    """Seleccionar columnas de hechos y calcular date_key de forma vectorizada"""
+    lake_df = df[LAKE_COLUMNS].copy()
+    lake_df['scheduled_datetime'] = pd.to_datetime(lake_df['scheduled_datetime'])
+    lake_df['delivered_datetime'] = pd.to_datetime(lake_df['delivered_datetime'])
+    lake_df['date_key'] = lake_df['scheduled_datetime'].dt.strftime('%Y%m%d').astype('int32')
+    lake_df['etl_batch_id'] = batch_id
+    return lake_df
+
+
+def count_changed_rows(existing: pd.DataFrame, incoming: pd.DataFrame) -> int:
+    """
+    Filas de incoming (ya sin duplicados por delivery_id) que no están en existing
+    o que difieren en alguna columna exportada; los nulos en ambos lados son iguales
+    """
+    previous = existing.drop_duplicates(subset='delivery_id', keep='last').set_index('delivery_id')
+    current = incoming.set_index('delivery_id')
+    matched = current.index.isin(previous.index)
+    changed = int((~matched).sum())
+    if matched.any():
+        columns = [c for c in current.columns
+                   if c in previous.columns and c not in CHANGE_IGNORED_COLUMNS]
+        new_values = current.loc[matched, columns]
+        old_values = previous.loc[new_values.index, columns]
+        same = (new_values == old_values) | (new_values.isna() & old_values.isna())
+        changed += int((~same.all(axis=1)).sum())
+    return changed
+
+
+def export_fact_partitions(df: pd.DataFrame, base_uri: str, batch_id: int,
+                           endpoint_url: Optional[str] = None) -> int:
+    """
+    Escribir un archivo Parquet por partición date_key=YYYYMMDD.
+    Las particiones ya existentes se fusionan por delivery_id (la última carga gana),
+    así re-ejecutar el ETL sobre la misma ventana no duplica filas.
+    Devuelve el número de filas nuevas o modificadas (no el tamaño de las
+    particiones reescritas), para que records_exported refleje la carga real.
+    """
+    if df.empty:
+        return 0
+
+    fs, root = resolve_filesystem(base_uri, endpoint_url)
+    lake_df = build_lake_frame(df, batch_id)
+    rows_written = 0
+
+    for date_key, partition in lake_df.groupby('date_key', sort=True):
+        partition_dir = f"{root}/date_key={date_key}"
+        partition_path = f"{partition_dir}/{PARTITION_FILE}"
+        # La columna de partición vive en la ruta (estilo Hive), no en el archivo
+        partition = partition.drop(columns=['date_key'])
+        partition = partition.drop_duplicates(subset='delivery_id', keep='last')
+
+        if fs.get_file_info(partition_path).type == pafs.FileType.File:
+            existing = pq.read_table(partition_path, filesystem=fs).to_pandas()
+            rows_written += count_changed_rows(existing, partition)
+            partition = pd.concat([existing, partition], ignore_index=True)
+            partition = partition.drop_duplicates(subset='delivery_id', keep='last')
+        else:
+            rows_written += len(partition)
+
+        partition = partition.sort_values('scheduled_datetime')
+        fs.create_dir(partition_dir, recursive=True)
+        pq.write_table(
+            pa.Table.from_pandas(partition, preserve_index=False),
+            partition_path,
+            filesystem=fs,
+            compression='zstd',
+            row_group_size=ROW_GROUP_SIZE,
+            write_statistics=True
+        )
+
+    logging.info(f" Exportadas {lake_df['date_key'].nunique()} particiones a {base_uri}")
+    return rows_written
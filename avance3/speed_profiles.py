@@ -0,0 +1,163 @@
+"""
+FleetLogix - Perfil de Velocidades para ETA
+Calcula la velocidad mediana de los viajes completados por ruta × día de la
+semana × hora de salida y la publica como un .npz compacto que la Lambda
+calcular-eta carga en el cold start (s3://fleetlogix-data/models/ o ruta local)
+"""
+
+import io
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pyarrow.fs as pafs
+
+from lake_export import resolve_filesystem
+
+# Ventana de viajes usada para el perfil, hacia atrás desde el último viaje
+SPEED_PROFILE_DAYS = 90
+# Mínimo de viajes para confiar en una celda; si no, se usa el nivel más general
+MIN_TRIPS_PER_CELL = 3
+# Velocidades fuera de este rango son errores de registro (arrival mal cargado, etc.)
+MIN_SPEED_KMH = 5.0
+MAX_SPEED_KMH = 120.0
+
+# Medianas con GROUPING SETS: celda, ruta × hora, ruta, y global día × hora / global
+SPEED_PROFILE_QUERY = """
+    WITH trip_speeds AS (
+        SELECT
+            r.route_code,
+            EXTRACT(ISODOW FROM t.departure_datetime)::int - 1 AS dow,
+            EXTRACT(HOUR FROM t.departure_datetime)::int AS hour,
+            r.distance_km / (EXTRACT(EPOCH FROM t.arrival_datetime - t.departure_datetime) / 3600.0) AS speed_kmh
+        FROM trips t
+        JOIN routes r ON r.route_id = t.route_id
+        WHERE t.status = 'completed'
+        AND t.arrival_datetime > t.departure_datetime
+        AND r.distance_km > 0
+        AND t.departure_datetime >= ({anchor}) - make_interval(days => %(days)s)
+    )
+    SELECT
+        route_code, dow, hour,
+        GROUPING(route_code, dow, hour) AS level,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY speed_kmh) AS median_speed,
+        COUNT(*) AS trips
+    FROM trip_speeds
+    WHERE speed_kmh BETWEEN %(min_speed)s AND %(max_speed)s
+    GROUP BY GROUPING SETS (
+        (route_code, dow, hour),
+        (route_code, hour),
+        (route_code),
+        (dow, hour),
+        ()
+    )
+"""
+
+# Bits de GROUPING(route_code, dow, hour): 1 = columna agregada
+LEVEL_CELL, LEVEL_ROUTE_HOUR, LEVEL_ROUTE, LEVEL_GLOBAL_CELL, LEVEL_GLOBAL = 0b000, 0b010, 0b011, 0b100, 0b111
+
+
+def _departure_anchor(pg_conn) -> str:
+    """Máximo departure_datetime: desde high_water_marks si existe (avance2/06_high_water_marks.sql)"""
+    cursor = pg_conn.cursor()
+    cursor.execute("SELECT to_regclass('high_water_marks') IS NOT NULL")
+    has_high_water = cursor.fetchone()[0]
+    cursor.close()
+    if has_high_water:
+        return ("select max_value from high_water_marks "
+                "where table_name = 'trips' and column_name = 'departure_datetime'")
+    return "select max(departure_datetime) from trips"
+
+
+def build_speed_profile(pg_conn, days: int = SPEED_PROFILE_DAYS,
+                        min_trips: int = MIN_TRIPS_PER_CELL) -> Dict[str, np.ndarray]:
+    """
+    Perfil de velocidades (km/h) como arrays NumPy:
+        route_codes  (R,)        rutas en el orden de las filas
+        speeds       (R+1, 7, 24) float32, día 0 = lunes; la última fila es el perfil global
+        distance_km  (R,)        distancia por carretera de cada ruta
+    Las celdas con menos de min_trips viajes toman el valor de ruta × hora,
+    luego el de la ruta, luego la velocidad nominal (distance_km /
+    estimated_duration_hours) y por último el perfil global.
+    """
+    cursor = pg_conn.cursor()
+    cursor.execute("""
+        SELECT route_code, distance_km, distance_km / NULLIF(estimated_duration_hours, 0)
+        FROM routes ORDER BY route_code
+    """)
+    routes = cursor.fetchall()
+    cursor.execute(
+        SPEED_PROFILE_QUERY.format(anchor=_departure_anchor(pg_conn)),
+        {'days': days, 'min_speed': MIN_SPEED_KMH, 'max_speed': MAX_SPEED_KMH}
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+
+    route_codes = np.array([r[0] for r in routes])
+    row_of = {code: i for i, code in enumerate(route_codes.tolist())}
+    n_routes = len(route_codes)
+
+    cell = np.full((n_routes, 7, 24), np.nan)
+    route_hour = np.full((n_routes, 1, 24), np.nan)
+    route_all = np.full((n_routes, 1, 1), np.nan)
+    global_cell = np.full((1, 7, 24), np.nan)
+    global_all = np.nan
+
+    for route_code, dow, hour, level, median_speed, trips in rows:
+        if trips < min_trips:
+            continue
+        speed = float(median_speed)
+        if level == LEVEL_CELL and route_code in row_of:
+            cell[row_of[route_code], dow, hour] = speed
+        elif level == LEVEL_ROUTE_HOUR and route_code in row_of:
+            route_hour[row_of[route_code], 0, hour] = speed
+        elif level == LEVEL_ROUTE and route_code in row_of:
+            route_all[row_of[route_code], 0, 0] = speed
+        elif level == LEVEL_GLOBAL_CELL:
+            global_cell[0, dow, hour] = speed
+        elif level == LEVEL_GLOBAL:
+            global_all = speed
+
+    nominal = np.array([np.nan if r[2] is None else float(r[2]) for r in routes]).reshape(-1, 1, 1)
+    if np.isnan(global_all):
+        finite = nominal[np.isfinite(nominal)]
+        global_all = float(np.median(finite)) if finite.size else 60.0
+    global_cell = np.where(np.isnan(global_cell), global_all, global_cell)
+
+    # Rellenar de lo específico a lo general (broadcast sobre día / hora)
+    speeds = cell
+    for fallback in (route_hour, route_all, nominal):
+        speeds = np.where(np.isnan(speeds), fallback, speeds)
+    speeds = np.where(np.isnan(speeds), global_cell, speeds)
+    speeds = np.concatenate([speeds, global_cell]).clip(MIN_SPEED_KMH, MAX_SPEED_KMH)
+
+    covered = int(np.isfinite(cell).sum())
+    logging.info(f" Perfil de velocidades: {n_routes} rutas, {covered}/{cell.size} celdas con datos propios")
+    return {
+        'route_codes': route_codes,
+        'speeds': speeds.astype(np.float32),
+        'distance_km': np.array([float(r[1] or 0) for r in routes], dtype=np.float32),
+        'built_at': np.array(datetime.now().isoformat())
+    }
+
+
+def serialize_speed_profile(profile: Dict[str, np.ndarray]) -> bytes:
+    """npz comprimido; se lee con np.load(..., allow_pickle=False)"""
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **profile)
+    return buffer.getvalue()
+
+
+def publish_speed_profile(profile: Dict[str, np.ndarray], uri: str,
+                          endpoint_url: Optional[str] = None) -> int:
+    """Escribir el perfil en S3 o en disco; devuelve los bytes escritos"""
+    data = serialize_speed_profile(profile)
+    fs, path = resolve_filesystem(uri, endpoint_url)
+    parent = path.rsplit('/', 1)[0]
+    if parent and isinstance(fs, pafs.LocalFileSystem):
+        fs.create_dir(parent, recursive=True)
+    with fs.open_output_stream(path) as stream:
+        stream.write(data)
+    logging.info(f" Perfil de velocidades publicado en {uri} ({len(data)} bytes)")
+    return len(data)
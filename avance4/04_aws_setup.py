@@ -9,11 +9,45 @@ import psycopg2
 from datetime import datetime
 import zipfile
 import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
 
 # Configuración
 AWS_REGION = 'us-east-1'
 RDS_INSTANCE_ID = 'fleetlogix-db'
 S3_BUCKET_NAME = 'fleetlogix-data'
+# Perfil de velocidades que publica el ETL (avance3_dw.py con este mismo SPEED_PROFILE_URI).
+# Fuera de processed-data/ para que la regla de lifecycle no lo mande a Glacier
+SPEED_PROFILE_URI = f's3://{S3_BUCKET_NAME}/models/speed_profile.npz'
+SNS_TOPIC_NAME = 'fleetlogix-alertas'
+
+# Paquete de las Lambdas: módulos propios + dependencias (wheels para python3.11 x86_64)
+LAMBDA_MODULES = ['lambda_handler.py']
+LAMBDA_REQUIREMENTS = ['numpy', 'orjson']
+LAMBDA_TIMEOUT_SECONDS = 30
+LAMBDA_MEMORY_MB = 256
+
+# Funciones y endpoints (también los monta el emulador local, local_api.py)
+LAMBDA_FUNCTIONS = [
+    {'nombre': 'fleetlogix-verificar-entrega', 'handler': 'lambda_handler.lambda_verificar_entrega'},
+    {'nombre': 'fleetlogix-calcular-eta', 'handler': 'lambda_handler.lambda_calcular_eta'},
+    {'nombre': 'fleetlogix-alerta-desvio', 'handler': 'lambda_handler.lambda_alerta_desvio'},
+    {'nombre': 'fleetlogix-ingesta-tracking', 'handler': 'lambda_handler.lambda_ingesta_tracking'},
+    {'nombre': 'fleetlogix-evaluar-desvios', 'handler': 'lambda_handler.lambda_evaluar_desvios'},
+    # Sin endpoint: la invocan las demás con ALERT_DISPATCH_MODE='async'
+    {'nombre': 'fleetlogix-publicar-alertas', 'handler': 'lambda_handler.lambda_publicar_alertas'}
+]
+API_ROUTES = [
+    {'path': 'verificar-entrega', 'lambda': 'fleetlogix-verificar-entrega'},
+    {'path': 'calcular-eta', 'lambda': 'fleetlogix-calcular-eta'},
+    {'path': 'alerta-desvio', 'lambda': 'fleetlogix-alerta-desvio'},
+    {'path': 'ingesta-tracking', 'lambda': 'fleetlogix-ingesta-tracking'},
+    {'path': 'evaluar-desvios', 'lambda': 'fleetlogix-evaluar-desvios'}
+]
+API_STAGE = 'prod'
 
 # Clientes AWS
 rds = boto3.client('rds', region_name=AWS_REGION)
@@ -23,6 +57,7 @@ lambda_client = boto3.client('lambda', region_name=AWS_REGION)
 iam = boto3.client('iam')
 apigateway = boto3.client('apigateway', region_name=AWS_REGION)
 events = boto3.client('events', region_name=AWS_REGION)
+sns = boto3.client('sns', region_name=AWS_REGION)
 
 def crear_rds_postgresql():
     """Crear instancia RDS PostgreSQL"""
@@ -87,6 +122,15 @@ def crear_s3_bucket():
                     'StorageClass': 'GLACIER'
                 }],
                 'Prefix': 'raw-data/'
+            }, {
+                # Parquet de fact_deliveries exportado por el ETL (date_key=YYYYMMDD/)
+                'ID': 'archive-old-processed-data',
+                'Status': 'Enabled',
+                'Transitions': [{
+                    'Days': 90,
+                    'StorageClass': 'GLACIER'
+                }],
+                'Prefix': 'processed-data/'
             }]
         }
         
@@ -113,7 +157,32 @@ def crear_tablas_dynamodb():
                 {'AttributeName': 'delivery_id', 'KeyType': 'HASH'}
             ],
             'AttributeDefinitions': [
-                {'AttributeName': 'delivery_id', 'AttributeType': 'S'}
+                {'AttributeName': 'delivery_id', 'AttributeType': 'S'},
+                {'AttributeName': 'tracking_number', 'AttributeType': 'S'},
+                {'AttributeName': 'status', 'AttributeType': 'S'},
+                {'AttributeName': 'trip_id', 'AttributeType': 'N'}
+            ],
+            'GlobalSecondaryIndexes': [
+                # Consulta por número de guía (lo único que conoce el cliente)
+                {
+                    'IndexName': 'tracking_number-index',
+                    'KeySchema': [
+                        {'AttributeName': 'tracking_number', 'KeyType': 'HASH'}
+                    ],
+                    'Projection': {
+                        'ProjectionType': 'INCLUDE',
+                        'NonKeyAttributes': ['status', 'delivered_datetime']
+                    }
+                },
+                # Entregas por estado y viaje (barrido de pendientes sin Scan)
+                {
+                    'IndexName': 'status-trip_id-index',
+                    'KeySchema': [
+                        {'AttributeName': 'status', 'KeyType': 'HASH'},
+                        {'AttributeName': 'trip_id', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'KEYS_ONLY'}
+                }
             ]
         },
         {
@@ -125,7 +194,9 @@ def crear_tablas_dynamodb():
             'AttributeDefinitions': [
                 {'AttributeName': 'vehicle_id', 'AttributeType': 'S'},
                 {'AttributeName': 'timestamp', 'AttributeType': 'S'}
-            ]
+            ],
+            # Histórico submuestreado: los puntos expiran solos (ítem LATEST sin TTL)
+            'TimeToLiveAttribute': 'expires_at'
         },
         {
             'TableName': 'routes_waypoints',
@@ -151,6 +222,9 @@ def crear_tablas_dynamodb():
     
     for tabla in tablas:
         try:
+            extra = {}
+            if 'GlobalSecondaryIndexes' in tabla:
+                extra['GlobalSecondaryIndexes'] = tabla['GlobalSecondaryIndexes']
             response = dynamodb.create_table(
                 TableName=tabla['TableName'],
                 KeySchema=tabla['KeySchema'],
@@ -158,14 +232,66 @@ def crear_tablas_dynamodb():
                 BillingMode='PAY_PER_REQUEST',  # On-demand
                 Tags=[
                     {'Key': 'Project', 'Value': 'FleetLogix'}
-                ]
+                ],
+                **extra
             )
             print(f" Tabla creada: {tabla['TableName']}")
             
         except dynamodb.exceptions.ResourceInUseException:
             print(f" Tabla ya existe: {tabla['TableName']}")
+            if 'GlobalSecondaryIndexes' in tabla:
+                crear_indices_faltantes(tabla)
         except Exception as e:
             print(f" Error creando tabla {tabla['TableName']}: {e}")
+            continue
+        
+        if 'TimeToLiveAttribute' in tabla:
+            configurar_ttl(tabla['TableName'], tabla['TimeToLiveAttribute'])
+
+def esperar_indices_activos(nombre_tabla, intervalo=10):
+    """DynamoDB crea un solo GSI a la vez: esperar a que terminen los backfills en curso"""
+    while True:
+        indices = dynamodb.describe_table(TableName=nombre_tabla)['Table'].get('GlobalSecondaryIndexes', [])
+        if all(gsi.get('IndexStatus', 'ACTIVE') == 'ACTIVE' for gsi in indices):
+            return
+        time.sleep(intervalo)
+
+def crear_indices_faltantes(tabla):
+    """Agregar a una tabla existente los GSI definidos que todavía no tiene (uno por update_table)"""
+    try:
+        existentes = {
+            gsi['IndexName']
+            for gsi in dynamodb.describe_table(TableName=tabla['TableName'])['Table'].get('GlobalSecondaryIndexes', [])
+        }
+        for gsi in tabla['GlobalSecondaryIndexes']:
+            if gsi['IndexName'] in existentes:
+                continue
+            dynamodb.get_waiter('table_exists').wait(TableName=tabla['TableName'])
+            esperar_indices_activos(tabla['TableName'])
+            dynamodb.update_table(
+                TableName=tabla['TableName'],
+                AttributeDefinitions=tabla['AttributeDefinitions'],
+                GlobalSecondaryIndexUpdates=[{'Create': gsi}]
+            )
+            print(f" Índice creado: {tabla['TableName']}.{gsi['IndexName']} (backfill en segundo plano)")
+    except Exception as e:
+        print(f" Error creando índices en {tabla['TableName']}: {e}")
+
+def configurar_ttl(nombre_tabla, atributo):
+    """Activar TTL de DynamoDB sobre un atributo epoch (la tabla debe estar ACTIVE)"""
+    try:
+        dynamodb.get_waiter('table_exists').wait(TableName=nombre_tabla)
+        estado = dynamodb.describe_time_to_live(TableName=nombre_tabla)['TimeToLiveDescription']
+        if estado.get('TimeToLiveStatus') in ('ENABLED', 'ENABLING'):
+            print(f" TTL ya activo en {nombre_tabla}")
+            return
+        dynamodb.update_time_to_live(
+            TableName=nombre_tabla,
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': atributo}
+        )
+        print(f" TTL activado en {nombre_tabla} ({atributo})")
+    except Exception as e:
+        print(f" Error configurando TTL en {nombre_tabla}: {e}")
 
 def configurar_backups_automaticos():
     """Configurar backups automáticos para RDS"""
@@ -257,7 +383,9 @@ def crear_rol_iam_lambda():
             'arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole',
             'arn:aws:iam::aws:policy/AmazonDynamoDBFullAccess',
             'arn:aws:iam::aws:policy/AmazonS3FullAccess',
-            'arn:aws:iam::aws:policy/AmazonSNSFullAccess'
+            'arn:aws:iam::aws:policy/AmazonSNSFullAccess',
+            # lambda:InvokeFunction para entregar alertas a fleetlogix-publicar-alertas
+            'arn:aws:iam::aws:policy/service-role/AWSLambdaRole'
         ]
         
         for policy in policies:
@@ -276,34 +404,64 @@ def crear_rol_iam_lambda():
         print(f" Error creando rol: {e}")
         return None
 
-def desplegar_lambdas(rol_arn):
-    """Desplegar las 3 funciones Lambda"""
+def empaquetar_lambdas():
+    """ZIP en memoria con LAMBDA_MODULES y las wheels manylinux de LAMBDA_REQUIREMENTS"""
+    zip_buffer = io.BytesIO()
+    with tempfile.TemporaryDirectory() as deps_dir:
+        subprocess.run([
+            sys.executable, '-m', 'pip', 'install', '--quiet', '--target', deps_dir,
+            '--platform', 'manylinux2014_x86_64', '--implementation', 'cp',
+            '--python-version', '3.11', '--only-binary=:all:', *LAMBDA_REQUIREMENTS
+        ], check=True)
+        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for modulo in LAMBDA_MODULES:
+                zip_file.write(modulo, modulo)
+            for root, _, files in os.walk(deps_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    zip_file.write(path, os.path.relpath(path, deps_dir))
+    return zip_buffer.getvalue()
+
+def crear_topico_sns():
+    """Tópico SNS de alertas (create_topic es idempotente); ALERTS_EMAIL suscribe un correo"""
+    print("\n Creando tópico SNS de alertas...")
+    
+    try:
+        topic_arn = sns.create_topic(
+            Name=SNS_TOPIC_NAME,
+            Tags=[{'Key': 'Project', 'Value': 'FleetLogix'}]
+        )['TopicArn']
+        print(f" Tópico listo: {topic_arn}")
+        email = os.getenv('ALERTS_EMAIL')
+        if email:
+            sns.subscribe(TopicArn=topic_arn, Protocol='email', Endpoint=email)
+            print(f" Suscripción pendiente de confirmar: {email}")
+        return topic_arn
+    except Exception as e:
+        print(f" Error creando tópico SNS: {e}")
+        return None
+
+def desplegar_lambdas(rol_arn, variables=None):
+    """Desplegar las funciones Lambda (variables: entorno común de todas)"""
     print("\n Desplegando funciones Lambda...")
     
     if not rol_arn:
         print(" No se puede desplegar sin rol IAM")
         return {}
     
-    # Crear ZIP con el código de las lambdas
+    # Crear ZIP con el código de las lambdas y sus dependencias
     try:
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            zip_file.write('lambda_handler.py', 'lambda_handler.py')
-        zip_buffer.seek(0)
-        codigo_zip = zip_buffer.read()
-    except:
+        codigo_zip = empaquetar_lambdas()
+    except OSError:
         print(" No se encontró lambda_handler.py")
         return {}
-    
-    funciones = [
-        {'nombre': 'fleetlogix-verificar-entrega', 'handler': 'lambda_handler.lambda_verificar_entrega'},
-        {'nombre': 'fleetlogix-calcular-eta', 'handler': 'lambda_handler.lambda_calcular_eta'},
-        {'nombre': 'fleetlogix-alerta-desvio', 'handler': 'lambda_handler.lambda_alerta_desvio'}
-    ]
+    except subprocess.CalledProcessError as e:
+        print(f" Error instalando dependencias de las Lambdas: {e}")
+        return {}
     
     arns = {}
     
-    for func in funciones:
+    for func in LAMBDA_FUNCTIONS:
         try:
             # Intentar crear la función
             response = lambda_client.create_function(
@@ -312,8 +470,9 @@ def desplegar_lambdas(rol_arn):
                 Role=rol_arn,
                 Handler=func['handler'],
                 Code={'ZipFile': codigo_zip},
-                Timeout=30,
-                MemorySize=256
+                Timeout=LAMBDA_TIMEOUT_SECONDS,
+                MemorySize=LAMBDA_MEMORY_MB,
+                Environment={'Variables': variables or {}}
             )
             print(f" Lambda creada: {func['nombre']}")
             arns[func['nombre']] = response['FunctionArn']
@@ -323,6 +482,12 @@ def desplegar_lambdas(rol_arn):
                 FunctionName=func['nombre'],
                 ZipFile=codigo_zip
             )
+            if variables:
+                lambda_client.get_waiter('function_updated').wait(FunctionName=func['nombre'])
+                lambda_client.update_function_configuration(
+                    FunctionName=func['nombre'],
+                    Environment={'Variables': variables}
+                )
             response = lambda_client.get_function(FunctionName=func['nombre'])
             print(f" Lambda actualizada: {func['nombre']}")
             arns[func['nombre']] = response['Configuration']['FunctionArn']
@@ -332,7 +497,7 @@ def desplegar_lambdas(rol_arn):
     return arns
 
 def crear_api_gateway(lambda_arns):
-    """Crear API Gateway con 3 endpoints"""
+    """Crear API Gateway con los endpoints de las Lambdas"""
     print("\n Creando API Gateway...")
     
     if not lambda_arns:
@@ -352,13 +517,7 @@ def crear_api_gateway(lambda_arns):
         root_id = recursos['items'][0]['id']
         
         # Crear endpoints
-        rutas = [
-            {'path': 'verificar-entrega', 'lambda': 'fleetlogix-verificar-entrega'},
-            {'path': 'calcular-eta', 'lambda': 'fleetlogix-calcular-eta'},
-            {'path': 'alerta-desvio', 'lambda': 'fleetlogix-alerta-desvio'}
-        ]
-        
-        for ruta in rutas:
+        for ruta in API_ROUTES:
             if ruta['lambda'] not in lambda_arns:
                 continue
             
@@ -404,10 +563,10 @@ def crear_api_gateway(lambda_arns):
         # Desplegar API
         apigateway.create_deployment(
             restApiId=api_id,
-            stageName='prod'
+            stageName=API_STAGE
         )
         
-        url = f"https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod"
+        url = f"https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/{API_STAGE}"
         print(f" API Gateway creada: {url}")
         return url
         
@@ -436,7 +595,9 @@ def configurar_triggers(lambda_arns):
                 Rule='verificar-entregas',
                 Targets=[{
                     'Id': '1',
-                    'Arn': lambda_arns['fleetlogix-verificar-entrega']
+                    'Arn': lambda_arns['fleetlogix-verificar-entrega'],
+                    # Barrido de entregas pendientes (modo sweep de la Lambda)
+                    'Input': json.dumps({'sweep': True})
                 }]
             )
             
@@ -465,6 +626,7 @@ def main():
     crear_rds_postgresql()
     crear_s3_bucket()
     crear_tablas_dynamodb()
+    topic_arn = crear_topico_sns()
     
     # 2. Configurar
     configurar_backups_automaticos()
@@ -474,7 +636,13 @@ def main():
     rol_arn = crear_rol_iam_lambda()
     
     # 4. Desplegar Lambdas
-    lambda_arns = desplegar_lambdas(rol_arn)
+    # Las alertas salen del request con una invocación asíncrona a la publicadora
+    variables = {'ALERT_DISPATCH_MODE': 'async', 'ALERTS_PUBLISHER_FUNCTION': 'fleetlogix-publicar-alertas'}
+    # calcular-eta e ingesta-tracking leen el perfil que publica el ETL
+    variables['SPEED_PROFILE_URI'] = SPEED_PROFILE_URI
+    if topic_arn:
+        variables['ALERTS_TOPIC_ARN'] = topic_arn
+    lambda_arns = desplegar_lambdas(rol_arn, variables)
     
     # 5. Crear API Gateway
     api_url = crear_api_gateway(lambda_arns)
@@ -487,7 +655,9 @@ def main():
     print("- RDS PostgreSQL")
     print("- S3 Bucket")
     print("- DynamoDB (4 tablas)")
-    print("- Lambda (3 funciones)")
+    if topic_arn:
+        print(f"- SNS: {topic_arn}")
+    print(f"- Lambda ({len(lambda_arns)} funciones)")
     if api_url:
         print(f"- API Gateway: {api_url}")
     print("- Triggers automáticos")
@@ -496,12 +666,14 @@ def main():
     config = {
         'rds_instance': RDS_INSTANCE_ID,
         's3_bucket': S3_BUCKET_NAME,
+        'speed_profile_uri': SPEED_PROFILE_URI,
         'dynamodb_tables': [
             'deliveries_status',
             'vehicle_tracking', 
             'routes_waypoints',
             'alerts_history'
         ],
+        'sns_topic_arn': topic_arn,
         'lambda_role_arn': rol_arn,
         'lambda_functions': lambda_arns,
         'api_gateway_url': api_url,
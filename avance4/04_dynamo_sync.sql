@@ -0,0 +1,52 @@
+-- =====================================================
+-- FLEETLOGIX - SEGUIMIENTO DE CAMBIOS PARA LA SINCRONIZACIÓN A DYNAMODB
+-- deliveries.updated_at + watermark por tabla destino
+-- Objetivo: que avance4/dynamo_sync.py lea sólo las entregas que cambiaron
+-- desde la última sincronización en lugar de toda la tabla
+-- =====================================================
+
+-- =====================================================
+-- 1. COLUMNA DE ÚLTIMA MODIFICACIÓN
+-- =====================================================
+
+-- DEFAULT estable: en PostgreSQL 11+ el ALTER no reescribe la tabla y las
+-- filas existentes quedan con el instante de la migración (la primera
+-- sincronización incremental las toma todas)
+ALTER TABLE deliveries ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+-- Rango de la sincronización: updated_at > watermark - solapamiento
+CREATE INDEX IF NOT EXISTS idx_deliveries_updated_at ON deliveries(updated_at);
+
+-- =====================================================
+-- 2. TRIGGER DE MANTENIMIENTO
+-- =====================================================
+
+-- Trigger por fila BEFORE UPDATE: es la única forma de modificar NEW (los
+-- triggers por sentencia de avance2 no pueden). Un UPDATE que no cambia
+-- nada no mueve updated_at, así que no genera escrituras en DynamoDB.
+CREATE OR REPLACE FUNCTION deliveries_touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW IS DISTINCT FROM OLD AND NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+        NEW.updated_at := CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_deliveries_updated_at ON deliveries;
+CREATE TRIGGER trg_deliveries_updated_at BEFORE UPDATE ON deliveries
+    FOR EACH ROW EXECUTE FUNCTION deliveries_touch_updated_at();
+
+-- =====================================================
+-- 3. ESTADO DE LA SINCRONIZACIÓN
+-- =====================================================
+
+-- Una fila por tabla DynamoDB destino; sólo avanza cuando un lote termina sin errores
+CREATE TABLE IF NOT EXISTS dynamo_sync_state (
+    table_name VARCHAR(50) PRIMARY KEY,
+    last_updated_at TIMESTAMP,
+    rows_synced BIGINT NOT NULL DEFAULT 0,
+    synced_at TIMESTAMP
+);
+
+COMMENT ON TABLE dynamo_sync_state IS 'Watermark (máximo updated_at sincronizado) de la sincronización PostgreSQL -> DynamoDB';
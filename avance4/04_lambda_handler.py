@@ -1,33 +1,216 @@
 """
 FleetLogix - Funciones Lambda para AWS
-3 funciones simples para procesamiento básico
+Funciones simples para procesamiento básico
 """
 
+import base64
+import io
 import json
+import math
+import os
+import threading
+import time
+import zlib
 import boto3
-from datetime import datetime, timedelta, timezone
+import numpy as np
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
 
-# Clientes AWS
-dynamodb = boto3.resource('dynamodb')
-sns = boto3.client('sns')
+# =====================================================
+# REGISTRO DE CLIENTES AWS
+# =====================================================
+# Los clientes y Tables se crean en el primer uso y se reutilizan mientras
+# el contenedor siga caliente (cada invocación ya no llama a dynamodb.Table()).
+# Para DynamoDB Local / moto server usar AWS_ENDPOINT_URL_DYNAMODB.
+BOTO_CONFIG = Config(
+    region_name=os.getenv('AWS_REGION', 'us-east-1'),
+    max_pool_connections=int(os.getenv('BOTO_MAX_POOL_CONNECTIONS', '25')),
+    tcp_keepalive=True,
+    connect_timeout=2,
+    read_timeout=5,
+    retries={'max_attempts': 3, 'mode': 'standard'}
+)
+
+_clients = {}
+_resources = {}
+_tables = {}
+_registry_lock = threading.Lock()
+
+def get_client(service_name):
+    """Cliente boto3 cacheado por servicio"""
+    client = _clients.get(service_name)
+    if client is None:
+        with _registry_lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = boto3.client(service_name, config=BOTO_CONFIG)
+                _clients[service_name] = client
+    return client
+
+def get_table(table_name):
+    """Table de DynamoDB cacheada por nombre (el resource se crea una sola vez)"""
+    table = _tables.get(table_name)
+    if table is None:
+        with _registry_lock:
+            table = _tables.get(table_name)
+            if table is None:
+                if 'dynamodb' not in _resources:
+                    _resources['dynamodb'] = boto3.resource('dynamodb', config=BOTO_CONFIG)
+                table = _resources['dynamodb'].Table(table_name)
+                _tables[table_name] = table
+    return table
+
+def reset_clients():
+    """Descartar clientes cacheados (tests o cambio de credenciales)"""
+    with _registry_lock:
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
+
+# Llamadas DynamoDB concurrentes por invocación (chunks de BatchGetItem/BatchWriteItem, Query, segmentos de Scan)
+DYNAMO_PARALLELISM = int(os.getenv('DYNAMO_PARALLELISM', '8'))
+# Intentos de un BatchGetItem/BatchWriteItem mientras queden claves o ítems sin procesar
+BATCH_MAX_ATTEMPTS = 5
+
+# Pool compartido por las invocaciones del contenedor (los clientes boto3 son thread-safe)
+_dynamo_executor = ThreadPoolExecutor(max_workers=DYNAMO_PARALLELISM)
 
 # =====================================================
 # HELPER FUNCTIONS
 # =====================================================
 
-def convert_floats(obj):
+# orjson (en LAMBDA_REQUIREMENTS) serializa en C; sin él se usa json de la stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_default(obj):
+    """Tipos que ni orjson ni json serializan solos: Decimal de DynamoDB, escalares NumPy, etc."""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+def to_json(payload):
+    """Body JSON de la respuesta (Decimal -> número, datetime -> ISO 8601)"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(payload, default=_json_default)
+
+# Esquema de los ítems que escriben las Lambdas: 'S', 'N' o 'point' ({lat, lon}).
+# marshal_item los pasa directo al formato de DynamoDB (AttributeValue) sin
+# convertir floats a Decimal ni pasar por el TypeSerializer de boto3; un
+# atributo fuera del esquema es un error, no un tipo adivinado.
+ITEM_SCHEMAS = {
+    'vehicle_tracking': {
+        'vehicle_id': 'S',
+        'timestamp': 'S',
+        'eta': 'S',
+        'reported_at': 'S',
+        'history_at': 'S',
+        'current_location': 'point',
+        'destination': 'point',
+        'history_location': 'point',
+        'distance_remaining_km': 'N',
+        'current_speed_kmh': 'N',
+        'expires_at': 'N'
+    },
+    'alerts_history': {
+        'vehicle_id': 'S',
+        'timestamp': 'S',
+        'driver_id': 'S',
+        'route_id': 'S',
+        'alert_type': 'S',
+        'current_location': 'point',
+        'deviation_km': 'N',
+        'suppressed_count': 'N'
+    }
+}
+
+def _number(value):
+    """Número de DynamoDB como texto (int, float, Decimal o string numérico)"""
+    text = str(value)
+    if not math.isfinite(float(text)):
+        raise ValueError(f'Número no válido para DynamoDB: {value}')
+    return text
+
+_MARSHALLERS = {
+    'S': lambda value: {'S': str(value)},
+    'N': lambda value: {'N': _number(value)},
+    'point': lambda value: {'M': {'lat': {'N': _number(value['lat'])}, 'lon': {'N': _number(value['lon'])}}}
+}
+
+def marshal_item(table_name, item):
+    """Ítem -> {atributo: AttributeValue} según ITEM_SCHEMAS (None se guarda como NULL)"""
+    schema = ITEM_SCHEMAS[table_name]
+    marshalled = {}
+    for attribute, value in item.items():
+        kind = schema.get(attribute)
+        if kind is None:
+            raise KeyError(f'Atributo sin esquema en {table_name}: {attribute}')
+        marshalled[attribute] = {'NULL': True} if value is None else _MARSHALLERS[kind](value)
+    return marshalled
+
+def _batch_write_chunk(table_name, requests):
+    """Un BatchWriteItem de hasta 25 ítems, reintentando UnprocessedItems con backoff"""
+    request = {table_name: requests}
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(min(0.05 * 2 ** attempt, 1.0))
+        response = get_client('dynamodb').batch_write_item(RequestItems=request)
+        request = response.get('UnprocessedItems') or None
+        if not request:
+            return
+    raise RuntimeError(f'{len(request[table_name])} ítems sin procesar en {table_name} tras {BATCH_MAX_ATTEMPTS} intentos')
+
+def batch_put_items(table_name, items, key_attributes):
     """
-    Convierte recursivamente floats a Decimal para DynamoDB.
-    DynamoDB no acepta floats nativos de Python.
+    Escribir ítems ya marshalleados con BatchWriteItem: lotes de 25 en
+    paralelo; las claves repetidas se deduplican (gana la última), como
+    overwrite_by_pkeys de batch_writer.
     """
-    if isinstance(obj, float):
-        return Decimal(str(obj))
-    elif isinstance(obj, dict):
-        return {k: convert_floats(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_floats(i) for i in obj]
-    return obj
+    unique = {}
+    for item in items:
+        unique[tuple(next(iter(item[k].values())) for k in key_attributes)] = item
+    requests = [{'PutRequest': {'Item': item}} for item in unique.values()]
+    chunks = [requests[i:i + 25] for i in range(0, len(requests), 25)]
+    if len(chunks) == 1:
+        _batch_write_chunk(table_name, chunks[0])
+        return
+    for future in [_dynamo_executor.submit(_batch_write_chunk, table_name, chunk) for chunk in chunks]:
+        future.result()
+
+def batch_get_keys(table_name, keys, **params):
+    """
+    BatchGetItem de las claves en lotes de 100, reintentando UnprocessedKeys
+    con backoff acotado (BATCH_MAX_ATTEMPTS). params va tal cual al request
+    de la tabla (ProjectionExpression, ExpressionAttributeNames). Devuelve
+    (ítems, claves que siguieron sin procesar).
+    """
+    client = get_table(table_name).meta.client
+    items = []
+    unprocessed = []
+    for start in range(0, len(keys), 100):
+        request = {table_name: dict(params, Keys=keys[start:start + 100])}
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+            response = client.batch_get_item(RequestItems=request)
+            items.extend(response['Responses'].get(table_name, []))
+            request = response.get('UnprocessedKeys') or None
+            if not request:
+                break
+        if request:
+            unprocessed.extend(request[table_name]['Keys'])
+    return items, unprocessed
 
 def parse_event_body(event):
     """
@@ -43,65 +226,1497 @@ def parse_event_body(event):
     # Si viene directo (test manual)
     return event
 
+# =====================================================
+# ÍNDICE ESPACIAL DE RUTAS
+# =====================================================
+RADIO_TIERRA_KM = 6371.0088
+# Tamaño mínimo de celda de la grilla; crece hasta la mediana de los segmentos
+ROUTE_GRID_CELL_KM = float(os.getenv('ROUTE_GRID_CELL_KM', '2'))
+# Anillos de celdas a revisar antes de caer a la búsqueda sobre todos los segmentos
+ROUTE_MAX_RINGS = 8
+# Con pocos segmentos la búsqueda vectorizada completa es más barata que la grilla
+ROUTE_BRUTE_FORCE_SEGMENTS = 256
+# Distancia máxima a la ruta para medir el recorrido restante sobre ella
+ROUTE_REMAINING_MAX_OFFSET_KM = 5.0
+# Evaluación de lotes: pares punto-segmento por matriz (~2 MB en float64), puntos
+# vecinos por bloque y vértices ancla para acotar los segmentos candidatos
+ROUTE_BATCH_MAX_PAIRS = 262144
+ROUTE_BATCH_BLOCK_POINTS = 128
+ROUTE_BATCH_ANCHORS = 64
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distancia de gran círculo en km (escalares o arrays)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def encode_route_geometry(waypoints):
+    """
+    Waypoints [{lat, lon}, ...] -> bytes compactos (float32 lat/lon + zlib).
+    float32 da ~1 m de precisión y permite decenas de miles de waypoints
+    dentro del límite de 400 KB por ítem.
+    """
+    coords = np.array([[float(w['lat']), float(w['lon'])] for w in waypoints], dtype='<f4')
+    return zlib.compress(coords.tobytes())
+
+def decode_route_geometry(data):
+    """bytes de encode_route_geometry -> array (N, 2) de lat/lon"""
+    return np.frombuffer(zlib.decompress(bytes(data)), dtype='<f4').reshape(-1, 2).astype(float)
+
+def build_route_item(route_id, waypoints):
+    """
+    Ítem de routes_waypoints con la geometría en el atributo binario 'polyline'.
+    'version' (crc32 de la geometría) invalida la caché de rutas de las Lambdas;
+    quien escriba la ruta por otro camino debe cambiarla al cambiar la geometría.
+    """
+    polyline = encode_route_geometry(waypoints)
+    return {
+        'route_id': route_id,
+        'polyline': polyline,
+        'waypoint_count': len(waypoints),
+        'version': zlib.crc32(polyline)
+    }
+
+class RouteIndex:
+    """
+    Polilínea de una ruta proyectada a un plano equirectangular local (km)
+    con una grilla uniforme celda -> segmentos. La distancia punto-polilínea
+    evalúa sólo los segmentos de las celdas cercanas, expandiendo anillos
+    hasta que ningún segmento fuera de ellos pueda estar más cerca; la
+    distancia final se mide con haversine al punto más cercano del segmento.
+    """
+    
+    def __init__(self, coords, cell_km=ROUTE_GRID_CELL_KM):
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        if len(coords) == 0:
+            raise ValueError('La ruta no tiene waypoints')
+        self.lat0 = float(coords[:, 0].mean())
+        self.lon0 = float(coords[:, 1].mean())
+        self.cos_lat0 = math.cos(math.radians(self.lat0))
+        
+        xy = self._project(coords[:, 0], coords[:, 1])
+        if len(xy) == 1:
+            xy = np.vstack([xy, xy])
+        self.a = xy[:-1]
+        self.b = xy[1:]
+        self.ab = self.b - self.a
+        self.ab_len2 = (self.ab ** 2).sum(axis=1)
+        self.inv_len2 = np.divide(1.0, self.ab_len2, out=np.zeros_like(self.ab_len2), where=self.ab_len2 > 0)
+        # km recorridos sobre la polilínea al inicio de cada segmento
+        self.cumulative_km = np.concatenate([[0.0], np.cumsum(np.sqrt(self.ab_len2))])
+        
+        # Celdas al menos del largo típico de segmento: un segmento cae en pocas celdas
+        self.cell_km = max(cell_km, float(np.median(np.sqrt(self.ab_len2))))
+        self.seg_min = np.minimum(self.a, self.b)
+        self.seg_max = np.maximum(self.a, self.b)
+        self.origin = self.seg_min.min(axis=0)
+        first = np.floor((self.seg_min - self.origin) / self.cell_km).astype(int)
+        last = np.floor((self.seg_max - self.origin) / self.cell_km).astype(int)
+        
+        cells = {}
+        for segment, (i0, j0, i1, j1) in enumerate(np.hstack([first, last]).tolist()):
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    cells.setdefault((i, j), []).append(segment)
+        self.cells = {cell: np.array(segments) for cell, segments in cells.items()}
+        self.grid_size = tuple((last.max(axis=0) + 1).tolist())
+    
+    def __len__(self):
+        return len(self.a)
+    
+    def _project(self, lat, lon):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        x = RADIO_TIERRA_KM * np.radians(lon - self.lon0) * self.cos_lat0
+        y = RADIO_TIERRA_KM * np.radians(lat - self.lat0)
+        return np.stack([x, y], axis=-1)
+    
+    def _unproject(self, x, y):
+        lat = self.lat0 + np.degrees(y / RADIO_TIERRA_KM)
+        lon = self.lon0 + np.degrees(x / (RADIO_TIERRA_KM * self.cos_lat0))
+        return lat, lon
+    
+    def _nearest(self, point, segments):
+        """(distancia plana, punto más cercano) entre point y los segmentos dados"""
+        a = self.a[segments]
+        ab = self.ab[segments]
+        len2 = self.ab_len2[segments]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(len2 > 0, ((point - a) * ab).sum(axis=1) / len2, 0.0)
+        closest = a + np.clip(t, 0.0, 1.0)[:, None] * ab
+        distances = np.hypot(closest[:, 0] - point[0], closest[:, 1] - point[1])
+        best = int(distances.argmin())
+        return float(distances[best]), closest[best], int(segments[best])
+    
+    def _ring(self, ci, cj, ring):
+        """Celdas no vacías a distancia de Chebyshev exactamente ring de (ci, cj)"""
+        if ring == 0:
+            border = [(ci, cj)]
+        else:
+            border = [(i, j) for i in range(ci - ring, ci + ring + 1) for j in (cj - ring, cj + ring)]
+            border += [(i, j) for i in (ci - ring, ci + ring) for j in range(cj - ring + 1, cj + ring)]
+        return [self.cells[cell] for cell in border if cell in self.cells]
+    
+    def locate(self, lat, lon):
+        """(distancia km a la polilínea, km recorridos sobre la ruta hasta el punto más cercano)"""
+        point = self._project(lat, lon)
+        best_distance, best_point, best_segment = math.inf, None, None
+        
+        if len(self.a) > ROUTE_BRUTE_FORCE_SEGMENTS:
+            ci, cj = np.floor((point - self.origin) / self.cell_km).astype(int).tolist()
+            # Los anillos previos a la grilla están vacíos: empezar en su borde
+            ni, nj = self.grid_size
+            first_ring = max(-ci, ci - ni + 1, -cj, cj - nj + 1, 0)
+            for ring in range(first_ring, ROUTE_MAX_RINGS + 1):
+                found = self._ring(ci, cj, ring)
+                if found:
+                    distance, closest, segment = self._nearest(point, np.concatenate(found))
+                    if distance < best_distance:
+                        best_distance, best_point, best_segment = distance, closest, segment
+                # Todo segmento no visto está al menos a ring celdas de distancia
+                if best_distance <= ring * self.cell_km:
+                    break
+        
+        if best_point is None or best_distance > ROUTE_MAX_RINGS * self.cell_km:
+            # Ruta corta o punto lejos de la ruta: evaluar todos los segmentos
+            best_distance, best_point, best_segment = self._nearest(point, np.arange(len(self.a)))
+        
+        along = float(self.cumulative_km[best_segment] + np.hypot(*(best_point - self.a[best_segment])))
+        return float(haversine_km(lat, lon, *self._unproject(*best_point))), along
+    
+    def distance_km(self, lat, lon):
+        """Distancia (km) desde (lat, lon) a la polilínea de la ruta"""
+        return self.locate(lat, lon)[0]
+    
+    def _closest_points(self, points, segments):
+        """Punto más cercano de los segmentos dados para cada punto (todos contra todos, por bloques)"""
+        ax, ay = self.a[segments, 0], self.a[segments, 1]
+        abx, aby = self.ab[segments, 0], self.ab[segments, 1]
+        inv_len2 = self.inv_len2[segments]
+        closest = np.empty_like(points)
+        rows = max(ROUTE_BATCH_MAX_PAIRS // len(segments), 1)
+        for start in range(0, len(points), rows):
+            px = points[start:start + rows, 0:1]
+            py = points[start:start + rows, 1:2]
+            # Proyección de cada punto sobre cada segmento, recortada a [0, 1]
+            t = ((px - ax) * abx + (py - ay) * aby) * inv_len2
+            np.clip(t, 0.0, 1.0, out=t)
+            cx = ax + t * abx
+            cy = ay + t * aby
+            best = ((cx - px) ** 2 + (cy - py) ** 2).argmin(axis=1)
+            block = np.arange(len(best))
+            closest[start:start + rows, 0] = cx[block, best]
+            closest[start:start + rows, 1] = cy[block, best]
+        return closest
+    
+    def distances_km(self, lats, lons):
+        """
+        Distancia (km) de muchos puntos a la polilínea en matrices NumPy.
+        Rutas cortas: todos los puntos contra todos los segmentos. Rutas
+        largas: los puntos se ordenan por celda y cada bloque de vecinos se
+        compara sólo con los segmentos a menos de una cota de su caja (la
+        distancia al vértice ancla más cercano), así que el resultado es exacto.
+        """
+        lats = np.asarray(lats, dtype=float).ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        points = self._project(lats, lons).reshape(-1, 2)
+        if len(self.a) <= ROUTE_BRUTE_FORCE_SEGMENTS:
+            closest = self._closest_points(points, np.arange(len(self.a)))
+        else:
+            closest = np.empty_like(points)
+            cells = np.floor((points - self.origin) / self.cell_km)
+            order = np.lexsort((cells[:, 1], cells[:, 0]))
+            anchors = self.a[::max(len(self.a) // ROUTE_BATCH_ANCHORS, 1)]
+            bound = np.sqrt(
+                (points[:, 0:1] - anchors[:, 0]) ** 2 + (points[:, 1:2] - anchors[:, 1]) ** 2
+            ).min(axis=1)
+            for start in range(0, len(points), ROUTE_BATCH_BLOCK_POINTS):
+                rows = order[start:start + ROUTE_BATCH_BLOCK_POINTS]
+                block = points[rows]
+                reach = bound[rows].max()
+                low = block.min(axis=0) - reach
+                high = block.max(axis=0) + reach
+                candidates = np.flatnonzero(((self.seg_max >= low) & (self.seg_min <= high)).all(axis=1))
+                closest[rows] = self._closest_points(block, candidates)
+        near_lat, near_lon = self._unproject(closest[:, 0], closest[:, 1])
+        return haversine_km(lats, lons, near_lat, near_lon)
+    
+    def remaining_km(self, lat, lon, dest_lat, dest_lon, max_offset_km=ROUTE_REMAINING_MAX_OFFSET_KM):
+        """
+        km sobre la ruta entre la posición y el destino, o None si alguno de
+        los dos está a más de max_offset_km de la polilínea o el destino ya
+        quedó atrás (ahí la ruta no describe el recorrido restante).
+        """
+        offset, along = self.locate(lat, lon)
+        dest_offset, dest_along = self.locate(dest_lat, dest_lon)
+        if offset > max_offset_km or dest_offset > max_offset_km or dest_along < along:
+            return None
+        return offset + (dest_along - along) + dest_offset
+
+def route_index_from_item(item):
+    """RouteIndex desde el atributo binario 'polyline' o la lista 'waypoints' de los ítems anteriores"""
+    if 'polyline' in item:
+        return RouteIndex(decode_route_geometry(item['polyline']))
+    if item.get('waypoints'):
+        return RouteIndex([[float(w['lat']), float(w['lon'])] for w in item['waypoints']])
+    raise ValueError('Ruta sin waypoints')
+
+# =====================================================
+# CACHÉ DE RUTAS EN EL CONTENEDOR
+# =====================================================
+ROUTE_CACHE_SIZE = int(os.getenv('ROUTE_CACHE_SIZE', '256'))
+ROUTE_CACHE_TTL_SECONDS = float(os.getenv('ROUTE_CACHE_TTL_SECONDS', '300'))
+# Rutas más consultadas a precargar en el cold start (route_ids separados por coma)
+ROUTE_WARMUP_IDS = [r.strip() for r in os.getenv('ROUTE_WARMUP_IDS', '').split(',') if r.strip()]
+
+class RouteCache:
+    """
+    LRU de RouteIndex por route_id con TTL. Las entradas vencidas no se
+    borran: quedan para revalidarse por 'version' sin bajar la geometría.
+    """
+    
+    def __init__(self, max_entries=256, ttl_seconds=300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # route_id -> (expira, version, RouteIndex)
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+    
+    def get(self, route_id):
+        """(version, RouteIndex, vigente) o None si la ruta no está en caché"""
+        entry = self._entries.get(route_id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(route_id)
+        return entry[1], entry[2], entry[0] >= time.monotonic()
+    
+    def put(self, route_id, version, route_index):
+        self._entries[route_id] = (time.monotonic() + self.ttl_seconds, version, route_index)
+        self._entries.move_to_end(route_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def discard(self, route_id):
+        self._entries.pop(route_id, None)
+    
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidated': self.revalidated,
+            'size': len(self._entries)
+        }
+    
+    def __len__(self):
+        return len(self._entries)
+
+route_cache = RouteCache(ROUTE_CACHE_SIZE, ROUTE_CACHE_TTL_SECONDS)
+
+def get_route_index(route_id):
+    """
+    (RouteIndex, origen) de la ruta; origen es 'hit', 'revalidated' o 'miss'.
+    Dentro del TTL no hay llamada a DynamoDB; vencido, se lee sólo 'version'
+    y si no cambió se renueva la entrada. Devuelve (None, 'miss') si la ruta
+    no existe; ValueError si no tiene waypoints.
+    """
+    cached = route_cache.get(route_id)
+    if cached is not None:
+        version, route_index, fresh = cached
+        if fresh:
+            route_cache.hits += 1
+            return route_index, 'hit'
+        if version is not None:
+            response = get_table('routes_waypoints').get_item(
+                Key={'route_id': route_id},
+                ProjectionExpression='#v',
+                ExpressionAttributeNames={'#v': 'version'}
+            )
+            if response.get('Item', {}).get('version') == version:
+                route_cache.revalidated += 1
+                route_cache.put(route_id, version, route_index)
+                return route_index, 'revalidated'
+    
+    route_cache.misses += 1
+    response = get_table('routes_waypoints').get_item(Key={'route_id': route_id})
+    if 'Item' not in response:
+        route_cache.discard(route_id)
+        return None, 'miss'
+    item = response['Item']
+    route_index = route_index_from_item(item)
+    route_cache.put(route_id, item.get('version'), route_index)
+    return route_index, 'miss'
+
+def warm_up_routes(route_ids):
+    """Precargar rutas en la caché con BatchGetItem (100 claves por llamada)"""
+    pending = [r for r in dict.fromkeys(route_ids) if route_cache.get(r) is None]
+    items, unprocessed = batch_get_keys('routes_waypoints', [{'route_id': r} for r in pending])
+    loaded = 0
+    for item in items:
+        try:
+            route_cache.put(item['route_id'], item.get('version'), route_index_from_item(item))
+            loaded += 1
+        except ValueError:
+            pass
+    if unprocessed:
+        print(f" {len(unprocessed)} rutas sin precargar tras {BATCH_MAX_ATTEMPTS} intentos")
+    return loaded
+
+_routes_warmed = False
+
+def warm_up_routes_once():
+    """
+    Precarga de ROUTE_WARMUP_IDS en la primera invocación del contenedor
+    (no al importar el módulo). Un error no tumba el request: las rutas se
+    cargan igual bajo demanda.
+    """
+    global _routes_warmed
+    if _routes_warmed or not ROUTE_WARMUP_IDS:
+        return
+    _routes_warmed = True
+    try:
+        warm_up_routes(ROUTE_WARMUP_IDS)
+    except Exception as e:
+        print(f" Error precargando rutas: {e}")
+
+# =====================================================
+# PERFIL DE VELOCIDADES Y ETA
+# =====================================================
+# .npz publicado por el ETL (avance3/speed_profiles.py): s3://bucket/key o ruta local
+SPEED_PROFILE_URI = os.getenv('SPEED_PROFILE_URI', '')
+SPEED_PROFILE_REFRESH_SECONDS = float(os.getenv('SPEED_PROFILE_REFRESH_SECONDS', '3600'))
+# Los timestamps de trips (y por lo tanto el perfil) están en hora de Colombia
+SPEED_PROFILE_UTC_OFFSET_HOURS = float(os.getenv('SPEED_PROFILE_UTC_OFFSET_HOURS', '-5'))
+# km por carretera / km en línea recta cuando no hay geometría de la ruta
+ROAD_CIRCUITY_FACTOR = float(os.getenv('ROAD_CIRCUITY_FACTOR', '1.3'))
+
+class SpeedProfile:
+    """
+    Velocidades medianas ruta × día de la semana × hora (la última fila es el
+    perfil global para rutas desconocidas). travel_hours() integra la
+    velocidad de cada franja horaria desde la salida: sobre los km acumulados
+    por franja (dos semanas seguidas) la llegada sale de una comparación
+    vectorizada, sin iterar hora por hora.
+    """
+    
+    def __init__(self, route_codes, speeds, etag=None):
+        self.row_of = {code: row for row, code in enumerate(route_codes)}
+        self.global_row = len(route_codes)
+        slots = np.asarray(speeds, dtype=float).reshape(len(speeds), 7 * 24)
+        self.slots = np.concatenate([slots, slots], axis=1)
+        self.cumulative = np.concatenate(
+            [np.zeros((len(slots), 1)), np.cumsum(self.slots, axis=1)], axis=1
+        )
+        self.week_km = self.cumulative[:, 7 * 24]
+        self.etag = etag
+    
+    @classmethod
+    def from_bytes(cls, data, etag=None):
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            return cls(npz['route_codes'].tolist(), npz['speeds'], etag)
+    
+    def rows(self, route_ids):
+        """Fila del perfil por route_id (routes.route_code); global si no se conoce"""
+        return np.array([self.row_of.get(route_id, self.global_row) for route_id in route_ids], dtype=int)
+    
+    def travel_hours(self, rows, distance_km, start):
+        """Horas para recorrer distance_km saliendo en start (datetime con zona horaria)"""
+        local = start + timedelta(hours=SPEED_PROFILE_UTC_OFFSET_HOURS)
+        slot = local.weekday() * 24 + local.hour + (local.minute * 60 + local.second) / 3600
+        first = int(slot)
+        start_km = self.cumulative[rows, first] + (slot - first) * self.slots[rows, first]
+        # Semanas completas aparte: el resto siempre cae dentro de las dos semanas tabuladas
+        weeks = np.floor(distance_km / self.week_km[rows])
+        target = start_km + distance_km - weeks * self.week_km[rows]
+        last = np.minimum((self.cumulative[rows] <= target[:, None]).sum(axis=1) - 1, 2 * 7 * 24 - 1)
+        end = last + (target - self.cumulative[rows, last]) / self.slots[rows, last]
+        return weeks * 7 * 24 + end - slot
+
+_speed_profile = None
+_speed_profile_checked_at = None
+
+def _read_speed_profile(uri, etag):
+    """(bytes, etag) del perfil; bytes None si no cambió desde etag"""
+    if uri.startswith('s3://'):
+        bucket, key = uri[len('s3://'):].split('/', 1)
+        s3 = get_client('s3')
+        if etag is not None and s3.head_object(Bucket=bucket, Key=key)['ETag'] == etag:
+            return None, etag
+        response = s3.get_object(Bucket=bucket, Key=key)
+        return response['Body'].read(), response['ETag']
+    mtime = os.path.getmtime(uri)
+    if mtime == etag:
+        return None, etag
+    with open(uri, 'rb') as f:
+        return f.read(), mtime
+
+def get_speed_profile():
+    """
+    Perfil cargado en el contenedor (None si SPEED_PROFILE_URI no está
+    configurado). Se revisa si hay una versión nueva cada
+    SPEED_PROFILE_REFRESH_SECONDS, nunca por request.
+    """
+    global _speed_profile, _speed_profile_checked_at
+    if not SPEED_PROFILE_URI:
+        return None
+    now = time.monotonic()
+    if _speed_profile_checked_at is not None and now - _speed_profile_checked_at < SPEED_PROFILE_REFRESH_SECONDS:
+        return _speed_profile
+    _speed_profile_checked_at = now
+    try:
+        data, etag = _read_speed_profile(SPEED_PROFILE_URI, _speed_profile.etag if _speed_profile else None)
+        if data is not None:
+            _speed_profile = SpeedProfile.from_bytes(data, etag)
+    except Exception as e:
+        print(f" Error cargando perfil de velocidades: {e}")
+    return _speed_profile
+
+def remaining_distances(origin_lat, origin_lon, dest_lat, dest_lon, route_ids=None):
+    """
+    Distancia restante (km) por posición: sobre la polilínea si la ruta está
+    vigente en route_cache (sin ir a DynamoDB); si no, haversine ×
+    ROAD_CIRCUITY_FACTOR.
+    """
+    distance_km = np.atleast_1d(haversine_km(origin_lat, origin_lon, dest_lat, dest_lon)) * ROAD_CIRCUITY_FACTOR
+    for i, route_id in enumerate(route_ids or []):
+        cached = route_cache.get(route_id) if route_id else None
+        if cached is not None and cached[2]:
+            along_route = cached[1].remaining_km(origin_lat[i], origin_lon[i], dest_lat[i], dest_lon[i])
+            if along_route is not None:
+                distance_km[i] = along_route
+    return distance_km
+
+def compute_etas(origin_lat, origin_lon, dest_lat, dest_lon, speed_kmh, route_ids=None, now=None):
+    """
+    Distancia restante (km), horas hasta destino y modelo usado
+    ('speed_profile' o 'current_speed') para N posiciones en una sola pasada
+    vectorizada. Con perfil de velocidades las horas salen de la velocidad
+    histórica de la ruta (o global) en cada franja horaria; sin perfil, de la
+    velocidad actual (<= 0 devuelve NaN: ETA no disponible).
+    """
+    origin_lat, origin_lon, dest_lat, dest_lon = (
+        np.asarray(v, dtype=float) for v in (origin_lat, origin_lon, dest_lat, dest_lon)
+    )
+    distance_km = remaining_distances(origin_lat, origin_lon, dest_lat, dest_lon, route_ids)
+    profile = get_speed_profile()
+    if profile is not None:
+        rows = profile.rows(route_ids or [None] * len(distance_km))
+        return distance_km, profile.travel_hours(rows, distance_km, now or datetime.now(timezone.utc)), 'speed_profile'
+    speed = np.asarray(speed_kmh, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hours = np.where(speed > 0, distance_km / speed, np.nan)
+    return distance_km, hours, 'current_speed'
+
+if SPEED_PROFILE_URI:
+    # Fase init del cold start
+    get_speed_profile()
+
+# =====================================================
+# COALESCENCIA DE ESCRITURAS EN vehicle_tracking
+# =====================================================
+# Por vehículo: un ítem con la última posición (sort key fija 'LATEST') y un
+# histórico submuestreado que expira por TTL (atributo expires_at). Un ping
+# sólo se escribe si el vehículo se movió, cambió de velocidad o venció el
+# heartbeat; al histórico va cada TRACKING_HISTORY_INTERVAL_SECONDS o
+# TRACKING_HISTORY_MIN_DISTANCE_M recorridos.
+LATEST_SORT_KEY = 'LATEST'
+TRACKING_DEADBAND_M = float(os.getenv('TRACKING_DEADBAND_M', '150'))
+TRACKING_SPEED_DEADBAND_KMH = float(os.getenv('TRACKING_SPEED_DEADBAND_KMH', '5'))
+TRACKING_HEARTBEAT_SECONDS = float(os.getenv('TRACKING_HEARTBEAT_SECONDS', '60'))
+TRACKING_HISTORY_INTERVAL_SECONDS = float(os.getenv('TRACKING_HISTORY_INTERVAL_SECONDS', '300'))
+TRACKING_HISTORY_MIN_DISTANCE_M = float(os.getenv('TRACKING_HISTORY_MIN_DISTANCE_M', '1000'))
+TRACKING_HISTORY_TTL_DAYS = float(os.getenv('TRACKING_HISTORY_TTL_DAYS', '30'))
+TRACKING_STATE_SIZE = 10000
+
+# vehicle_id -> último estado escrito; en un contenedor nuevo se lee del ítem LATEST
+_tracking_state = OrderedDict()
+
+def _parse_timestamp(value, default):
+    """ISO 8601 -> datetime con zona (UTC si no trae); default si no se puede leer"""
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return default
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _epoch_iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+def _load_tracking_state(vehicle_ids):
+    """Traer con BatchGetItem el ítem LATEST de los vehículos que el contenedor no conoce"""
+    missing = [v for v in vehicle_ids if v not in _tracking_state]
+    epoch_zero = datetime.fromtimestamp(0, timezone.utc)
+    items, unprocessed = batch_get_keys(
+        'vehicle_tracking',
+        [{'vehicle_id': v, 'timestamp': LATEST_SORT_KEY} for v in missing],
+        ProjectionExpression='vehicle_id, current_location, current_speed_kmh, reported_at, history_at, history_location'
+    )
+    if unprocessed:
+        # Sin el LATEST no se puede decidir la banda muerta: mejor reintentar el lote
+        raise RuntimeError(f'{len(unprocessed)} vehículos sin estado de tracking tras {BATCH_MAX_ATTEMPTS} intentos')
+    for item in items:
+        location = item['current_location']
+        history = item.get('history_location', location)
+        _tracking_state[item['vehicle_id']] = {
+            'lat': float(location['lat']),
+            'lon': float(location['lon']),
+            'speed': float(item.get('current_speed_kmh') or 0),
+            'reported_at': _parse_timestamp(item.get('reported_at'), epoch_zero).timestamp(),
+            'history_at': _parse_timestamp(item.get('history_at'), epoch_zero).timestamp(),
+            'history_lat': float(history['lat']),
+            'history_lon': float(history['lon'])
+        }
+
+def plan_tracking_writes(items, now=None):
+    """
+    Decide, en orden de llegada, qué hacer con cada ítem de tracking:
+    'history' (LATEST + punto histórico), 'latest' o 'skipped' (dentro de la
+    banda muerta, o ping atrasado). Devuelve (ítems a escribir, acciones,
+    estados nuevos por vehículo) sin modificar _tracking_state.
+    """
+    now = now or datetime.now(timezone.utc)
+    _load_tracking_state({item['vehicle_id'] for item in items})
+    pending = {}
+    latest_items = {}  # sólo el LATEST más reciente de cada vehículo llega a DynamoDB
+    writes = []
+    actions = []
+    for item in items:
+        vehicle_id = item['vehicle_id']
+        state = pending.get(vehicle_id) or _tracking_state.get(vehicle_id)
+        lat = float(item['current_location']['lat'])
+        lon = float(item['current_location']['lon'])
+        speed = float(item.get('current_speed_kmh') or 0)
+        reported_at = _parse_timestamp(item['timestamp'], now).timestamp()
+        
+        if state is None:
+            history = latest = True
+        elif reported_at <= state['reported_at']:
+            history = latest = False
+        else:
+            history = (
+                reported_at - state['history_at'] >= TRACKING_HISTORY_INTERVAL_SECONDS
+                or haversine_km(state['history_lat'], state['history_lon'], lat, lon) * 1000 >= TRACKING_HISTORY_MIN_DISTANCE_M
+            )
+            latest = (
+                history
+                or haversine_km(state['lat'], state['lon'], lat, lon) * 1000 >= TRACKING_DEADBAND_M
+                or abs(speed - state['speed']) >= TRACKING_SPEED_DEADBAND_KMH
+                or reported_at - state['reported_at'] >= TRACKING_HEARTBEAT_SECONDS
+            )
+        
+        if not latest:
+            actions.append('skipped')
+            continue
+        
+        new_state = {'lat': lat, 'lon': lon, 'speed': speed, 'reported_at': reported_at}
+        if history:
+            new_state.update(history_at=reported_at, history_lat=lat, history_lon=lon)
+        else:
+            new_state.update(history_at=state['history_at'], history_lat=state['history_lat'], history_lon=state['history_lon'])
+        pending[vehicle_id] = new_state
+        
+        latest_items[vehicle_id] = dict(
+            item,
+            timestamp=LATEST_SORT_KEY,
+            reported_at=_epoch_iso(reported_at),
+            history_at=_epoch_iso(new_state['history_at']),
+            history_location={'lat': new_state['history_lat'], 'lon': new_state['history_lon']}
+        )
+        if history:
+            writes.append(dict(item, expires_at=int(reported_at + TRACKING_HISTORY_TTL_DAYS * 86400)))
+        actions.append('history' if history else 'latest')
+    return writes + list(latest_items.values()), actions, pending
+
+def write_tracking(items, now=None):
+    """
+    Escribir ítems de tracking con coalescencia (batch_put_items: lotes de 25
+    y reenvío de UnprocessedItems). El estado del contenedor se actualiza sólo
+    si la escritura terminó bien. Devuelve (acciones por ítem, ítems escritos).
+    """
+    writes, actions, pending = plan_tracking_writes(items, now)
+    if writes:
+        batch_put_items(
+            'vehicle_tracking',
+            [marshal_item('vehicle_tracking', write) for write in writes],
+            ['vehicle_id', 'timestamp']
+        )
+    for vehicle_id, state in pending.items():
+        _tracking_state[vehicle_id] = state
+        _tracking_state.move_to_end(vehicle_id)
+    while len(_tracking_state) > TRACKING_STATE_SIZE:
+        _tracking_state.popitem(last=False)
+    return actions, len(writes)
+
+# =====================================================
+# ALERTAS: SUPRESIÓN Y PUBLICACIÓN EN SNS
+# =====================================================
+# Nada queda pendiente en threads: Lambda congela el contenedor apenas el
+# handler responde. La supresión en memoria descarta las repeticiones sin
+# llamar a AWS. Con ALERT_DISPATCH_MODE='async' (default) el request sólo
+# entrega las alertas a la Lambda ALERTS_PUBLISHER_FUNCTION con una
+# invocación asíncrona: Lambda guarda el evento antes de responder 202 y
+# reintenta la publicadora si falla. La publicadora (o el propio request con
+# 'sync', para pruebas locales) abre la ventana en el ítem de estado del
+# vehículo en alerts_history (sort key fija 'STATE', un atributo
+# <tipo>_notified_at por tipo de alerta), guarda el histórico y publica en
+# SNS con publish_batch (hasta 10 por llamada).
+ALERTS_TOPIC_ARN = os.getenv('ALERTS_TOPIC_ARN', '')
+ALERTS_PUBLISHER_FUNCTION = os.getenv('ALERTS_PUBLISHER_FUNCTION', 'fleetlogix-publicar-alertas')
+ALERT_STATE_SORT_KEY = 'STATE'
+# Ventana de supresión por vehículo y tipo de alerta
+ALERT_SUPPRESSION_SECONDS = float(os.getenv('ALERT_SUPPRESSION_SECONDS', '900'))
+# 'async': se entrega a ALERTS_PUBLISHER_FUNCTION; 'sync': se publica antes de responder (local/tests)
+ALERT_DISPATCH_MODE = os.getenv('ALERT_DISPATCH_MODE', 'async')
+ALERT_PUBLISH_BATCH = 10  # máximo de publish_batch
+# Alertas por invocación de la publicadora (el evento asíncrono admite hasta 256 KB)
+ALERT_HANDOFF_BATCH = 100
+ALERT_STATE_SIZE = 10000
+ALERT_RATE_WINDOW_SECONDS = 60
+ALERT_METRICS_NAMESPACE = 'FleetLogix/Alertas'
+ALERT_METRIC_NAMES = {
+    'received': 'AlertsReceived',
+    'suppressed': 'AlertsSuppressed',
+    'deduplicated': 'AlertsDeduplicated',
+    'published': 'AlertsPublished',
+    'handed_off': 'AlertsHandedOff',
+    'stored': 'AlertsStored',
+    'failed': 'AlertsFailed'
+}
+ALERT_SUBJECTS = {'ROUTE_DEVIATION': 'Desvío de ruta'}
+# Errores de SNS / Lambda que se reintentan con backoff; cualquier otro código da el lote por fallido
+ALERT_RETRYABLE_ERRORS = {
+    'Throttled', 'Throttling', 'ThrottlingException', 'ThrottledException', 'TooManyRequestsException',
+    'KMSThrottling', 'InternalError', 'InternalFailure', 'ServiceUnavailable', 'ServiceException',
+    'EC2ThrottledException', 'ResourceConflictException'
+}
+
+def claim_alert_window(vehicle_id, alert_type, notified_at, suppression_seconds):
+    """
+    Abrir la ventana de supresión en el ítem de estado del vehículo. False si
+    otro contenedor ya notificó este tipo de alerta dentro de la ventana.
+    """
+    try:
+        get_client('dynamodb').update_item(
+            TableName='alerts_history',
+            Key={'vehicle_id': {'S': vehicle_id}, 'timestamp': {'S': ALERT_STATE_SORT_KEY}},
+            UpdateExpression='SET #n = :now',
+            ConditionExpression='attribute_not_exists(#n) OR #n <= :cutoff',
+            ExpressionAttributeNames={'#n': f'{alert_type}_notified_at'},
+            ExpressionAttributeValues={
+                ':now': {'N': _number(round(notified_at, 3))},
+                ':cutoff': {'N': _number(round(notified_at - suppression_seconds, 3))}
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
+
+def release_alert_window(vehicle_id, alert_type, notified_at):
+    """
+    Cerrar la ventana abierta por una alerta que no se pudo entregar, para que
+    el reintento la vuelva a enviar. No toca una ventana que otro contenedor
+    abrió después.
+    """
+    try:
+        get_client('dynamodb').update_item(
+            TableName='alerts_history',
+            Key={'vehicle_id': {'S': vehicle_id}, 'timestamp': {'S': ALERT_STATE_SORT_KEY}},
+            UpdateExpression='REMOVE #n',
+            ConditionExpression='#n = :now',
+            ExpressionAttributeNames={'#n': f'{alert_type}_notified_at'},
+            ExpressionAttributeValues={':now': {'N': _number(round(notified_at, 3))}}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print(f" Error liberando la ventana de alertas de {vehicle_id}: {e}")
+
+def _alert_entry(entry_id, alert):
+    subject = f"FleetLogix: {ALERT_SUBJECTS.get(alert['alert_type'], alert['alert_type'])} {alert['vehicle_id']}"
+    return {
+        'Id': entry_id,
+        'Subject': subject[:100],
+        'Message': to_json(alert),
+        # Para filtrar suscripciones por tipo o vehículo (FilterPolicy)
+        'MessageAttributes': {
+            'alert_type': {'DataType': 'String', 'StringValue': alert['alert_type']},
+            'vehicle_id': {'DataType': 'String', 'StringValue': alert['vehicle_id']}
+        }
+    }
+
+def _retryable(error):
+    """Throttling, error interno del servicio o falla de red (timeout, conexión cortada)"""
+    if isinstance(error, ClientError):
+        return error.response['Error']['Code'] in ALERT_RETRYABLE_ERRORS
+    return isinstance(error, (BotoConnectionError, HTTPClientError))
+
+def publish_alerts(alerts, topic_arn):
+    """
+    publish_batch en lotes de ALERT_PUBLISH_BATCH. Se reintentan con backoff
+    las entradas que fallan del lado de SNS y los lotes que chocan con un
+    error transitorio (_retryable); un error no reintentable o agotar
+    BATCH_MAX_ATTEMPTS da por fallido lo que quede del lote. Devuelve
+    (publicadas, alertas que no se publicaron).
+    """
+    published = 0
+    failed = []
+    for start in range(0, len(alerts), ALERT_PUBLISH_BATCH):
+        entries = {str(i): alert for i, alert in enumerate(alerts[start:start + ALERT_PUBLISH_BATCH])}
+        error = None
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+            try:
+                response = get_client('sns').publish_batch(
+                    TopicArn=topic_arn,
+                    PublishBatchRequestEntries=[_alert_entry(i, alert) for i, alert in entries.items()]
+                )
+            except (ClientError, BotoConnectionError, HTTPClientError) as e:
+                error = e
+                if _retryable(e):
+                    continue
+                break
+            error = None
+            published += len(response.get('Successful', []))
+            retry = {}
+            for failure in response.get('Failed', []):
+                if failure.get('SenderFault'):
+                    failed.append(entries[failure['Id']])
+                    print(f" SNS rechazó la alerta de {entries[failure['Id']]['vehicle_id']}: {failure.get('Message')}")
+                else:
+                    retry[failure['Id']] = entries[failure['Id']]
+            entries = retry
+            if not entries:
+                break
+        if entries:
+            print(f" {len(entries)} alertas sin publicar en SNS: {error or 'reintentos agotados'}")
+            failed.extend(entries.values())
+    return published, failed
+
+def handoff_alerts(alerts, function_name):
+    """
+    Entregar alertas a la Lambda publicadora con invocaciones asíncronas
+    (InvocationType='Event'); el 202 significa que Lambda ya guardó el
+    evento. Mismos reintentos que publish_alerts. Devuelve (entregadas,
+    alertas que no se pudieron entregar).
+    """
+    handed_off = 0
+    failed = []
+    for start in range(0, len(alerts), ALERT_HANDOFF_BATCH):
+        chunk = alerts[start:start + ALERT_HANDOFF_BATCH]
+        payload = to_json({'alerts': chunk})
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+            try:
+                get_client('lambda').invoke(FunctionName=function_name, InvocationType='Event', Payload=payload)
+            except (ClientError, BotoConnectionError, HTTPClientError) as e:
+                if _retryable(e) and attempt + 1 < BATCH_MAX_ATTEMPTS:
+                    continue
+                print(f" Error entregando {len(chunk)} alertas a {function_name}: {e}")
+                failed.extend(chunk)
+                break
+            handed_off += len(chunk)
+            break
+    return handed_off, failed
+
+def _claim_or_notify(alert, notified_at, suppression_seconds):
+    try:
+        return claim_alert_window(alert['vehicle_id'], alert['alert_type'], notified_at, suppression_seconds)
+    except Exception as e:
+        # Sin estado no se puede deduplicar: mejor notificar de más que perder la alerta
+        print(f" Error en el estado de alertas de {alert['vehicle_id']}: {e}")
+        return True
+
+def deliver_alerts(alerts, notified_at, suppression_seconds):
+    """
+    Confirmar la ventana compartida (un UpdateItem condicional por alerta,
+    en paralelo), guardar en alerts_history y publicar en SNS. Devuelve el
+    resultado de cada alerta: 'deduplicated' (otro contenedor ya la
+    notificó), 'published', 'stored' (sin tópico: sólo histórico) o
+    'failed'. Las fallidas liberan su ventana para que el reintento las
+    vuelva a enviar.
+    """
+    statuses = [None] * len(alerts)
+    claims = [_dynamo_executor.submit(_claim_or_notify, alert, notified_at, suppression_seconds) for alert in alerts]
+    claimed = []
+    for position, claim in enumerate(claims):
+        if claim.result():
+            claimed.append(position)
+        else:
+            statuses[position] = 'deduplicated'
+    if not claimed:
+        return statuses
+    
+    items = [alerts[position] for position in claimed]
+    topic_arn = ALERTS_TOPIC_ARN
+    try:
+        batch_put_items(
+            'alerts_history',
+            [marshal_item('alerts_history', alert) for alert in items],
+            ['vehicle_id', 'timestamp']
+        )
+    except Exception as e:
+        print(f" Error guardando {len(items)} alertas en alerts_history: {e}")
+        delivered, failed = 'failed', items
+    else:
+        if topic_arn:
+            delivered, (_, failed) = 'published', publish_alerts(items, topic_arn)
+        else:
+            delivered, failed = 'stored', []
+    failed_ids = {id(alert) for alert in failed}
+    for position in claimed:
+        statuses[position] = 'failed' if id(alerts[position]) in failed_ids else delivered
+    futures = [
+        _dynamo_executor.submit(release_alert_window, alert['vehicle_id'], alert['alert_type'], notified_at)
+        for alert in failed
+    ]
+    for future in futures:
+        future.result()
+    return statuses
+
+def _count_per_second(buckets, now, count=1):
+    """Contador por segundo para las tasas de la ventana ALERT_RATE_WINDOW_SECONDS"""
+    second = int(now)
+    if buckets and buckets[-1][0] == second:
+        buckets[-1][1] += count
+    else:
+        buckets.append([second, count])
+
+class AlertDispatcher:
+    """
+    Supresión por vehículo en memoria + entrega a la publicadora ('async')
+    o confirmación, histórico y publicación en el request ('sync'), siempre
+    antes de responder. Contadores y tasas son del contenedor;
+    emit_metrics() los deja en CloudWatch como métricas EMF en el log de la
+    invocación que los produjo.
+    """
+    
+    def __init__(self, suppression_seconds=900.0, mode='async'):
+        self.suppression_seconds = suppression_seconds
+        self.mode = mode
+        self._windows = OrderedDict()  # (vehicle_id, alert_type) -> [notificada (epoch), suprimidas desde entonces]
+        self._lock = threading.Lock()
+        self._received = deque()  # [segundo, alertas] recibidas y publicadas
+        self._published = deque()
+        self.counters = {name: 0 for name in ('received', 'suppressed', 'deduplicated', 'published',
+                                               'handed_off', 'stored', 'failed')}
+        self._reported = dict(self.counters)
+    
+    def dispatch(self, alerts):
+        """
+        Despachar alertas y devolver el resultado de cada una, en el mismo
+        orden: 'suppressed' (ventana abierta en este contenedor),
+        'handed_off' (entregada a ALERTS_PUBLISHER_FUNCTION) o 'failed'; en
+        modo 'sync', lo que devuelve deliver_alerts. Una alerta que falla
+        libera su ventana para que el reintento la reenvíe.
+        """
+        now = time.time()
+        statuses = [None] * len(alerts)
+        pending = []  # (posición, alerta con las suprimidas desde la última notificada)
+        with self._lock:
+            _count_per_second(self._received, now, len(alerts))
+            for position, alert in enumerate(alerts):
+                key = (alert['vehicle_id'], alert['alert_type'])
+                window = self._windows.get(key)
+                if window is not None and now - window[0] < self.suppression_seconds:
+                    window[1] += 1
+                    statuses[position] = 'suppressed'
+                    continue
+                pending.append((position, dict(alert, suppressed_count=window[1] if window else 0)))
+                self._windows[key] = [now, 0]
+                self._windows.move_to_end(key)
+            while len(self._windows) > ALERT_STATE_SIZE:
+                self._windows.popitem(last=False)
+        
+        if pending:
+            items = [alert for _, alert in pending]
+            if self.mode == 'async' and ALERTS_PUBLISHER_FUNCTION:
+                _, failed = handoff_alerts(items, ALERTS_PUBLISHER_FUNCTION)
+                failed_ids = {id(alert) for alert in failed}
+                results = ['failed' if id(alert) in failed_ids else 'handed_off' for alert in items]
+            else:
+                results = deliver_alerts(items, now, self.suppression_seconds)
+            for (position, _), status in zip(pending, results):
+                statuses[position] = status
+            with self._lock:
+                for (_, alert), status in zip(pending, results):
+                    key = (alert['vehicle_id'], alert['alert_type'])
+                    window = self._windows.get(key)
+                    if status == 'failed' and window is not None and window[0] == now:
+                        del self._windows[key]
+        
+        with self._lock:
+            self.counters['received'] += len(alerts)
+            for status in statuses:
+                self.counters[status] += 1
+            published = statuses.count('published') + statuses.count('handed_off')
+            if published:
+                _count_per_second(self._published, time.time(), published)
+        return statuses
+    
+    def record(self, **counts):
+        """Sumar a los contadores lo despachado fuera de dispatch() (Lambda publicadora)"""
+        with self._lock:
+            for name, count in counts.items():
+                self.counters[name] += count
+            if counts.get('published'):
+                _count_per_second(self._published, time.time(), counts['published'])
+    
+    def emit_metrics(self):
+        """
+        Línea EMF (Embedded Metric Format) con lo despachado desde la última
+        llamada: CloudWatch la convierte en métricas sin llamar a
+        PutMetricData. Los handlers la llaman antes de responder.
+        """
+        with self._lock:
+            delta = {name: self.counters[name] - self._reported[name] for name in ALERT_METRIC_NAMES}
+            self._reported = dict(self.counters)
+        if not any(delta.values()):
+            return
+        metrics = {ALERT_METRIC_NAMES[name]: value for name, value in delta.items()}
+        print(json.dumps(dict({
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': ALERT_METRICS_NAMESPACE,
+                    'Dimensions': [[]],
+                    'Metrics': [{'Name': name, 'Unit': 'Count'} for name in metrics]
+                }]
+            }
+        }, **metrics)))
+    
+    def stats(self):
+        """Contadores del contenedor y tasas por minuto de la última ventana"""
+        cutoff = int(time.time()) - ALERT_RATE_WINDOW_SECONDS
+        per_minute = 60 / ALERT_RATE_WINDOW_SECONDS
+        with self._lock:
+            for buckets in (self._received, self._published):
+                while buckets and buckets[0][0] <= cutoff:
+                    buckets.popleft()
+            return dict(
+                self.counters,
+                received_per_minute=sum(count for _, count in self._received) * per_minute,
+                published_per_minute=sum(count for _, count in self._published) * per_minute
+            )
+
+alert_dispatcher = AlertDispatcher(ALERT_SUPPRESSION_SECONDS, ALERT_DISPATCH_MODE)
+
+# =====================================================
+# DESVÍOS POR LOTES CON HISTÉRESIS
+# =====================================================
+# Un vehículo entra en "fuera de ruta" al pasar GEOFENCE_ENTER_KM y sólo sale
+# al volver por debajo de GEOFENCE_EXIT_KM: el ruido GPS alrededor del umbral
+# no genera eventos. El estado vive en el contenedor y, en cada transición,
+# en el ítem STATE del vehículo en alerts_history (off_route, off_route_at);
+# lo comparten evaluar-desvios (lotes) y alerta-desvio (un punto).
+GEOFENCE_ENTER_KM = float(os.getenv('GEOFENCE_ENTER_KM', '5'))
+GEOFENCE_EXIT_KM = float(os.getenv('GEOFENCE_EXIT_KM', '3'))
+GEOFENCE_STATE_SIZE = 10000
+# Vehículo sin estado guardado: en ruta
+GEOFENCE_INITIAL_STATE = {'off_route': False, 'route_id': None, 'at': 0.0}
+
+# vehicle_id -> {'off_route', 'route_id', 'at' (epoch del último punto evaluado)}
+_geofence_state = OrderedDict()
+
+def _load_geofence_state(vehicle_ids):
+    """
+    Traer con BatchGetItem el estado de los vehículos que el contenedor no
+    conoce (sin ítem: en ruta). Devuelve los vehículos cuyo estado siguió
+    sin leerse tras los reintentos: sus posiciones no se pueden evaluar.
+    """
+    missing = [v for v in vehicle_ids if v not in _geofence_state]
+    if not missing:
+        return set()
+    items, unprocessed = batch_get_keys(
+        'alerts_history',
+        [{'vehicle_id': v, 'timestamp': ALERT_STATE_SORT_KEY} for v in missing],
+        ProjectionExpression='vehicle_id, off_route, off_route_id, off_route_at'
+    )
+    for item in items:
+        _geofence_state[item['vehicle_id']] = {
+            'off_route': bool(item.get('off_route', False)),
+            'route_id': item.get('off_route_id'),
+            'at': float(item.get('off_route_at', 0))
+        }
+    unavailable = {key['vehicle_id'] for key in unprocessed}
+    for vehicle_id in missing:
+        if vehicle_id not in unavailable and vehicle_id not in _geofence_state:
+            _geofence_state[vehicle_id] = dict(GEOFENCE_INITIAL_STATE)
+    if unavailable:
+        print(f" Estado de desvío sin leer para {len(unavailable)} vehículos tras {BATCH_MAX_ATTEMPTS} intentos")
+    return unavailable
+
+def _save_geofence_state(vehicle_id, state):
+    """Guardar una transición; False si otro contenedor ya guardó una más reciente"""
+    try:
+        get_client('dynamodb').update_item(
+            TableName='alerts_history',
+            Key={'vehicle_id': {'S': vehicle_id}, 'timestamp': {'S': ALERT_STATE_SORT_KEY}},
+            UpdateExpression='SET off_route = :off, off_route_id = :route, off_route_at = :at',
+            ConditionExpression='attribute_not_exists(off_route_at) OR off_route_at < :at',
+            ExpressionAttributeValues={
+                ':off': {'BOOL': state['off_route']},
+                ':route': {'S': str(state['route_id'])},
+                ':at': {'N': _number(round(state['at'], 3))}
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
+
+def evaluate_deviations(positions):
+    """
+    positions: [(vehicle_id, route_id, lat, lon, epoch), ...] en cualquier
+    orden. Agrupa por ruta, mide todas las distancias de cada ruta con
+    RouteIndex.distances_km y recorre cada vehículo en orden de tiempo
+    aplicando la histéresis. Devuelve (distancias por posición, NaN si la
+    ruta no existe; eventos; estados nuevos por vehículo; contadores, con los
+    vehículos cuyo estado no se pudo leer) sin modificar _geofence_state.
+    """
+    distances = np.full(len(positions), np.nan)
+    by_route = {}
+    for i, position in enumerate(positions):
+        by_route.setdefault(position[1], []).append(i)
+    unknown_routes = []
+    for route_id, indices in by_route.items():
+        try:
+            route_index, _ = get_route_index(route_id)
+        except ValueError:
+            route_index = None
+        if route_index is None:
+            unknown_routes.append(route_id)
+            continue
+        indices = np.array(indices)
+        columns = np.array([positions[i][2:4] for i in indices], dtype=float)
+        distances[indices] = route_index.distances_km(columns[:, 0], columns[:, 1])
+    
+    evaluated = [i for i in range(len(positions)) if not np.isnan(distances[i])]
+    unavailable = _load_geofence_state({positions[i][0] for i in evaluated})
+    evaluated = [i for i in evaluated if positions[i][0] not in unavailable]
+    evaluated.sort(key=lambda i: (positions[i][0], positions[i][4]))
+    
+    pending = {}
+    events = []
+    late = 0
+    for i in evaluated:
+        vehicle_id, route_id, lat, lon, epoch = positions[i]
+        state = pending.get(vehicle_id) or _geofence_state.get(vehicle_id) or GEOFENCE_INITIAL_STATE
+        if epoch <= state['at']:
+            late += 1
+            continue
+        distance = float(distances[i])
+        if not state['off_route'] and distance > GEOFENCE_ENTER_KM:
+            event = 'OFF_ROUTE_ENTER'
+        elif state['off_route'] and distance < GEOFENCE_EXIT_KM:
+            event = 'OFF_ROUTE_EXIT'
+        else:
+            event = None
+        if event:
+            pending[vehicle_id] = {'off_route': event == 'OFF_ROUTE_ENTER', 'route_id': route_id, 'at': epoch, 'changed': True}
+            events.append({
+                'event': event,
+                'vehicle_id': vehicle_id,
+                'route_id': route_id,
+                'timestamp': _epoch_iso(epoch),
+                'deviation_km': round(distance, 2),
+                'current_location': {'lat': lat, 'lon': lon},
+                'index': i
+            })
+        else:
+            pending[vehicle_id] = dict(state, at=epoch)
+    counts = {'evaluated': len(evaluated), 'late': late, 'unknown_routes': unknown_routes,
+              'unavailable': sorted(unavailable)}
+    return distances, events, pending, counts
+
+def commit_geofence_state(pending):
+    """
+    Guardar en paralelo el estado final de los vehículos con transiciones y
+    actualizar el del contenedor. Un vehículo cuya escritura pierde contra
+    otro contenedor, o falla, se olvida para releerlo en la próxima
+    invocación. Devuelve los vehículos cuyo estado no se pudo guardar.
+    """
+    changed = [v for v, state in pending.items() if state.get('changed')]
+    futures = {v: _dynamo_executor.submit(_save_geofence_state, v, pending[v]) for v in changed}
+    stale = set()
+    failed = set()
+    for vehicle_id, future in futures.items():
+        try:
+            if not future.result():
+                stale.add(vehicle_id)
+        except Exception as e:
+            print(f" Error guardando el estado de desvío de {vehicle_id}: {e}")
+            failed.add(vehicle_id)
+    for vehicle_id, state in pending.items():
+        if vehicle_id in stale or vehicle_id in failed:
+            _geofence_state.pop(vehicle_id, None)
+            continue
+        _geofence_state[vehicle_id] = {k: state[k] for k in ('off_route', 'route_id', 'at')}
+        _geofence_state.move_to_end(vehicle_id)
+    while len(_geofence_state) > GEOFENCE_STATE_SIZE:
+        _geofence_state.popitem(last=False)
+    return failed
+
+def process_deviations(positions, drivers):
+    """
+    evaluate_deviations + alertas + estado, en ese orden: las alertas de
+    entrada en "fuera de ruta" se despachan antes de guardar el estado. Si
+    la invocación muere entre ambos pasos, el reintento vuelve a ver la
+    transición y la ventana de alert_dispatcher evita el duplicado; al revés
+    el reintento tomaría los puntos como atrasados y la alerta se perdería.
+    Un vehículo cuya alerta falla no guarda su estado. drivers: driver_id
+    por posición. Devuelve (distancias, eventos con 'index' y
+    'alert_status', estados nuevos, contadores + 'alerts' y 'failed').
+    """
+    distances, events, pending, counts = evaluate_deviations(positions)
+    entered = [e for e in events if e['event'] == 'OFF_ROUTE_ENTER']
+    alerts = [{
+        'vehicle_id': e['vehicle_id'],
+        'timestamp': e['timestamp'],
+        'driver_id': drivers[e['index']],
+        'route_id': e['route_id'],
+        'deviation_km': e['deviation_km'],
+        'current_location': e['current_location'],
+        'alert_type': 'ROUTE_DEVIATION'
+    } for e in entered]
+    statuses = alert_dispatcher.dispatch(alerts)
+    alert_counts = {}
+    failed = set()
+    for event_item, status in zip(entered, statuses):
+        event_item['alert_status'] = status
+        alert_counts[status] = alert_counts.get(status, 0) + 1
+        if status == 'failed':
+            failed.add(event_item['vehicle_id'])
+    for vehicle_id in failed:
+        pending.pop(vehicle_id, None)
+    failed |= commit_geofence_state(pending)
+    alert_dispatcher.emit_metrics()
+    return distances, events, pending, dict(counts, alerts=alert_counts, failed=sorted(failed))
+
+# =====================================================
+# CONSULTA MASIVA DE ENTREGAS
+# =====================================================
+DELIVERIES_TABLE = 'deliveries_status'
+TRACKING_NUMBER_INDEX = 'tracking_number-index'
+STATUS_TRIP_INDEX = 'status-trip_id-index'
+# Límite de identificadores por invocación en modo batch (manifiesto de ruta)
+DELIVERY_BATCH_MAX = 1000
+# Barrido programado: segmentos de Scan en paralelo, ítems por página y margen antes del timeout
+SWEEP_SEGMENTS = int(os.getenv('SWEEP_SEGMENTS', '4'))
+# Estados que cuentan como pendientes (una partición del GSI status-trip_id por estado)
+SWEEP_PENDING_STATUSES = [st.strip() for st in os.getenv('SWEEP_PENDING_STATUSES', 'pending').split(',') if st.strip()]
+SWEEP_PAGE_SIZE = 500
+SWEEP_SAMPLE_SIZE = 100
+SWEEP_TIME_MARGIN_MS = 5000
+SWEEP_DEFAULT_BUDGET_MS = 60000
+DELIVERY_PROJECTION = 'delivery_id, tracking_number, #s, delivered_datetime'
+
+def delivery_summary(item):
+    """Respuesta de verificar-entrega para un ítem de deliveries_status"""
+    return {
+        'delivery_id': item.get('delivery_id'),
+        'tracking_number': item.get('tracking_number'),
+        'is_completed': item.get('status') == 'delivered',
+        'status': item.get('status'),
+        'delivered_datetime': str(item.get('delivered_datetime', ''))
+    }
+
+def _batch_get_chunk(delivery_ids):
+    """Un BatchGetItem de hasta 100 claves, reintentando UnprocessedKeys con backoff"""
+    items, unprocessed = batch_get_keys(
+        DELIVERIES_TABLE,
+        [{'delivery_id': d} for d in delivery_ids],
+        ProjectionExpression=DELIVERY_PROJECTION,
+        ExpressionAttributeNames={'#s': 'status'}
+    )
+    return items, [key['delivery_id'] for key in unprocessed]
+
+def _query_tracking_number(tracking_number):
+    """Entrega de un número de guía vía el GSI (proyecta status y delivered_datetime)"""
+    response = get_table(DELIVERIES_TABLE).meta.client.query(
+        TableName=DELIVERIES_TABLE,
+        IndexName=TRACKING_NUMBER_INDEX,
+        KeyConditionExpression='tracking_number = :t',
+        ExpressionAttributeValues={':t': tracking_number},
+        Limit=1
+    )
+    return response['Items'][0] if response['Items'] else None
+
+def resolve_deliveries(delivery_ids=(), tracking_numbers=()):
+    """
+    Estado de varias entregas en una invocación: los delivery_id en chunks de
+    100 claves de BatchGetItem y los números de guía con Query al GSI, todo en
+    paralelo. Devuelve los resultados en el orden de entrada, los no
+    encontrados y las claves que siguieron sin procesar tras los reintentos.
+    """
+    delivery_ids = list(dict.fromkeys(str(d) for d in delivery_ids))
+    tracking_numbers = list(dict.fromkeys(str(t) for t in tracking_numbers))
+    chunks = [delivery_ids[i:i + 100] for i in range(0, len(delivery_ids), 100)]
+
+    chunk_futures = [_dynamo_executor.submit(_batch_get_chunk, chunk) for chunk in chunks]
+    tracking_futures = [_dynamo_executor.submit(_query_tracking_number, t) for t in tracking_numbers]
+
+    by_id = {}
+    unprocessed = []
+    for future in chunk_futures:
+        items, leftover = future.result()
+        by_id.update((item['delivery_id'], item) for item in items)
+        unprocessed.extend(leftover)
+    by_tracking = {t: future.result() for t, future in zip(tracking_numbers, tracking_futures)}
+
+    results = [delivery_summary(by_id[d]) for d in delivery_ids if d in by_id]
+    results += [delivery_summary(item) for item in by_tracking.values() if item]
+    skipped = set(unprocessed)
+    return {
+        'mode': 'batch',
+        'requested': len(delivery_ids) + len(tracking_numbers),
+        'completed': sum(r['is_completed'] for r in results),
+        'pending': sum(not r['is_completed'] for r in results),
+        'results': results,
+        'not_found': {
+            'delivery_ids': [d for d in delivery_ids if d not in by_id and d not in skipped],
+            'tracking_numbers': [t for t, item in by_tracking.items() if not item]
+        },
+        'unprocessed': unprocessed
+    }
+
+def _sweep_pages(request, deadline):
+    """Paginar un Query/Scan de entregas pendientes hasta agotarlo o llegar al deadline"""
+    client = get_table(DELIVERIES_TABLE).meta.client
+    operation = client.query if 'KeyConditionExpression' in request else client.scan
+    by_status = {}
+    sample = []
+    scanned = 0
+    while True:
+        response = operation(**request)
+        scanned += response['ScannedCount']
+        for item in response['Items']:
+            status = item.get('status') or 'sin_estado'
+            by_status[status] = by_status.get(status, 0) + 1
+            if len(sample) < SWEEP_SAMPLE_SIZE:
+                sample.append(item['delivery_id'])
+        if 'LastEvaluatedKey' not in response:
+            return by_status, sample, scanned, True
+        if time.monotonic() >= deadline:
+            return by_status, sample, scanned, False
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def _sweep_requests(trip_id=None):
+    """Un Query al GSI status-trip_id por estado pendiente (sólo claves), opcionalmente de un viaje"""
+    requests = []
+    for status in SWEEP_PENDING_STATUSES:
+        request = {
+            'TableName': DELIVERIES_TABLE,
+            'IndexName': STATUS_TRIP_INDEX,
+            'KeyConditionExpression': '#s = :s',
+            'ExpressionAttributeNames': {'#s': 'status'},
+            'ExpressionAttributeValues': {':s': status},
+            'Limit': SWEEP_PAGE_SIZE
+        }
+        if trip_id is not None:
+            request['KeyConditionExpression'] += ' AND trip_id = :t'
+            request['ExpressionAttributeValues'][':t'] = trip_id
+        requests.append(request)
+    return requests
+
+def _sweep_scan_requests(trip_id=None):
+    """Respaldo sin el GSI: Scan paralelo por segmentos filtrando los estados pendientes"""
+    values = {f':s{i}': status for i, status in enumerate(SWEEP_PENDING_STATUSES)}
+    condition = f"#s IN ({', '.join(values)})"
+    if trip_id is not None:
+        values[':t'] = trip_id
+        condition += ' AND trip_id = :t'
+    return [{
+        'TableName': DELIVERIES_TABLE,
+        'Segment': segment,
+        'TotalSegments': SWEEP_SEGMENTS,
+        'ProjectionExpression': 'delivery_id, #s',
+        'FilterExpression': condition,
+        'ExpressionAttributeNames': {'#s': 'status'},
+        'ExpressionAttributeValues': dict(values),
+        'Limit': SWEEP_PAGE_SIZE
+    } for segment in range(SWEEP_SEGMENTS)]
+
+def parse_trip_id(value):
+    """trip_id del barrido como entero (el GSI status-trip_id lo guarda como N); ValueError si no lo es"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError('trip_id debe ser un entero')
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError('trip_id debe ser un entero')
+        return int(value)
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise ValueError('trip_id debe ser un entero') from None
+
+def _index_missing(error):
+    """
+    Error de un Query porque la tabla todavía no tiene el GSI: AWS responde
+    ValidationException con 'does not have the specified index' (el mismo
+    código que cualquier otro parámetro inválido) y los emuladores
+    ResourceNotFoundException.
+    """
+    code = error.response['Error']['Code']
+    message = error.response['Error'].get('Message', '').lower()
+    if code == 'ResourceNotFoundException':
+        return True
+    return code == 'ValidationException' and 'specified index' in message
+
+def sweep_pending_deliveries(context=None, trip_id=None):
+    """
+    Barrido programado (EventBridge) de las entregas pendientes: un Query por
+    estado al GSI status-trip_id, en paralelo, que sólo lee claves. Si la
+    tabla todavía no tiene el índice se hace un Scan paralelo por segmentos.
+    Se detiene antes del timeout de la Lambda; 'complete' indica si terminó.
+    trip_id debe ser entero (parse_trip_id).
+    """
+    budget_ms = SWEEP_DEFAULT_BUDGET_MS
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        budget_ms = context.get_remaining_time_in_millis() - SWEEP_TIME_MARGIN_MS
+    deadline = time.monotonic() + max(budget_ms, 0) / 1000
+
+    source = 'index'
+    try:
+        futures = [_dynamo_executor.submit(_sweep_pages, r, deadline) for r in _sweep_requests(trip_id)]
+        parts = [future.result() for future in futures]
+    except ClientError as e:
+        # Sólo por índice inexistente: otro ValidationException es un error del request
+        if not _index_missing(e):
+            raise
+        source = 'scan'
+        futures = [_dynamo_executor.submit(_sweep_pages, r, deadline) for r in _sweep_scan_requests(trip_id)]
+        parts = [future.result() for future in futures]
+
+    by_status = {}
+    sample = []
+    scanned = 0
+    complete = True
+    for part_status, part_sample, part_scanned, part_complete in parts:
+        for status, count in part_status.items():
+            by_status[status] = by_status.get(status, 0) + count
+        sample.extend(part_sample[:SWEEP_SAMPLE_SIZE - len(sample)])
+        scanned += part_scanned
+        complete = complete and part_complete
+    return {
+        'mode': 'sweep',
+        'source': source,
+        'scanned': scanned,
+        'pending': sum(by_status.values()),
+        'by_status': by_status,
+        'complete': complete,
+        'pending_sample': sample
+    }
+
 # =====================================================
 # LAMBDA 1: Verificar si una entrega se completó
 # =====================================================
 def lambda_verificar_entrega(event, context):
     """
-    Verifica si una entrega se completó comparando con DynamoDB
+    Verifica si una entrega se completó comparando con DynamoDB.
+    Modos:
+      - una entrega: {"delivery_id": "..."} o {"tracking_number": "..."}
+      - batch (manifiesto de ruta): {"delivery_ids": [...], "tracking_numbers": [...]}
+      - barrido de pendientes: regla de EventBridge o {"sweep": true[, "trip_id": N]}
     """
     
     # Parsear body desde API Gateway
     body = parse_event_body(event)
     
+    try:
+        # Barrido programado
+        if event.get('source') == 'aws.events' or body.get('sweep'):
+            try:
+                trip_id = parse_trip_id(body.get('trip_id'))
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'body': to_json({'error': str(e)})
+                }
+            summary = sweep_pending_deliveries(context, trip_id)
+            print(f" Barrido de entregas: {summary['pending']} pendientes de {summary['scanned']} "
+                  f"revisadas {summary['by_status']} (completo: {summary['complete']})")
+            return {
+                'statusCode': 200,
+                'body': to_json(summary)
+            }
+        
+        # Lote de entregas
+        if 'delivery_ids' in body or 'tracking_numbers' in body:
+            delivery_ids = body.get('delivery_ids') or []
+            tracking_numbers = body.get('tracking_numbers') or []
+            if not isinstance(delivery_ids, list) or not isinstance(tracking_numbers, list):
+                return {
+                    'statusCode': 400,
+                    'body': to_json({'error': 'delivery_ids y tracking_numbers deben ser listas'})
+                }
+            if len(delivery_ids) + len(tracking_numbers) > DELIVERY_BATCH_MAX:
+                return {
+                    'statusCode': 400,
+                    'body': to_json({'error': f'Máximo {DELIVERY_BATCH_MAX} entregas por solicitud'})
+                }
+            return {
+                'statusCode': 200,
+                'body': to_json(resolve_deliveries(delivery_ids, tracking_numbers))
+            }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'body': to_json({
+                'error': str(e)
+            })
+        }
+    
     # Obtener datos del evento
     delivery_id = body.get('delivery_id')
     tracking_number = body.get('tracking_number')
+    if delivery_id is not None:
+        delivery_id = str(delivery_id)  # dynamo_sync.py escribe el id de PostgreSQL como string
     
-    if not delivery_id:
+    if not delivery_id and not tracking_number:
         return {
             'statusCode': 400,
-            'body': json.dumps({'error': 'delivery_id es requerido'}, default=str)
+            'body': to_json({'error': 'delivery_id o tracking_number es requerido'})
         }
     
-    # Conectar a tabla DynamoDB
-    table = dynamodb.Table('deliveries_status')
+    # Tabla DynamoDB (cacheada en el contenedor)
+    table = get_table(DELIVERIES_TABLE)
     
     try:
-        # Buscar entrega
-        response = table.get_item(
-            Key={'delivery_id': delivery_id}
-        )
+        # Buscar entrega: por clave primaria o, si sólo viene la guía, en el GSI
+        if delivery_id:
+            item = table.get_item(
+                Key={'delivery_id': delivery_id}
+            ).get('Item')
+        else:
+            item = _query_tracking_number(str(tracking_number))
         
-        if 'Item' in response:
-            item = response['Item']
-            is_completed = item.get('status') == 'delivered'
-            
+        if item:
             return {
                 'statusCode': 200,
-                'body': json.dumps({
-                    'delivery_id': delivery_id,
-                    'tracking_number': item.get('tracking_number'),
-                    'is_completed': is_completed,
-                    'status': item.get('status'),
-                    'delivered_datetime': str(item.get('delivered_datetime', ''))
-                }, default=str)
+                'body': to_json(delivery_summary(item))
             }
         else:
             return {
                 'statusCode': 404,
-                'body': json.dumps({
+                'body': to_json({
                     'error': 'Entrega no encontrada',
-                    'delivery_id': delivery_id
-                }, default=str)
+                    'delivery_id': delivery_id,
+                    'tracking_number': tracking_number
+                })
             }
             
     except Exception as e:
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': to_json({
                 'error': str(e)
-            }, default=str)
+            })
         }
 
 # =====================================================
@@ -111,6 +1726,7 @@ def lambda_calcular_eta(event, context):
     """
     Calcula ETA basado en ubicación actual y destino
     """
+    warm_up_routes_once()
     
     # Parsear body desde API Gateway
     body = parse_event_body(event)
@@ -120,30 +1736,26 @@ def lambda_calcular_eta(event, context):
     current_location = body.get('current_location')  # {lat, lon}
     destination = body.get('destination')  # {lat, lon}
     current_speed_kmh = body.get('current_speed_kmh', 60)
+    route_id = body.get('route_id')  # opcional: routes.route_code
     
     if not all([vehicle_id, current_location, destination]):
         return {
             'statusCode': 400,
-            'body': json.dumps({'error': 'Faltan parámetros requeridos'}, default=str)
+            'body': to_json({'error': 'Faltan parámetros requeridos'})
         }
     
     try:
-        # Calcular distancia simple (Haversine simplificado)
-        lat_diff = abs(destination['lat'] - current_location['lat'])
-        lon_diff = abs(destination['lon'] - current_location['lon'])
-        
-        # Aproximación simple: 111 km por grado
-        distance_km = ((lat_diff ** 2 + lon_diff ** 2) ** 0.5) * 111
-        
-        # Calcular tiempo
-        if current_speed_kmh > 0:
-            hours = distance_km / current_speed_kmh
-            eta = datetime.now(timezone.utc) + timedelta(hours=hours)
-        else:
-            eta = None
+        # Calcular distancia y tiempo (mismo cálculo que la ingesta batch)
+        distances, hours_list, eta_model = compute_etas(
+            [current_location['lat']], [current_location['lon']],
+            [destination['lat']], [destination['lon']],
+            [current_speed_kmh], route_ids=[route_id]
+        )
+        distance_km = float(distances[0])
+        hours = float(hours_list[0])
+        eta = None if np.isnan(hours) else datetime.now(timezone.utc) + timedelta(hours=hours)
         
-        # Guardar en DynamoDB (convertir floats a Decimal)
-        table = dynamodb.Table('vehicle_tracking')
+        # Guardar en DynamoDB con coalescencia (marshalling según ITEM_SCHEMAS)
         item = {
             'vehicle_id': vehicle_id,
             'timestamp': datetime.now(timezone.utc).isoformat(),
@@ -153,24 +1765,26 @@ def lambda_calcular_eta(event, context):
             'eta': eta.isoformat() if eta else None,
             'current_speed_kmh': current_speed_kmh
         }
-        table.put_item(Item=convert_floats(item))
+        actions, _ = write_tracking([item])
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': to_json({
                 'vehicle_id': vehicle_id,
                 'distance_remaining_km': round(distance_km, 2),
                 'eta': eta.isoformat() if eta else 'No disponible',
-                'estimated_minutes': round(hours * 60) if eta else None
-            }, default=str)
+                'estimated_minutes': round(hours * 60) if eta else None,
+                'eta_model': eta_model,
+                'tracking_write': actions[0]
+            })
         }
         
     except Exception as e:
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': to_json({
                 'error': str(e)
-            }, default=str)
+            })
         }
 
 # =====================================================
@@ -180,6 +1794,7 @@ def lambda_alerta_desvio(event, context):
     """
     Detecta desvíos de ruta y envía alertas
     """
+    warm_up_routes_once()
     
     # Parsear body desde API Gateway
     body = parse_event_body(event)
@@ -190,68 +1805,338 @@ def lambda_alerta_desvio(event, context):
     route_id = body.get('route_id')
     driver_id = body.get('driver_id')
     
+    # Ping de precarga: {"warmup": true, "route_ids": [...]} (EventBridge o manual)
+    if body.get('warmup'):
+        loaded = warm_up_routes(body.get('route_ids') or ROUTE_WARMUP_IDS)
+        return {
+            'statusCode': 200,
+            'body': to_json({'warmed_routes': loaded, 'route_cache': route_cache.stats()})
+        }
+    
     if not all([vehicle_id, current_location, route_id]):
         return {
             'statusCode': 400,
-            'body': json.dumps({'error': 'Faltan parámetros requeridos'}, default=str)
+            'body': to_json({'error': 'Faltan parámetros requeridos'})
         }
     
     try:
-        # Obtener ruta esperada de DynamoDB
-        table = dynamodb.Table('routes_waypoints')
-        response = table.get_item(
-            Key={'route_id': route_id}
-        )
-        
-        if 'Item' not in response:
+        # Ruta esperada: caché del contenedor o DynamoDB
+        try:
+            route_index, cache_status = get_route_index(route_id)
+        except ValueError as e:
             return {
                 'statusCode': 404,
-                'body': json.dumps({'error': 'Ruta no encontrada'}, default=str)
+                'body': to_json({'error': str(e)})
             }
         
-        waypoints = response['Item'].get('waypoints', [])
-        
-        # Calcular distancia mínima a la ruta
-        min_distance = float('inf')
-        for waypoint in waypoints:
-            lat_diff = abs(waypoint['lat'] - current_location['lat'])
-            lon_diff = abs(waypoint['lon'] - current_location['lon'])
-            distance = ((lat_diff ** 2 + lon_diff ** 2) ** 0.5) * 111  # km
-            min_distance = min(min_distance, distance)
-        
-        # Umbral de desvío: 5 km
-        DEVIATION_THRESHOLD_KM = 5
-        is_deviated = min_distance > DEVIATION_THRESHOLD_KM
+        if route_index is None:
+            return {
+                'statusCode': 404,
+                'body': to_json({'error': 'Ruta no encontrada'})
+            }
         
-        if is_deviated:
-            # Guardar alerta en DynamoDB (convertir floats a Decimal)
-            alerts_table = dynamodb.Table('alerts_history')
-            alert_item = {
-                'vehicle_id': vehicle_id,
-                'timestamp': datetime.now(timezone.utc).isoformat(),
-                'driver_id': driver_id,
-                'route_id': route_id,
-                'deviation_km': round(min_distance, 2),
-                'current_location': current_location,
-                'alert_type': 'ROUTE_DEVIATION'
+        # Misma histéresis y estado (ítem STATE) que evaluar-desvios: entra en
+        # "fuera de ruta" sobre GEOFENCE_ENTER_KM, sale bajo GEOFENCE_EXIT_KM
+        now = datetime.now(timezone.utc)
+        position = (
+            str(vehicle_id),
+            str(route_id),
+            float(current_location['lat']),
+            float(current_location['lon']),
+            _parse_timestamp(body.get('timestamp'), now).timestamp()
+        )
+        distances, events, pending, counts = process_deviations([position], [driver_id])
+        if counts['unavailable']:
+            return {
+                'statusCode': 503,
+                'body': to_json({'error': 'Estado del vehículo no disponible, reintentar'})
             }
-            alerts_table.put_item(Item=convert_floats(alert_item))
+        min_distance = float(distances[0])
+        state = pending.get(position[0]) or _geofence_state.get(position[0]) or GEOFENCE_INITIAL_STATE
+        event_item = events[0] if events else {}
+        alert_status = event_item.get('alert_status')
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': to_json({
                 'vehicle_id': vehicle_id,
-                'is_deviated': is_deviated,
+                'is_deviated': state['off_route'],
                 'deviation_km': round(min_distance, 2),
-                'alert_sent': is_deviated,
-                'threshold_km': DEVIATION_THRESHOLD_KM
-            }, default=str)
+                'event': event_item.get('event'),
+                'late': counts['late'] > 0,
+                'alert_sent': alert_status == 'published',
+                'alert_status': alert_status,
+                'threshold_km': GEOFENCE_ENTER_KM,
+                'exit_threshold_km': GEOFENCE_EXIT_KM,
+                'alerting': alert_dispatcher.stats(),
+                'route_cache': dict(route_cache.stats(), lookup=cache_status)
+            })
         }
         
     except Exception as e:
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': to_json({
                 'error': str(e)
-            }, default=str)
+            })
+        }
+
+# =====================================================
+# LAMBDA 4: Ingesta batch de posiciones (tracking)
+# =====================================================
+def extract_tracking_records(event):
+    """
+    Normaliza el evento a una lista de (record_id, posición).
+    Acepta el body de API Gateway ({'positions': [...]} o una lista) y lotes
+    de SQS (body JSON) o Kinesis (data en base64). Cada mensaje puede traer
+    una posición o una lista de posiciones.
+    """
+    if isinstance(event, dict) and 'Records' in event:
+        records = []
+        for record in event['Records']:
+            if 'kinesis' in record:
+                record_id = record['kinesis'].get('sequenceNumber')
+                payload = base64.b64decode(record['kinesis']['data'])
+            else:
+                record_id = record.get('messageId')
+                payload = record.get('body', '')
+            try:
+                data = json.loads(payload)
+            except ValueError:
+                records.append((record_id, None))
+                continue
+            for position in (data if isinstance(data, list) else [data]):
+                records.append((record_id, position))
+        return records
+    
+    body = parse_event_body(event)
+    positions = body.get('positions', []) if isinstance(body, dict) else body
+    return [(None, position) for position in positions]
+
+def batch_item_failures(record_ids):
+    """
+    Respuesta parcial de SQS/Kinesis (ReportBatchItemFailures): un
+    itemIdentifier por mensaje, aunque traiga varias posiciones
+    """
+    return [{'itemIdentifier': record_id} for record_id in dict.fromkeys(record_ids) if record_id is not None]
+
+def lambda_ingesta_tracking(event, context):
+    """
+    Ingesta de un lote de posiciones: ETAs en una pasada vectorizada y
+    escritura coalescida en vehicle_tracking (write_tracking). Las
+    posiciones inválidas (incluido un timestamp que no es ISO 8601) se
+    descartan y se cuentan; el timestamp se guarda normalizado a UTC, así
+    la sort key del histórico ordena igual que la banda muerta. Sin
+    timestamp se usa la hora de llegada. En un lote SQS/Kinesis
+    los mensajes ilegibles o inválidos y, si falla la escritura, los que
+    traían posiciones se devuelven en batchItemFailures: el servicio los
+    reintenta y, agotados los reintentos, van a la DLQ (las claves hacen la
+    reescritura idempotente).
+    """
+    warm_up_routes_once()
+    from_stream = isinstance(event, dict) and 'Records' in event
+    records = extract_tracking_records(event)
+    
+    # Validar y separar columnas para el cálculo vectorizado
+    now = datetime.now(timezone.utc)
+    positions = []
+    position_records = []
+    rejected_records = []
+    rejected = 0
+    for record_id, position in records:
+        try:
+            vehicle_id = str(position['vehicle_id'])
+            timestamp = position.get('timestamp')
+            reported_at = now if timestamp is None else _parse_timestamp(timestamp, None)
+            if reported_at is None:
+                raise ValueError(f'timestamp inválido: {timestamp!r}')
+            positions.append((
+                vehicle_id,
+                _epoch_iso(reported_at.timestamp()),
+                position.get('route_id'),
+                float(position['current_location']['lat']),
+                float(position['current_location']['lon']),
+                float(position['destination']['lat']),
+                float(position['destination']['lon']),
+                float(position.get('current_speed_kmh', 60))
+            ))
+            position_records.append(record_id)
+        except (KeyError, TypeError, ValueError):
+            rejected += 1
+            rejected_records.append(record_id)
+    
+    if not positions and not from_stream:
+        return {
+            'statusCode': 400,
+            'body': to_json({'error': 'No hay posiciones válidas', 'rejected': rejected})
+        }
+    
+    columns = list(zip(*positions)) if positions else [[]] * 8
+    distances, hours, _ = compute_etas(
+        columns[3], columns[4], columns[5], columns[6], columns[7],
+        route_ids=list(columns[2]), now=now
+    )
+    distances = np.round(distances, 2).tolist()
+    hours = hours.tolist()
+    
+    items = []
+    etas = []
+    for (vehicle_id, timestamp, route_id, lat, lon, dest_lat, dest_lon, speed), distance_km, h in zip(positions, distances, hours):
+        eta = None if np.isnan(h) else (now + timedelta(hours=h)).isoformat()  # NaN: velocidad 0
+        items.append({
+            'vehicle_id': vehicle_id,
+            'timestamp': timestamp,
+            'current_location': {'lat': lat, 'lon': lon},
+            'destination': {'lat': dest_lat, 'lon': dest_lon},
+            'distance_remaining_km': distance_km,
+            'eta': eta,
+            'current_speed_kmh': speed
+        })
+        etas.append({
+            'vehicle_id': vehicle_id,
+            'distance_remaining_km': distance_km,
+            'eta': eta or 'No disponible',
+            'estimated_minutes': None if eta is None else round(h * 60)
+        })
+    
+    try:
+        actions, written = write_tracking(items, now)
+    except Exception as e:
+        if not from_stream:
+            return {
+                'statusCode': 500,
+                'body': to_json({'error': str(e)})
+            }
+        # Sin saber qué lotes de BatchWriteItem quedaron escritos, se reintentan
+        # todos los mensajes con posiciones (el estado del contenedor no avanzó)
+        print(f" Error escribiendo tracking: {e}")
+        return {
+            'received': len(records),
+            'written': 0,
+            'rejected': rejected,
+            'error': str(e),
+            'batchItemFailures': batch_item_failures(rejected_records + position_records)
+        }
+    
+    summary = {
+        'received': len(records),
+        'written': written,
+        'history_points': actions.count('history'),
+        'coalesced': actions.count('skipped'),
+        'rejected': rejected
+    }
+    if from_stream:
+        return dict(summary, batchItemFailures=batch_item_failures(rejected_records))
+    return {
+        'statusCode': 200,
+        'body': to_json(dict(summary, etas=etas))
+    }
+
+# =====================================================
+# LAMBDA 5: Evaluación de desvíos por lotes (stream)
+# =====================================================
+def lambda_evaluar_desvios(event, context):
+    """
+    Evalúa un lote de posiciones de muchos vehículos contra sus rutas
+    (evaluate_deviations: una pasada NumPy por ruta) y emite los eventos de
+    entrada/salida de ruta según la histéresis. Cada entrada en
+    'fuera de ruta' pasa por alert_dispatcher (supresión + SNS) antes de
+    guardar el estado (process_deviations). Acepta los mismos formatos que
+    la ingesta (API Gateway, SQS, Kinesis); en un lote SQS/Kinesis vuelven
+    en batchItemFailures los mensajes inválidos y los de vehículos cuyo
+    estado no se pudo leer o guardar o cuya alerta falló.
+    """
+    warm_up_routes_once()
+    from_stream = isinstance(event, dict) and 'Records' in event
+    records = extract_tracking_records(event)
+    now = datetime.now(timezone.utc)
+    
+    positions = []
+    drivers = []
+    position_records = []
+    rejected_records = []
+    rejected = 0
+    for record_id, position in records:
+        try:
+            positions.append((
+                str(position['vehicle_id']),
+                str(position['route_id']),
+                float(position['current_location']['lat']),
+                float(position['current_location']['lon']),
+                _parse_timestamp(position.get('timestamp'), now).timestamp()
+            ))
+            drivers.append(position.get('driver_id'))
+            position_records.append(record_id)
+        except (KeyError, TypeError, ValueError):
+            rejected += 1
+            rejected_records.append(record_id)
+    
+    if not positions and not from_stream:
+        return {
+            'statusCode': 400,
+            'body': to_json({'error': 'No hay posiciones válidas', 'rejected': rejected})
+        }
+    
+    try:
+        distances, events, pending, counts = process_deviations(positions, drivers)
+    except Exception as e:
+        if not from_stream:
+            return {
+                'statusCode': 500,
+                'body': to_json({'error': str(e)})
+            }
+        # Sin rutas o sin estado no se evaluó nada: se reintentan todos los mensajes con posiciones
+        print(f" Error evaluando desvíos: {e}")
+        return {
+            'received': len(records),
+            'evaluated': 0,
+            'rejected': rejected,
+            'error': str(e),
+            'batchItemFailures': batch_item_failures(rejected_records + position_records)
         }
+    
+    for event_item in events:
+        event_item.pop('index')
+    retry_vehicles = set(counts['unavailable']) | set(counts['failed'])
+    summary = {
+        'received': len(records),
+        'evaluated': counts['evaluated'],
+        'rejected': rejected,
+        'late': counts['late'],
+        'unknown_routes': counts['unknown_routes'],
+        'unavailable': counts['unavailable'],
+        'failed': counts['failed'],
+        'off_route': sum(1 for state in pending.values() if state['off_route']),
+        'max_deviation_km': round(float(np.nanmax(distances)), 2) if counts['evaluated'] else None,
+        'events': events,
+        'alerts': counts['alerts']
+    }
+    if from_stream:
+        retry_records = [record_id for record_id, position in zip(position_records, positions)
+                         if position[0] in retry_vehicles]
+        return dict(summary, batchItemFailures=batch_item_failures(rejected_records + retry_records))
+    return {
+        'statusCode': 200,
+        'body': to_json(summary)
+    }
+
+# =====================================================
+# LAMBDA 6: Publicación de alertas (invocación asíncrona)
+# =====================================================
+def lambda_publicar_alertas(event, context):
+    """
+    Recibe las alertas que entregan las demás Lambdas con
+    ALERT_DISPATCH_MODE='async' ({"alerts": [...]}, ya filtradas por la
+    supresión del contenedor) y las confirma, guarda y publica con
+    deliver_alerts. Si alguna falla la invocación falla y Lambda reintenta
+    el evento: las fallidas liberaron su ventana y vuelven a salir, las ya
+    publicadas quedan deduplicadas por la ventana compartida.
+    """
+    alerts = (event or {}).get('alerts') or []
+    statuses = deliver_alerts(alerts, time.time(), ALERT_SUPPRESSION_SECONDS)
+    counts = {status: statuses.count(status) for status in set(statuses)}
+    alert_dispatcher.record(**counts)
+    alert_dispatcher.emit_metrics()
+    if counts.get('failed'):
+        raise RuntimeError(f"{counts['failed']} de {len(alerts)} alertas sin publicar en SNS")
+    return counts
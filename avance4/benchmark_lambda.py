@@ -0,0 +1,304 @@
+"""
+FleetLogix - Benchmark Cold Start / Warm de las Lambdas
+Ejecuta los handlers de 04_lambda_handler.py contra DynamoDB simulado (moto).
+Cada cold start es un proceso nuevo: se mide el import del módulo, la primera
+invocación de cada endpoint (creación de clientes/Tables) y luego N
+invocaciones calientes en el mismo proceso.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HANDLER_FILE = os.path.join(BASE_DIR, '04_lambda_handler.py')
+SETUP_FILE = os.path.join(BASE_DIR, '04_aws_setup.py')
+
+# Flota simulada: pings cada PING_SECONDS; 30% detenidos (sólo ruido GPS), el resto entre 40 y 90 km/h
+FLEET_SIZE = 200
+PING_SECONDS = 5
+FLEET_START = datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc)
+
+
+def vehicle_position(i: int, step: int) -> Dict:
+    """Posición del vehículo i en el ping número step (determinista)"""
+    parked = i % 10 < 3
+    speed = 0.0 if parked else 40 + i % 51
+    km = speed * step * PING_SECONDS / 3600
+    jitter = ((i * 7919 + step * 104729) % 11 - 5) * 0.00001  # ~±5 m
+    return {
+        'vehicle_id': f'VH-{i:03d}',
+        'timestamp': (FLEET_START + timedelta(seconds=step * PING_SECONDS)).isoformat(),
+        'current_location': {'lat': 4.65 + i * 0.001 + km / 111.2 + jitter, 'lon': -74.08},
+        'destination': {'lat': 6.25, 'lon': -75.56},
+        'current_speed_kmh': speed
+    }
+
+
+def fleet_positions(step: int, size: int = FLEET_SIZE) -> List[Dict]:
+    """Posiciones de la flota en el ping número step"""
+    return [vehicle_position(i, step) for i in range(size)]
+
+
+def deviation_batch(step: int, pings: int = 10) -> List[Dict]:
+    """pings posiciones por vehículo de la flota, con rutas R-001 / R-DENSE alternadas"""
+    return [
+        dict(vehicle_position(i, step * pings + k), route_id=('R-001', 'R-DENSE')[i % 2])
+        for k in range(pings) for i in range(FLEET_SIZE)
+    ]
+
+
+# Endpoint -> (función, body de ejemplo o función del número de invocación)
+ENDPOINTS = {
+    'verificar-entrega': ('lambda_verificar_entrega', {'delivery_id': 'DEL-000001'}),
+    # Manifiesto de ruta: 40 entregas en una invocación (BatchGetItem)
+    'verificar-manifiesto': ('lambda_verificar_entrega', {
+        'delivery_ids': [f'DEL-{i:06d}' for i in range(1, 41)]
+    }),
+    # Un vehículo a 62.5 km/h: cada invocación es un ping nuevo ~87 m más adelante
+    'calcular-eta': ('lambda_calcular_eta', lambda step: {
+        'vehicle_id': 'VH-001',
+        'current_location': {'lat': 4.65 + step * 0.00078, 'lon': -74.08},
+        'destination': {'lat': 6.25, 'lon': -75.56},
+        'current_speed_kmh': 62.5
+    }),
+    'alerta-desvio': ('lambda_alerta_desvio', {
+        'vehicle_id': 'VH-001',
+        'driver_id': 'DRV-001',
+        'route_id': 'R-001',
+        'current_location': {'lat': 4.90, 'lon': -74.40}
+    }),
+    # Tormenta de alertas: cada invocación es un vehículo distinto fuera de ruta (nunca suprimida)
+    'alerta-desvio-flota': ('lambda_alerta_desvio', lambda step: {
+        'vehicle_id': f'VH-{step:05d}',
+        'driver_id': 'DRV-001',
+        'route_id': 'R-001',
+        'current_location': {'lat': 4.90, 'lon': -74.40}
+    }),
+    # Ruta densa (5000 waypoints) con la geometría compacta 'polyline'
+    'alerta-desvio-densa': ('lambda_alerta_desvio', {
+        'vehicle_id': 'VH-002',
+        'driver_id': 'DRV-002',
+        'route_id': 'R-DENSE',
+        'current_location': {'lat': 5.45, 'lon': -74.85}
+    }),
+    # Toda la flota reportando en una sola invocación
+    'ingesta-tracking': ('lambda_ingesta_tracking', lambda step: {'positions': fleet_positions(step)}),
+    # 10 pings de toda la flota (2000 posiciones) contra R-001 y R-DENSE en una invocación
+    'evaluar-desvios': ('lambda_evaluar_desvios', lambda step: {'positions': deviation_batch(step)})
+}
+
+
+def load_module(path: str, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_tables():
+    """Crear las tablas con crear_tablas_dynamodb() de 04_aws_setup.py (silenciado)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_module(SETUP_FILE, 'aws_setup').crear_tablas_dynamodb()
+
+
+def create_alerts_topic(handler):
+    """Tópico de alertas con crear_topico_sns() de 04_aws_setup.py, apuntado en el handler"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        handler.ALERTS_TOPIC_ARN = load_module(SETUP_FILE, 'aws_setup').crear_topico_sns()
+
+
+class AsyncInvoker:
+    """
+    Cliente 'lambda' para invoke(InvocationType='Event') sin desplegar
+    funciones: responde 202 como Lambda y guarda el evento; drain() lo
+    ejecuta después con el handler de la función (functions: nombre -> handler).
+    """
+
+    def __init__(self, functions: Dict):
+        self.functions = functions
+        self.events = []
+
+    def invoke(self, FunctionName, InvocationType='RequestResponse', Payload='{}'):
+        self.events.append((FunctionName, json.loads(Payload)))
+        return {'StatusCode': 202}
+
+    def drain(self):
+        while self.events:
+            function_name, event = self.events.pop(0)
+            self.functions[function_name](event, None)
+
+
+def seed_data(handler):
+    """Datos mínimos para que los endpoints encuentren entregas y rutas"""
+    handler.get_table('deliveries_status').put_item(Item={
+        'delivery_id': 'DEL-000001',
+        'tracking_number': 'FL2024000001',
+        'status': 'delivered',
+        'delivered_datetime': '2024-05-01T10:30:00'
+    })
+    # R-001 con el formato anterior: lista de mapas 'waypoints'
+    waypoints = [{'lat': str(4.65 + i * 0.016), 'lon': str(-74.08 - i * 0.0148)} for i in range(100)]
+    handler.get_table('routes_waypoints').put_item(Item={
+        'route_id': 'R-001',
+        'waypoints': [{'lat': Decimal(w['lat']), 'lon': Decimal(w['lon'])} for w in waypoints]
+    })
+    dense = [{'lat': 4.65 + i * 0.00032, 'lon': -74.08 - i * 0.000296} for i in range(5000)]
+    handler.get_table('routes_waypoints').put_item(Item=handler.build_route_item('R-DENSE', dense))
+
+
+def event_for(body, step: int = 0) -> Dict:
+    """Evento proxy de API Gateway"""
+    if callable(body):
+        body = body(step)
+    return {'httpMethod': 'POST', 'body': json.dumps(body)}
+
+
+def run_child(warm_runs: int) -> Dict:
+    """Un contenedor: import + primera invocación + invocaciones calientes"""
+    start = time.perf_counter()
+    handler = load_module(HANDLER_FILE, 'lambda_handler')
+    import_ms = (time.perf_counter() - start) * 1000
+
+    from moto import mock_aws
+    with mock_aws():
+        create_tables()
+        create_alerts_topic(handler)
+        # Las alertas van a la publicadora (ALERT_DISPATCH_MODE='async'); se publican al final
+        invoker = AsyncInvoker({handler.ALERTS_PUBLISHER_FUNCTION: handler.lambda_publicar_alertas})
+        handler._clients['lambda'] = invoker
+        result = {'import_ms': import_ms, 'endpoints': {}}
+        seeded = False
+        for endpoint, (function_name, body) in ENDPOINTS.items():
+            function = getattr(handler, function_name)
+
+            event = event_for(body, 0)
+            start = time.perf_counter()
+            response = function(event, None)
+            first_ms = (time.perf_counter() - start) * 1000
+            if not seeded:
+                # La primera invocación midió la creación de clientes; ahora sí hay datos
+                seed_data(handler)
+                seeded = True
+
+            warm = []
+            writes = pings = 0
+            for step in range(1, warm_runs + 1):
+                event = event_for(body, step)
+                start = time.perf_counter()
+                response = function(event, None)
+                warm.append((time.perf_counter() - start) * 1000)
+                if endpoint == 'ingesta-tracking':
+                    summary = json.loads(response['body'])
+                    writes += summary['written']
+                    pings += summary['received']
+
+            result['endpoints'][endpoint] = {
+                'first_ms': first_ms,
+                'warm_ms': warm,
+                'status': response['statusCode']
+            }
+            if pings:
+                result['tracking'] = {'pings': pings, 'writes': writes}
+        with contextlib.redirect_stdout(io.StringIO()):
+            invoker.drain()
+        result['alerting'] = handler.alert_dispatcher.stats()
+        return result
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark cold/warm de las Lambdas FleetLogix (moto)')
+    parser.add_argument('--cold-starts', type=int, default=5, help='Procesos nuevos (cold starts)')
+    parser.add_argument('--warm-runs', type=int, default=200, help='Invocaciones calientes por endpoint')
+    parser.add_argument('--output', default='lambda_benchmark.json')
+    parser.add_argument('--speed-profile', help='.npz publicado por avance3/speed_profiles.py (SPEED_PROFILE_URI)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_child(args.warm_runs)))
+        return 0
+
+    env = dict(os.environ, AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing',
+               AWS_DEFAULT_REGION='us-east-1', AWS_REGION='us-east-1')
+    if args.speed_profile:
+        env['SPEED_PROFILE_URI'] = os.path.abspath(args.speed_profile)
+    runs = []
+    for i in range(args.cold_starts):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', '--warm-runs', str(args.warm_runs)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+        print(f" Cold start {i + 1}/{args.cold_starts} listo")
+
+    summary = {
+        'cold_starts': args.cold_starts,
+        'warm_runs': args.warm_runs,
+        'import_ms_median': round(statistics.median(r['import_ms'] for r in runs), 2),
+        'endpoints': {}
+    }
+    print(f"\nImport del módulo (mediana): {summary['import_ms_median']:.1f} ms")
+    print(f"\n{'Endpoint':<20}{'1ra invocación':>16}{'Warm p50':>11}{'Warm p99':>11}{'Status':>8}")
+    print("-" * 66)
+    for endpoint in ENDPOINTS:
+        first = [r['endpoints'][endpoint]['first_ms'] for r in runs]
+        warm = [ms for r in runs for ms in r['endpoints'][endpoint]['warm_ms']]
+        stats = {
+            'first_ms_median': round(statistics.median(first), 3),
+            'warm_p50_ms': round(percentile(warm, 50), 3),
+            'warm_p99_ms': round(percentile(warm, 99), 3),
+            'status': runs[-1]['endpoints'][endpoint]['status']
+        }
+        summary['endpoints'][endpoint] = stats
+        print(f"{endpoint:<20}{stats['first_ms_median']:>16.2f}{stats['warm_p50_ms']:>11.3f}"
+              f"{stats['warm_p99_ms']:>11.3f}{stats['status']:>8}")
+
+    single = summary['endpoints']['calcular-eta']['warm_p50_ms']
+    batch = summary['endpoints']['ingesta-tracking']['warm_p50_ms']
+    print(f"\nPor posición: calcular-eta {single:.3f} ms vs ingesta-tracking {batch / FLEET_SIZE:.3f} ms "
+          f"({FLEET_SIZE} invocaciones -> 1)")
+    single = summary['endpoints']['alerta-desvio-densa']['warm_p50_ms']
+    batch = summary['endpoints']['evaluar-desvios']['warm_p50_ms']
+    points = len(deviation_batch(0))
+    print(f"Por posición: alerta-desvio {single:.3f} ms vs evaluar-desvios {batch / points:.4f} ms "
+          f"({points} invocaciones -> 1)")
+
+    pings = sum(r['tracking']['pings'] for r in runs)
+    writes = sum(r['tracking']['writes'] for r in runs)
+    summary['tracking_writes_per_ping'] = round(writes / pings, 3)
+    print(f"Escrituras en vehicle_tracking por ping (flota simulada): {writes / pings:.3f}")
+
+    alerting = {key: sum(r['alerting'][key] for r in runs)
+                for key in ('received', 'suppressed', 'handed_off', 'deduplicated', 'published', 'failed')}
+    summary['alerting'] = alerting
+    print(f"Alertas: {alerting['received']} recibidas, {alerting['suppressed']} suprimidas, "
+          f"{alerting['handed_off']} entregadas a la publicadora, {alerting['published']} publicadas en SNS, "
+          f"{alerting['failed']} fallidas")
+
+    with open(args.output, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"\n Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
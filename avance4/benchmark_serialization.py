@@ -0,0 +1,171 @@
+"""
+FleetLogix - Micro-benchmark de serialización por request
+Compara, para los payloads típicos de cada endpoint, el camino anterior
+(convert_floats recursivo + TypeSerializer de boto3 en put_item/batch_writer
++ json.dumps(default=str)) contra el actual (marshal_item por esquema directo
+a AttributeValue + to_json con orjson / json de la stdlib). No se hace
+ninguna llamada a DynamoDB.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+
+from boto3.dynamodb.types import TypeSerializer
+
+from benchmark_lambda import HANDLER_FILE, fleet_positions, load_module
+
+NOW = datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc)
+
+
+def legacy_convert_floats(obj):
+    """convert_floats tal como estaba en 04_lambda_handler.py"""
+    if isinstance(obj, float):
+        return Decimal(str(obj))
+    elif isinstance(obj, dict):
+        return {k: legacy_convert_floats(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [legacy_convert_floats(i) for i in obj]
+    return obj
+
+
+def tracking_item(position: Dict, distance_km: float) -> Dict:
+    return {
+        'vehicle_id': position['vehicle_id'],
+        'timestamp': position['timestamp'],
+        'current_location': position['current_location'],
+        'destination': position['destination'],
+        'distance_remaining_km': distance_km,
+        'eta': (NOW + timedelta(hours=distance_km / 60)).isoformat(),
+        'current_speed_kmh': position['current_speed_kmh']
+    }
+
+
+def build_cases() -> Dict[str, Dict]:
+    """Por endpoint: tabla, ítems que se persisten y body de la respuesta"""
+    fleet = fleet_positions(1)
+    single = tracking_item(fleet[7], 241.37)
+    batch = [tracking_item(p, 241.37 - i * 0.5) for i, p in enumerate(fleet)]
+    alert = {
+        'vehicle_id': 'VH-001',
+        'timestamp': NOW.isoformat(),
+        'driver_id': 'DRV-001',
+        'route_id': 'R-001',
+        'deviation_km': 12.43,
+        'current_location': {'lat': 4.9, 'lon': -74.4},
+        'alert_type': 'ROUTE_DEVIATION'
+    }
+    # Ítems como los devuelve DynamoDB: números en Decimal
+    manifest = [{
+        'delivery_id': str(i),
+        'tracking_number': f'FL2024{i:08d}',
+        'is_completed': i % 3 == 0,
+        'status': 'delivered' if i % 3 == 0 else 'pending',
+        'trip_id': Decimal(i // 10),
+        'delivered_datetime': '2024-05-01T10:30:00' if i % 3 == 0 else ''
+    } for i in range(1, 41)]
+    return {
+        'calcular-eta': {
+            'table': 'vehicle_tracking',
+            'items': [single],
+            'response': {
+                'vehicle_id': 'VH-007', 'distance_remaining_km': 241.37,
+                'eta': (NOW + timedelta(hours=4)).isoformat(), 'estimated_minutes': 241,
+                'eta_model': 'speed_profile', 'tracking_write': 'latest'
+            }
+        },
+        'alerta-desvio': {
+            'table': 'alerts_history',
+            'items': [alert],
+            'response': {
+                'vehicle_id': 'VH-001', 'is_deviated': True, 'deviation_km': 12.43, 'alert_sent': True,
+                'threshold_km': 5, 'route_cache': {'hits': 120, 'misses': 2, 'revalidated': 1, 'size': 2, 'lookup': 'hit'}
+            }
+        },
+        'ingesta-tracking (200)': {
+            'table': 'vehicle_tracking',
+            'items': batch,
+            'response': {
+                'received': 200, 'written': 83, 'history_points': 3, 'coalesced': 117, 'rejected': 0,
+                'etas': [{'vehicle_id': i['vehicle_id'], 'distance_remaining_km': i['distance_remaining_km'],
+                          'eta': i['eta'], 'estimated_minutes': 240} for i in batch]
+            }
+        },
+        'verificar-manifiesto (40)': {
+            'table': None,
+            'items': [],
+            'response': {'mode': 'batch', 'requested': 40, 'completed': 13, 'pending': 27,
+                         'results': manifest, 'not_found': {'delivery_ids': [], 'tracking_numbers': []},
+                         'unprocessed': []}
+        }
+    }
+
+
+def legacy_path(case: Dict, serializer: TypeSerializer):
+    for item in case['items']:
+        serializer.serialize({'M': legacy_convert_floats(item)})
+    return json.dumps(case['response'], default=str)
+
+
+def schema_path(handler, case: Dict):
+    for item in case['items']:
+        handler.marshal_item(case['table'], item)
+    return handler.to_json(case['response'])
+
+
+def measure(function: Callable, runs: int) -> float:
+    """Mediana de µs por llamada (5 rondas de runs llamadas)"""
+    rounds = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(runs):
+            function()
+        rounds.append((time.perf_counter() - start) / runs * 1e6)
+    return statistics.median(rounds)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Costo de serialización por request de las Lambdas FleetLogix')
+    parser.add_argument('--runs', type=int, default=2000, help='Llamadas por ronda para un ítem (menos en los lotes grandes)')
+    parser.add_argument('--output', help='Guardar los resultados en un JSON')
+    args = parser.parse_args(argv)
+
+    handler = load_module(HANDLER_FILE, 'lambda_handler')
+    orjson_module = handler.orjson
+    serializer = TypeSerializer()
+    results = {}
+
+    print(f"\n{'Payload':<28}{'Anterior µs':>13}{'json µs':>10}{'orjson µs':>11}{'Mejora':>9}")
+    print("-" * 71)
+    for name, case in build_cases().items():
+        runs = max(args.runs // max(len(case['items']), 1) * 4, 20)
+        legacy_us = measure(lambda: legacy_path(case, serializer), runs)
+        handler.orjson = None
+        stdlib_us = measure(lambda: schema_path(handler, case), runs)
+        handler.orjson = orjson_module
+        fast_us = measure(lambda: schema_path(handler, case), runs) if orjson_module else None
+        best = fast_us if fast_us is not None else stdlib_us
+        results[name] = {
+            'legacy_us': round(legacy_us, 2),
+            'schema_json_us': round(stdlib_us, 2),
+            'schema_orjson_us': None if fast_us is None else round(fast_us, 2)
+        }
+        fast = '-' if fast_us is None else f"{fast_us:.1f}"
+        print(f"{name:<28}{legacy_us:>13.1f}{stdlib_us:>10.1f}{fast:>11}{legacy_us / best:>8.1f}x")
+
+    if orjson_module is None:
+        print("\n orjson no está instalado: la columna orjson queda vacía (pip install orjson)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+FleetLogix - Sincronización PostgreSQL -> DynamoDB (deliveries_status)
+Lee de deliveries las filas modificadas desde el último watermark
+(04_dynamo_sync.sql) con un cursor del lado del servidor y las reparte por
+delivery_id entre N workers que escriben en DynamoDB en paralelo:
+  - incremental: PutItem condicional por versión (source_version), así una
+    fila releída o un reintento nunca pisa una versión más nueva
+  - --full: carga inicial con un batch_writer (lotes de 25) por worker
+El watermark sólo avanza si la corrida terminó sin errores.
+
+Con AWS_ENDPOINT_URL_DYNAMODB (o --endpoint-url) apunta a DynamoDB Local o
+a un servidor moto.
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import boto3
+import psycopg2
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+
+POSTGRES_CONFIG = {
+    'host': os.getenv('POSTGRES_HOST', 'localhost'),
+    'database': os.getenv('POSTGRES_DB', 'fleetlogix'),
+    'user': os.getenv('POSTGRES_USER', 'postgres'),
+    'password': os.getenv('POSTGRES_PASSWORD'),
+    'port': int(os.getenv('POSTGRES_PORT', '5432'))
+}
+
+SYNC_TABLE = 'deliveries_status'
+SYNC_WORKERS = int(os.getenv('SYNC_WORKERS', '8'))
+# Se relee este margen antes del watermark: una transacción larga confirma
+# filas con un updated_at (inicio de la transacción) anterior al watermark
+SYNC_OVERLAP_SECONDS = float(os.getenv('SYNC_OVERLAP_SECONDS', '120'))
+# Filas por viaje del cursor del lado del servidor
+SYNC_FETCH_ROWS = 5000
+# Filas en cola por worker antes de frenar la lectura de PostgreSQL
+SYNC_QUEUE_ROWS = 2000
+
+EPOCH = datetime(1970, 1, 1)
+
+BOTO_CONFIG = Config(
+    max_pool_connections=4,
+    connect_timeout=2,
+    read_timeout=10,
+    retries={'max_attempts': 10, 'mode': 'standard'}
+)
+
+CHANGED_DELIVERIES_QUERY = """
+    SELECT delivery_id, trip_id, tracking_number, delivery_status,
+           scheduled_datetime, delivered_datetime, updated_at
+    FROM deliveries
+    {filter}
+"""
+
+VERSION_CONDITION = 'attribute_not_exists(source_version) OR source_version < :v'
+
+
+def source_version(updated_at: datetime) -> int:
+    """Versión monótona del ítem: microsegundos de updated_at"""
+    return (updated_at - EPOCH) // timedelta(microseconds=1)
+
+
+def delivery_item(row) -> Dict:
+    """Fila de deliveries -> ítem de deliveries_status (sin atributos nulos: los GSI no los aceptan)"""
+    delivery_id, trip_id, tracking_number, status, scheduled, delivered, updated_at = row
+    item = {
+        'delivery_id': str(delivery_id),
+        'tracking_number': tracking_number,
+        'status': status or 'pending',
+        'source_version': source_version(updated_at)
+    }
+    if trip_id is not None:
+        item['trip_id'] = trip_id
+    if scheduled is not None:
+        item['scheduled_datetime'] = scheduled.isoformat()
+    if delivered is not None:
+        item['delivered_datetime'] = delivered.isoformat()
+    return item
+
+
+class DynamoSync:
+    def __init__(self, pg_conn, workers: int = SYNC_WORKERS, table_name: str = SYNC_TABLE,
+                 endpoint_url: Optional[str] = None):
+        self.pg_conn = pg_conn
+        self.workers = workers
+        self.table_name = table_name
+        self.endpoint_url = endpoint_url
+        self.metrics = {
+            'rows_read': 0,
+            'written': 0,
+            'unchanged': 0,
+            'errors': 0,
+            'seconds': 0.0,
+            'rows_per_second': 0.0
+        }
+
+    def read_watermark(self) -> Optional[datetime]:
+        cursor = self.pg_conn.cursor()
+        cursor.execute("SELECT last_updated_at FROM dynamo_sync_state WHERE table_name = %s", (self.table_name,))
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] if row else None
+
+    def save_watermark(self, last_updated_at: datetime, rows: int):
+        cursor = self.pg_conn.cursor()
+        cursor.execute("""
+            INSERT INTO dynamo_sync_state (table_name, last_updated_at, rows_synced, synced_at)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (table_name) DO UPDATE SET
+                last_updated_at = GREATEST(dynamo_sync_state.last_updated_at, EXCLUDED.last_updated_at),
+                rows_synced = dynamo_sync_state.rows_synced + EXCLUDED.rows_synced,
+                synced_at = EXCLUDED.synced_at
+        """, (self.table_name, last_updated_at, rows))
+        self.pg_conn.commit()
+        cursor.close()
+
+    def _worker(self, rows: queue.Queue, full: bool, results: List[Dict], slot: int):
+        """Escribir los ítems de un segmento hasta recibir None"""
+        counts = {'written': 0, 'unchanged': 0, 'errors': 0}
+        results[slot] = counts
+        try:
+            # Los resources de boto3 no son thread-safe: una sesión por worker
+            session = boto3.session.Session()
+            table = session.resource('dynamodb', endpoint_url=self.endpoint_url, config=BOTO_CONFIG).Table(self.table_name)
+            if full:
+                with table.batch_writer(overwrite_by_pkeys=['delivery_id']) as writer:
+                    for item in iter(rows.get, None):
+                        writer.put_item(Item=item)
+                        counts['written'] += 1
+                return
+            for item in iter(rows.get, None):
+                try:
+                    table.put_item(
+                        Item=item,
+                        ConditionExpression=VERSION_CONDITION,
+                        ExpressionAttributeValues={':v': item['source_version']}
+                    )
+                    counts['written'] += 1
+                except ClientError as e:
+                    if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                        counts['unchanged'] += 1
+                    else:
+                        counts['errors'] += 1
+                        logging.error(f" Error escribiendo entrega {item['delivery_id']}: {e}")
+        except Exception as e:
+            counts['errors'] += 1
+            logging.error(f" Worker {slot} detenido: {e}")
+            # Vaciar la cola para no bloquear al lector
+            for _ in iter(rows.get, None):
+                counts['errors'] += 1
+
+    def run(self, full: bool = False) -> Dict:
+        """Sincronizar deliveries -> deliveries_status; devuelve las métricas"""
+        start = time.perf_counter()
+        watermark = None if full else self.read_watermark()
+        if watermark is None:
+            filter_sql, params = '', {}
+            logging.info(f" Sincronización completa de deliveries -> {self.table_name}")
+        else:
+            filter_sql = 'WHERE updated_at > %(since)s ORDER BY updated_at'
+            params = {'since': watermark - timedelta(seconds=SYNC_OVERLAP_SECONDS)}
+            logging.info(f" Sincronización incremental desde {params['since']} (watermark {watermark})")
+        bulk = full or watermark is None
+
+        # Segmentos por delivery_id: la misma entrega siempre va al mismo
+        # worker, así sus versiones se escriben en orden dentro de la corrida
+        segments = [queue.Queue(maxsize=SYNC_QUEUE_ROWS) for _ in range(self.workers)]
+        results = [None] * self.workers
+        threads = [
+            threading.Thread(target=self._worker, args=(segment, bulk, results, slot), daemon=True)
+            for slot, segment in enumerate(segments)
+        ]
+        for thread in threads:
+            thread.start()
+
+        last_updated_at = None
+        try:
+            cursor = self.pg_conn.cursor(name='dynamo_sync')  # cursor del lado del servidor
+            cursor.itersize = SYNC_FETCH_ROWS
+            cursor.execute(CHANGED_DELIVERIES_QUERY.format(filter=filter_sql), params)
+            for row in cursor:
+                segments[row[0] % self.workers].put(delivery_item(row))
+                if last_updated_at is None or row[6] > last_updated_at:
+                    last_updated_at = row[6]
+                self.metrics['rows_read'] += 1
+            cursor.close()
+            self.pg_conn.commit()
+        except Exception as e:
+            self.metrics['errors'] += 1
+            logging.error(f" Error leyendo deliveries: {e}")
+            self.pg_conn.rollback()
+        finally:
+            for segment in segments:
+                segment.put(None)
+            for thread in threads:
+                thread.join()
+
+        for counts in results:
+            for key, value in (counts or {'errors': 1}).items():
+                self.metrics[key] += value
+        self.metrics['seconds'] = round(time.perf_counter() - start, 3)
+        self.metrics['rows_per_second'] = round(self.metrics['rows_read'] / max(self.metrics['seconds'], 1e-9), 1)
+
+        if self.metrics['errors'] == 0 and last_updated_at is not None:
+            self.save_watermark(last_updated_at, self.metrics['written'])
+        elif self.metrics['errors']:
+            logging.warning(" La corrida tuvo errores: el watermark no avanza (la próxima relee estas filas)")
+
+        logging.info(
+            f" Sincronización: {self.metrics['rows_read']} filas leídas, {self.metrics['written']} escritas, "
+            f"{self.metrics['unchanged']} sin cambios, {self.metrics['errors']} errores en "
+            f"{self.metrics['seconds']:.2f} s ({self.metrics['rows_per_second']:.0f} filas/s)"
+        )
+        return self.metrics
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Sincronizar deliveries (PostgreSQL) -> deliveries_status (DynamoDB)')
+    parser.add_argument('--full', action='store_true', help='Ignorar el watermark y cargar toda la tabla con batch_writer')
+    parser.add_argument('--workers', type=int, default=SYNC_WORKERS, help='Workers de escritura en paralelo')
+    parser.add_argument('--endpoint-url', help='DynamoDB Local / moto server')
+    parser.add_argument('--output', help='Guardar las métricas en un JSON')
+    args = parser.parse_args(argv)
+
+    pg_conn = psycopg2.connect(**POSTGRES_CONFIG)
+    try:
+        metrics = DynamoSync(pg_conn, workers=args.workers, endpoint_url=args.endpoint_url).run(full=args.full)
+    finally:
+        pg_conn.close()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(metrics, f, indent=2)
+    return 1 if metrics['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""
+FleetLogix - Generador de carga para la API (asyncio)
+Simula una flota de N vehículos que reportan su posición cada
+--ping-seconds contra la API (local_api.py o la URL de API Gateway
+desplegada) y reporta throughput y latencias p50/p95/p99 por endpoint.
+
+Tráfico de cada vehículo (arranques escalonados dentro del intervalo):
+  - calcular-eta en cada ping; con --ingest batch, un solo ingesta-tracking
+    por intervalo con las posiciones de toda la flota
+  - alerta-desvio cada ALERT_EVERY_PINGS pings
+  - verificar-entrega del manifiesto del viaje cada MANIFEST_SECONDS
+
+La carga es de lazo abierto: cada request sale a su hora programada aunque
+los anteriores no hayan terminado, y la latencia se mide desde esa hora.
+Si el servidor se satura, la espera en cola también cuenta (sin
+"coordinated omission"); la columna servicio mide sólo el request.
+
+    python avance4/load_test.py --spawn --vehicles 200 --duration 60
+    python avance4/load_test.py --url https://xxxx.execute-api.us-east-1.amazonaws.com/prod
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import ssl
+import subprocess
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmark_lambda import FLEET_SIZE, PING_SECONDS, percentile, vehicle_position
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_API_FILE = os.path.join(BASE_DIR, 'local_api.py')
+
+ALERT_EVERY_PINGS = 6
+MANIFEST_SECONDS = 60
+MANIFEST_SIZE = 40
+ROUTES = ['R-001', 'R-DENSE']
+# Entregas con las que se arman los manifiestos (las de local_api.py por defecto)
+DELIVERY_POOL = 1000
+
+
+class HttpClient:
+    """Cliente HTTP/1.1 mínimo sobre asyncio: POST JSON con conexiones keep-alive reutilizadas"""
+
+    def __init__(self, base_url: str, connections: int):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.prefix = parts.path.rstrip('/')
+        self._slots = asyncio.Semaphore(connections)
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def post(self, path: str, payload: Dict) -> int:
+        body = json.dumps(payload).encode()
+        request = (
+            f"POST {self.prefix}/{path} HTTP/1.1\r\n"
+            f"Host: {self.host}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode() + body
+        async with self._slots:
+            if self._idle:
+                reader, writer = self._idle.pop()
+            else:
+                reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+            try:
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+                if not status_line:
+                    raise ConnectionError('Conexión cerrada por el servidor')
+                status = int(status_line.split()[1])
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers.get('content-length', 0)))
+            except Exception:
+                writer.close()
+                raise
+            if headers.get('connection', '').lower() == 'close':
+                writer.close()
+            else:
+                self._idle.append((reader, writer))
+            return status
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+class LoadStats:
+    def __init__(self):
+        self.samples: Dict[str, List[Tuple[float, float, int]]] = {}
+        self.failures: Dict[str, int] = {}
+
+    def record(self, endpoint: str, scheduled_ms: float, service_ms: float, status: int):
+        self.samples.setdefault(endpoint, []).append((scheduled_ms, service_ms, status))
+
+    def fail(self, endpoint: str):
+        self.failures[endpoint] = self.failures.get(endpoint, 0) + 1
+
+
+async def timed_post(client: HttpClient, stats: LoadStats, endpoint: str, payload: Dict, scheduled: float):
+    loop = asyncio.get_running_loop()
+    sent = loop.time()
+    try:
+        status = await client.post(endpoint, payload)
+    except Exception:
+        stats.fail(endpoint)
+        return
+    done = loop.time()
+    stats.record(endpoint, (done - scheduled) * 1000, (done - sent) * 1000, status)
+
+
+def manifest_for(vehicle: int) -> List[str]:
+    first = vehicle * MANIFEST_SIZE % DELIVERY_POOL
+    return [str((first + k) % DELIVERY_POOL + 1) for k in range(MANIFEST_SIZE)]
+
+
+async def run_vehicle(i: int, args, client: HttpClient, stats: LoadStats, start: float, pending: set):
+    """Agenda los requests de un vehículo; no espera respuestas (lazo abierto)"""
+    loop = asyncio.get_running_loop()
+    offset = i / args.vehicles * args.ping_seconds
+    route_id = ROUTES[i % len(ROUTES)]
+    manifest_every = max(int(MANIFEST_SECONDS / args.ping_seconds), 1)
+    step = 0
+    while True:
+        scheduled = start + offset + step * args.ping_seconds
+        if scheduled - start >= args.duration:
+            return
+        await asyncio.sleep(max(scheduled - loop.time(), 0))
+        position = vehicle_position(i, step)
+        requests = []
+        if args.ingest == 'single':
+            requests.append(('calcular-eta', dict(position, route_id=route_id)))
+        if step % ALERT_EVERY_PINGS == 0:
+            requests.append(('alerta-desvio', {
+                'vehicle_id': position['vehicle_id'],
+                'driver_id': f'DRV-{i:03d}',
+                'route_id': route_id,
+                'current_location': position['current_location']
+            }))
+        if step % manifest_every == 0:
+            requests.append(('verificar-entrega', {'delivery_ids': manifest_for(i)}))
+        for endpoint, payload in requests:
+            task = asyncio.create_task(timed_post(client, stats, endpoint, payload, scheduled))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        step += 1
+
+
+async def run_batch_ingest(args, client: HttpClient, stats: LoadStats, start: float, pending: set):
+    """--ingest batch: las posiciones de toda la flota en un ingesta-tracking por intervalo"""
+    loop = asyncio.get_running_loop()
+    step = 0
+    while True:
+        scheduled = start + step * args.ping_seconds
+        if scheduled - start >= args.duration:
+            return
+        await asyncio.sleep(max(scheduled - loop.time(), 0))
+        payload = {'positions': [vehicle_position(i, step) for i in range(args.vehicles)]}
+        task = asyncio.create_task(timed_post(client, stats, 'ingesta-tracking', payload, scheduled))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        step += 1
+
+
+async def run_load(args) -> Tuple[LoadStats, float]:
+    client = HttpClient(args.url, args.connections)
+    stats = LoadStats()
+    pending = set()
+    loop = asyncio.get_running_loop()
+    start = loop.time() + 0.1
+    producers = [run_vehicle(i, args, client, stats, start, pending) for i in range(args.vehicles)]
+    if args.ingest == 'batch':
+        producers.append(run_batch_ingest(args, client, stats, start, pending))
+    await asyncio.gather(*producers)
+    if pending:
+        await asyncio.wait(pending)
+    elapsed = loop.time() - start
+    client.close()
+    return stats, elapsed
+
+
+def summarize(stats: LoadStats, elapsed: float) -> Dict:
+    summary = {'elapsed_s': round(elapsed, 2), 'endpoints': {}}
+    total = errors = 0
+    for endpoint in sorted(set(stats.samples) | set(stats.failures)):
+        samples = stats.samples.get(endpoint, [])
+        failed = stats.failures.get(endpoint, 0) + sum(1 for _, _, status in samples if status >= 400)
+        latencies = [s[0] for s in samples]
+        service = [s[1] for s in samples]
+        total += len(samples) + stats.failures.get(endpoint, 0)
+        errors += failed
+        summary['endpoints'][endpoint] = {
+            'requests': len(samples) + stats.failures.get(endpoint, 0),
+            'errors': failed,
+            'rps': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+            'service_p50_ms': round(percentile(service, 50), 2) if service else None
+        }
+    summary['requests'] = total
+    summary['errors'] = errors
+    summary['rps'] = round(total / elapsed, 1)
+    return summary
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def spawn_local_api(port: int) -> subprocess.Popen:
+    """Levantar local_api.py en otro proceso (no compite por el GIL con el generador)"""
+    process = subprocess.Popen(
+        [sys.executable, LOCAL_API_FILE, '--port', str(port)],
+        stdout=subprocess.PIPE, text=True
+    )
+    for line in process.stdout:
+        if 'API local en' in line:
+            # Seguir leyendo su salida (métricas de alertas) para que el pipe no se llene
+            threading.Thread(target=process.stdout.read, daemon=True).start()
+            return process
+    process.kill()
+    raise RuntimeError('local_api.py terminó antes de quedar listo')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Prueba de carga de la API FleetLogix (flota simulada)')
+    parser.add_argument('--url', default='http://127.0.0.1:8080/prod', help='Base de la API (incluye el stage)')
+    parser.add_argument('--spawn', action='store_true', help='Levantar local_api.py en un puerto libre')
+    parser.add_argument('--vehicles', type=int, default=FLEET_SIZE)
+    parser.add_argument('--ping-seconds', type=float, default=PING_SECONDS)
+    parser.add_argument('--duration', type=float, default=60, help='Segundos de carga')
+    parser.add_argument('--ingest', choices=['single', 'batch'], default='single',
+                        help='single: calcular-eta por ping; batch: un ingesta-tracking por intervalo')
+    parser.add_argument('--connections', type=int, default=64, help='Conexiones HTTP concurrentes máximas')
+    parser.add_argument('--output', default='load_test.json')
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.spawn:
+        port = free_port()
+        process = spawn_local_api(port)
+        args.url = f'http://127.0.0.1:{port}/prod'
+    try:
+        offered = args.vehicles / args.ping_seconds
+        print(f" {args.vehicles} vehículos, ping cada {args.ping_seconds:g} s ({offered:.0f} pings/s, "
+              f"ingesta {args.ingest}) durante {args.duration:g} s contra {args.url}")
+        stats, elapsed = asyncio.run(run_load(args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    summary = summarize(stats, elapsed)
+    summary['config'] = {k: v for k, v in vars(args).items() if k != 'output'}
+    print(f"\n{'Endpoint':<20}{'Requests':>10}{'Errores':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'Servicio p50':>14}")
+    print("-" * 88)
+    for endpoint, row in summary['endpoints'].items():
+        cells = [f"{row[k]:.1f}" if row[k] is not None else '-' for k in ('p50_ms', 'p95_ms', 'p99_ms', 'service_p50_ms')]
+        print(f"{endpoint:<20}{row['requests']:>10}{row['errors']:>9}{row['rps']:>8.1f}"
+              f"{cells[0]:>9}{cells[1]:>9}{cells[2]:>9}{cells[3]:>14}")
+    print(f"\nTotal: {summary['requests']} requests, {summary['errors']} errores, {summary['rps']:.1f} req/s "
+          f"en {summary['elapsed_s']:.1f} s")
+
+    with open(args.output, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"\n Resultados guardados en {args.output}")
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""
+FleetLogix - Emulador local de API Gateway
+Servidor HTTP que monta los handlers de 04_lambda_handler.py en las mismas
+rutas que crear_api_gateway() (API_ROUTES de 04_aws_setup.py). Cada request
+se convierte en un evento proxy (AWS_PROXY) de API Gateway REST y la
+respuesta de la Lambda se traduce a HTTP igual que en AWS (502 si la función
+falla o devuelve algo que no es una respuesta proxy). Como en Lambda, cada
+contenedor (una instancia propia del módulo del handler) atiende una
+invocación a la vez; los requests concurrentes de una función abren
+contenedores nuevos (cold start) hasta --concurrency. Las invocaciones
+asíncronas (alertas hacia fleetlogix-publicar-alertas) corren en el pool de
+su función. Por defecto DynamoDB y SNS son moto en el mismo proceso, con las
+tablas de crear_tablas_dynamodb(), el tópico de crear_topico_sns() y datos
+de ejemplo; con --no-moto usa AWS o AWS_ENDPOINT_URL_DYNAMODB (y
+ALERTS_TOPIC_ARN).
+
+    python avance4/local_api.py --port 8080
+    curl -X POST localhost:8080/prod/verificar-entrega -d '{"delivery_id": "1"}'
+"""
+
+import argparse
+import base64
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from benchmark_lambda import HANDLER_FILE, SETUP_FILE, create_alerts_topic, create_tables, load_module, seed_data
+
+# Entregas sembradas en deliveries_status (ids '1'..'N' como los escribe dynamo_sync.py)
+LOCAL_DELIVERIES = 1000
+# Contenedores simultáneos por función (concurrencia reservada)
+LOCAL_CONCURRENCY = 8
+
+_module_names = itertools.count()
+
+
+class LambdaContext:
+    """Lo que los handlers usan del context de Lambda"""
+
+    def __init__(self, function_name: str, timeout_seconds: float, memory_mb: int):
+        self.function_name = function_name
+        self.memory_limit_in_mb = memory_mb
+        self.aws_request_id = str(uuid.uuid4())
+        self.invoked_function_arn = f'arn:aws:lambda:us-east-1:000000000000:function:{function_name}'
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+
+class ContainerPool:
+    """
+    Contenedores de una función Lambda. Cada uno es una instancia separada
+    del módulo del handler (clientes, cachés y estado propios) y atiende una
+    invocación a la vez. Se reutiliza el último contenedor liberado, como
+    hace Lambda; si no hay ninguno libre se abre otro (cold start) hasta
+    max_containers, y más allá el request espera.
+    """
+
+    def __init__(self, function_name: str, entry_point: str, max_containers: int,
+                 configure: Optional[Callable] = None):
+        self.function_name = function_name
+        self.entry_point = entry_point
+        self.max_containers = max_containers
+        self.configure = configure
+        self.cold_starts = 0
+        self._idle: List = []
+        self._condition = threading.Condition()
+
+    def _acquire(self):
+        with self._condition:
+            while not self._idle and self.cold_starts >= self.max_containers:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            self.cold_starts += 1
+        try:
+            container = load_module(HANDLER_FILE, f'lambda_handler_{next(_module_names)}')
+            if self.configure is not None:
+                self.configure(container)
+            return container
+        except Exception:
+            with self._condition:
+                self.cold_starts -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, container):
+        with self._condition:
+            self._idle.append(container)
+            self._condition.notify()
+
+    def invoke(self, event: Dict, context: 'LambdaContext') -> Dict:
+        container = self._acquire()
+        try:
+            return getattr(container, self.entry_point)(event, context)
+        finally:
+            self._release(container)
+
+
+class AsyncInvoker:
+    """
+    Cliente 'lambda' de los contenedores: invoke(InvocationType='Event')
+    responde 202 y ejecuta la función en su pool desde otro thread, con los
+    reintentos de una invocación asíncrona de Lambda (2 más si falla).
+    """
+
+    def __init__(self, pools: Dict[str, ContainerPool], timeout_seconds: float, memory_mb: int):
+        self.pools = pools
+        self.timeout_seconds = timeout_seconds
+        self.memory_mb = memory_mb
+
+    def invoke(self, FunctionName, InvocationType='RequestResponse', Payload='{}'):
+        event = json.loads(Payload)
+        threading.Thread(target=self._run, args=(FunctionName, event), daemon=True).start()
+        return {'StatusCode': 202}
+
+    def _run(self, function_name: str, event: Dict):
+        pool = self.pools[function_name]
+        for _ in range(3):
+            try:
+                pool.invoke(event, LambdaContext(function_name, self.timeout_seconds, self.memory_mb))
+                return
+            except Exception:
+                traceback.print_exc()
+
+
+def build_pools(setup, max_containers: int = LOCAL_CONCURRENCY,
+                configure: Optional[Callable] = None) -> Dict[str, ContainerPool]:
+    """Nombre de la función -> pool de contenedores, según LAMBDA_FUNCTIONS"""
+    return {
+        f['nombre']: ContainerPool(f['nombre'], f['handler'].split('.', 1)[1], max_containers, configure)
+        for f in setup.LAMBDA_FUNCTIONS
+    }
+
+
+def build_routes(setup, pools: Dict[str, ContainerPool]) -> Dict[str, ContainerPool]:
+    """'/ruta' -> pool de contenedores de su Lambda, según API_ROUTES"""
+    return {'/' + route['path']: pools[route['lambda']] for route in setup.API_ROUTES}
+
+
+def proxy_event(method: str, path: str, resource: str, stage: str, headers: Dict[str, str],
+                query: List[Tuple[str, str]], raw_body: bytes, source_ip: str) -> Dict:
+    """Evento de integración AWS_PROXY (API Gateway REST, payload 1.0)"""
+    body, is_base64 = None, False
+    if raw_body:
+        try:
+            body = raw_body.decode('utf-8')
+        except UnicodeDecodeError:
+            body, is_base64 = base64.b64encode(raw_body).decode(), True
+    multi_query = {}
+    for key, value in query:
+        multi_query.setdefault(key, []).append(value)
+    return {
+        'resource': resource,
+        'path': path,
+        'httpMethod': method,
+        'headers': headers,
+        'multiValueHeaders': {key: [value] for key, value in headers.items()},
+        'queryStringParameters': {key: values[-1] for key, values in multi_query.items()} or None,
+        'multiValueQueryStringParameters': multi_query or None,
+        'pathParameters': None,
+        'stageVariables': None,
+        'requestContext': {
+            'resourcePath': resource,
+            'httpMethod': method,
+            'path': f'/{stage}{resource}',
+            'stage': stage,
+            'requestId': str(uuid.uuid4()),
+            'requestTimeEpoch': int(time.time() * 1000),
+            'identity': {'sourceIp': source_ip}
+        },
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
+
+
+class ApiGatewayHandler(BaseHTTPRequestHandler):
+    # Keep-alive: el generador de carga reutiliza conexiones
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method: str):
+        server = self.server
+        url = urlsplit(self.path)
+        stage_prefix = f'/{server.stage}'
+        resource = url.path[len(stage_prefix):] if url.path.startswith(stage_prefix + '/') else url.path
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+
+        pool = server.routes.get(resource)
+        if pool is None or method != 'POST':
+            # Lo que responde API Gateway a un recurso o método no configurado
+            self._send(403, {}, b'{"message":"Missing Authentication Token"}')
+            return
+
+        event = proxy_event(method, url.path, resource, server.stage, dict(self.headers.items()),
+                            parse_qsl(url.query), raw_body, self.client_address[0])
+        context = LambdaContext(pool.function_name, server.timeout_seconds, server.memory_mb)
+        try:
+            response = pool.invoke(event, context)
+            status = int(response['statusCode'])
+            headers = response.get('headers') or {}
+            body = response.get('body') or ''
+            payload = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode('utf-8')
+        except Exception:
+            traceback.print_exc()
+            status, headers, payload = 502, {}, b'{"message":"Internal server error"}'
+        self._send(status, headers, payload, context.aws_request_id)
+
+    def _send(self, status: int, headers: Dict[str, str], payload: bytes, request_id: Optional[str] = None):
+        self.send_response(status)
+        if not any(key.lower() == 'content-type' for key in headers):
+            self.send_header('Content-Type', 'application/json')
+        for key, value in headers.items():
+            self.send_header(key, str(value))
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('x-amzn-RequestId', request_id or str(uuid.uuid4()))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def seed_deliveries(handler, count: int = LOCAL_DELIVERIES):
+    """Entregas '1'..count en deliveries_status: 10 por viaje, un tercio ya entregadas"""
+    with handler.get_table('deliveries_status').batch_writer() as writer:
+        for i in range(1, count + 1):
+            delivered = i % 3 == 0
+            item = {
+                'delivery_id': str(i),
+                'trip_id': i // 10 + 1,
+                'tracking_number': f'FL2024{i:08d}',
+                'status': 'delivered' if delivered else 'pending'
+            }
+            if delivered:
+                item['delivered_datetime'] = '2024-05-01T10:30:00'
+            writer.put_item(Item=item)
+
+
+def create_server(host: str, port: int, use_moto: bool = True, deliveries: int = LOCAL_DELIVERIES,
+                  verbose: bool = False, concurrency: int = LOCAL_CONCURRENCY) -> ThreadingHTTPServer:
+    """Servidor listo para serve_forever(); con use_moto deja mock_aws activo en server.mock"""
+    mock = None
+    if use_moto:
+        for key, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                           ('AWS_DEFAULT_REGION', 'us-east-1'), ('AWS_REGION', 'us-east-1')):
+            os.environ.setdefault(key, value)
+        from moto import mock_aws
+        mock = mock_aws()
+        mock.start()
+
+    setup = load_module(SETUP_FILE, 'aws_setup')
+    pools = {}
+    invoker = AsyncInvoker(pools, setup.LAMBDA_TIMEOUT_SECONDS, setup.LAMBDA_MEMORY_MB)
+    configure = None
+    if use_moto:
+        # Un módulo sólo para crear y sembrar los recursos; no atiende requests
+        handler = load_module(HANDLER_FILE, 'lambda_handler_seed')
+        create_tables()
+        create_alerts_topic(handler)
+        seed_data(handler)
+        seed_deliveries(handler, deliveries)
+        topic_arn = handler.ALERTS_TOPIC_ARN
+
+        def configure(container):
+            # En AWS llega por la variable de entorno de la función
+            container.ALERTS_TOPIC_ARN = topic_arn
+            # Las alertas van a la publicadora de este mismo emulador
+            container._clients['lambda'] = invoker
+
+    server = ThreadingHTTPServer((host, port), ApiGatewayHandler)
+    server.daemon_threads = True
+    pools.update(build_pools(setup, concurrency, configure))
+    server.routes = build_routes(setup, pools)
+    server.stage = setup.API_STAGE
+    server.timeout_seconds = setup.LAMBDA_TIMEOUT_SECONDS
+    server.memory_mb = setup.LAMBDA_MEMORY_MB
+    server.verbose = verbose
+    server.mock = mock
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Emulador local de API Gateway para las Lambdas FleetLogix')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--no-moto', action='store_true', help='Usar DynamoDB real / AWS_ENDPOINT_URL_DYNAMODB')
+    parser.add_argument('--deliveries', type=int, default=LOCAL_DELIVERIES, help='Entregas de ejemplo (con moto)')
+    parser.add_argument('--verbose', action='store_true', help='Log de cada request')
+    parser.add_argument('--concurrency', type=int, default=LOCAL_CONCURRENCY,
+                        help='Contenedores simultáneos por función')
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port, not args.no_moto, args.deliveries, args.verbose,
+                           args.concurrency)
+    host, port = server.server_address[:2]
+    print(f" API local en http://{host}:{port}/{server.stage} ({', '.join(server.routes)})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if server.mock is not None:
+            server.mock.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
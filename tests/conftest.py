@@ -0,0 +1,82 @@
+"""
+Configuración común de pytest: los scripts de cada avance se importan entre
+sí como módulos sueltos (from dw_backends import ...), así que sus carpetas
+van al sys.path igual que al ejecutarlos desde ahí.
+
+Las fixtures aws/handler levantan con moto las tablas de 04_aws_setup.py y
+cargan el handler de Lambda como un contenedor nuevo (load_handler para un
+segundo contenedor con su propio estado en memoria).
+"""
+
+import itertools
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ('avance2', 'avance3', 'avance4'):
+    path = os.path.join(ROOT, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+_handler_names = itertools.count()
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    """Cuenta AWS simulada con moto: tablas de 04_aws_setup.py y tópico de alertas"""
+    pytest.importorskip('moto')
+    from moto import mock_aws
+
+    for key, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                       ('AWS_SESSION_TOKEN', 'testing'), ('AWS_DEFAULT_REGION', 'us-east-1'),
+                       ('AWS_REGION', 'us-east-1')):
+        monkeypatch.setenv(key, value)
+    # Alertas publicadas dentro del request; el modo 'async' se prueba aparte
+    monkeypatch.setenv('ALERT_DISPATCH_MODE', 'sync')
+    with mock_aws():
+        import benchmark_lambda
+        benchmark_lambda.create_tables()
+        yield benchmark_lambda
+
+
+@pytest.fixture
+def load_handler(aws):
+    """Cargar 04_lambda_handler.py como un contenedor nuevo (estado en memoria vacío)"""
+    def load():
+        handler = aws.load_module(aws.HANDLER_FILE, f'lambda_handler_{next(_handler_names)}')
+        aws.create_alerts_topic(handler)
+        return handler
+    return load
+
+
+@pytest.fixture
+def handler(aws, load_handler):
+    module = load_handler()
+    aws.seed_data(module)
+    return module
+
+
+class UnprocessedClient:
+    """batch_get_item que nunca procesa las claves (tabla con throttling permanente)"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def batch_get_item(self, RequestItems):
+        self.calls += 1
+        return {'Responses': {}, 'UnprocessedKeys': RequestItems}
+
+
+@pytest.fixture
+def throttle_reads(handler, monkeypatch):
+    """throttle_reads(tabla) -> cliente cuyas BatchGetItem sobre esa tabla nunca se procesan"""
+    monkeypatch.setattr(handler.time, 'sleep', lambda seconds: None)
+
+    def throttle(table_name):
+        client = UnprocessedClient()
+        monkeypatch.setattr(handler.get_table(table_name).meta, 'client', client)
+        return client
+    return throttle
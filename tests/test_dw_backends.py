@@ -0,0 +1,82 @@
+"""Backends del Data Warehouse (avance3/dw_backends.py) sobre DuckDB en memoria"""
+
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('duckdb')
+
+from dw_backends import DuckDBBackend, WarehouseBackend, create_backend
+
+TOTALS_COLUMNS = ['date_key', 'total_deliveries', 'total_fuel_liters']
+
+
+@pytest.fixture
+def backend():
+    warehouse = DuckDBBackend(':memory:').connect()
+    yield warehouse
+    warehouse.close()
+
+
+def totals(backend):
+    return backend.fetch_df(
+        "SELECT date_key, total_deliveries, total_fuel_liters FROM daily_delivery_totals ORDER BY date_key"
+    ).values.tolist()
+
+
+def test_interfaz_abstracta():
+    with pytest.raises(TypeError):
+        WarehouseBackend()
+
+    class SinMerge(WarehouseBackend):
+        def connect(self):
+            return self
+
+    with pytest.raises(TypeError):
+        SinMerge()
+
+
+def test_create_backend():
+    assert isinstance(create_backend('duckdb'), DuckDBBackend)
+    with pytest.raises(ValueError):
+        create_backend('oracle')
+
+
+def test_merge_inserta_y_actualiza(backend):
+    backend.merge('daily_delivery_totals', ['date_key'], TOTALS_COLUMNS,
+                  [(20240501, 10, 55.5), (20240502, 4, 12.0)])
+    backend.merge('daily_delivery_totals', ['date_key'], TOTALS_COLUMNS,
+                  [(20240502, 6, 20.25), (20240503, 1, 3.0)])
+    backend.commit()
+
+    assert totals(backend) == [
+        [20240501, 10, Decimal('55.50')],
+        [20240502, 6, Decimal('20.25')],
+        [20240503, 1, Decimal('3.00')],
+    ]
+
+
+def test_merge_idempotente(backend):
+    rows = [(20240501, 10, 55.5)]
+    backend.merge('daily_delivery_totals', ['date_key'], TOTALS_COLUMNS, rows)
+    backend.merge('daily_delivery_totals', ['date_key'], TOTALS_COLUMNS, rows)
+    backend.commit()
+    assert len(totals(backend)) == 1
+
+
+def test_merge_vacio_no_hace_nada(backend):
+    backend.merge('daily_delivery_totals', ['date_key'], TOTALS_COLUMNS, [])
+    assert totals(backend) == []
+
+
+def test_rollback_descarta_el_merge(backend):
+    backend.merge('daily_delivery_totals', ['date_key'], TOTALS_COLUMNS, [(20240501, 10, 55.5)])
+    backend.rollback()
+    assert totals(backend) == []
+
+
+def test_bulk_insert(backend):
+    backend.bulk_insert('daily_delivery_totals', TOTALS_COLUMNS,
+                        [(20240501 + i, i, float(i)) for i in range(100)])
+    backend.commit()
+    assert len(totals(backend)) == 100
@@ -0,0 +1,111 @@
+"""Idempotencia de la sincronización PostgreSQL -> DynamoDB (avance4/dynamo_sync.py) con moto"""
+
+import queue
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('psycopg2')
+
+from dynamo_sync import SYNC_TABLE, DynamoSync, delivery_item, source_version
+
+BASE = datetime(2024, 5, 1, 10, 0)
+
+
+def row(delivery_id, status, updated_at, delivered=None):
+    return (delivery_id, 7, f'FL{delivery_id:06d}', status, BASE, delivered, updated_at)
+
+
+def write_incremental(items):
+    """Pasar ítems por un worker incremental (PutItem condicional por versión)"""
+    rows = queue.Queue()
+    for item in items:
+        rows.put(item)
+    rows.put(None)
+    results = [None]
+    DynamoSync(pg_conn=None, workers=1)._worker(rows, False, results, 0)
+    return results[0]
+
+
+def stored(delivery_id):
+    import boto3
+    return boto3.resource('dynamodb').Table(SYNC_TABLE).get_item(Key={'delivery_id': str(delivery_id)}).get('Item')
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.itersize = None
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        if 'dynamo_sync_state' in sql and sql.lstrip().startswith('SELECT'):
+            self.rows = [(self.conn.watermark,)] if self.conn.watermark else []
+        elif 'dynamo_sync_state' in sql:
+            self.conn.watermark = max(self.conn.watermark or params[1], params[1])
+        else:
+            self.rows = list(self.conn.deliveries)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakePostgres:
+    """Conexión mínima: la tabla deliveries y el watermark de dynamo_sync_state"""
+
+    def __init__(self, deliveries):
+        self.deliveries = deliveries
+        self.watermark = None
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_delivery_item_omite_nulos():
+    item = delivery_item((1, None, 'FL000001', None, None, None, BASE))
+    assert item == {'delivery_id': '1', 'tracking_number': 'FL000001', 'status': 'pending',
+                    'source_version': source_version(BASE)}
+    assert source_version(BASE + timedelta(microseconds=1)) == source_version(BASE) + 1
+
+
+def test_reintento_con_la_misma_version_no_escribe(aws):
+    item = delivery_item(row(1, 'pending', BASE))
+    assert write_incremental([item]) == {'written': 1, 'unchanged': 0, 'errors': 0}
+    assert write_incremental([item]) == {'written': 0, 'unchanged': 1, 'errors': 0}
+
+
+def test_version_vieja_no_pisa_la_nueva(aws):
+    newer = delivery_item(row(1, 'delivered', BASE + timedelta(minutes=5), BASE + timedelta(minutes=4)))
+    older = delivery_item(row(1, 'pending', BASE))
+    assert write_incremental([newer, older]) == {'written': 1, 'unchanged': 1, 'errors': 0}
+    item = stored(1)
+    assert item['status'] == 'delivered'
+    assert item['source_version'] == newer['source_version']
+
+
+def test_corrida_releida_es_idempotente(aws):
+    pg = FakePostgres([row(i, 'pending', BASE + timedelta(seconds=i)) for i in range(1, 21)])
+    first = DynamoSync(pg, workers=4).run()
+    assert first['written'] == 20 and first['errors'] == 0
+    assert pg.watermark == BASE + timedelta(seconds=20)
+
+    # La incremental relee el margen de solapamiento: nada cambia
+    second = DynamoSync(pg, workers=4).run()
+    assert second['written'] == 0 and second['unchanged'] == 20
+
+    pg.deliveries[4] = row(5, 'delivered', BASE + timedelta(minutes=10), BASE + timedelta(minutes=9))
+    third = DynamoSync(pg, workers=4).run()
+    assert third['written'] == 1 and third['unchanged'] == 19
+    assert stored(5)['status'] == 'delivered'
@@ -0,0 +1,133 @@
+"""ETL completo (avance3/avance3_dw.py) contra DuckDB en memoria
+
+El origen OLTP también es DuckDB en memoria con las tablas de
+CreacionBD_fleetlogix.sql que lee el ETL, así el extract corre su SQL real.
+"""
+
+import warnings
+from datetime import datetime, timedelta
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+duckdb = pytest.importorskip('duckdb')
+
+from dw_backends import DuckDBBackend
+
+START = datetime(2024, 5, 1, 8, 0)
+
+SOURCE_DDL = """
+CREATE MACRO to_regclass(name) AS NULL;
+CREATE TABLE vehicles (vehicle_id INTEGER, license_plate VARCHAR, vehicle_type VARCHAR, capacity_kg DECIMAL(10,2),
+    fuel_type VARCHAR, acquisition_date DATE, status VARCHAR);
+CREATE TABLE drivers (driver_id INTEGER, employee_code VARCHAR, first_name VARCHAR, last_name VARCHAR,
+    license_number VARCHAR, license_expiry DATE, phone VARCHAR, hire_date DATE, status VARCHAR);
+CREATE TABLE routes (route_id INTEGER, route_code VARCHAR, origin_city VARCHAR, destination_city VARCHAR,
+    distance_km DECIMAL(10,2), estimated_duration_hours DECIMAL(5,2), toll_cost DECIMAL(10,2));
+CREATE TABLE trips (trip_id INTEGER, vehicle_id INTEGER, driver_id INTEGER, route_id INTEGER,
+    departure_datetime TIMESTAMP, arrival_datetime TIMESTAMP, fuel_consumed_liters DECIMAL(10,2),
+    total_weight_kg DECIMAL(10,2), status VARCHAR);
+CREATE TABLE deliveries (delivery_id INTEGER, trip_id INTEGER, tracking_number VARCHAR, customer_name VARCHAR,
+    delivery_address VARCHAR, package_weight_kg DECIMAL(10,2), scheduled_datetime TIMESTAMP,
+    delivered_datetime TIMESTAMP, delivery_status VARCHAR, recipient_signature BOOLEAN);
+"""
+
+
+@pytest.fixture
+def source():
+    """OLTP con 2 vehículos, 2 conductores, 2 rutas y 6 viajes de 4 entregas (3 entregadas) en 2 días"""
+    conn = duckdb.connect(':memory:')
+    conn.execute(SOURCE_DDL)
+    conn.executemany("INSERT INTO vehicles VALUES (?, ?, 'Camión Mediano', 5000, 'diesel', DATE '2021-01-10', 'active')",
+                     [(1, 'ABC123'), (2, 'XYZ789')])
+    conn.executemany("INSERT INTO drivers VALUES (?, ?, ?, 'Pérez', ?, DATE '2027-01-01', '300', DATE '2020-03-01', 'active')",
+                     [(1, 'EMP001', 'Ana', 'LIC1'), (2, 'EMP002', 'Luis', 'LIC2')])
+    conn.executemany("INSERT INTO routes VALUES (?, ?, 'Bogotá', ?, ?, 3.5, ?)",
+                     [(1, 'R-001', 'Medellín', 415, 60000), (2, 'R-002', 'Tunja', 140, 20000)])
+    delivery_id = 0
+    for trip_id in range(1, 7):
+        departure = START + timedelta(hours=4 * (trip_id - 1))
+        conn.execute("INSERT INTO trips VALUES (?, ?, ?, ?, ?, ?, ?, 800, 'completed')", [
+            trip_id, trip_id % 2 + 1, trip_id % 2 + 1, trip_id % 2 + 1,
+            departure, departure + timedelta(hours=4), 40 + trip_id
+        ])
+        for stop in range(4):
+            delivery_id += 1
+            scheduled = departure + timedelta(minutes=45 * (stop + 1))
+            conn.execute("INSERT INTO deliveries VALUES (?, ?, ?, ?, 'Calle 1', ?, ?, ?, ?, ?)", [
+                delivery_id, trip_id, f'FL{delivery_id:06d}', f'Cliente {delivery_id % 5}',
+                10 + delivery_id, scheduled, scheduled + timedelta(minutes=10 * stop),
+                'delivered' if stop < 3 else 'pending', stop % 2 == 0
+            ])
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def etl(source, tmp_path, monkeypatch):
+    # avance3_dw configura logging con etl_pipeline.log en el directorio actual
+    monkeypatch.chdir(tmp_path)
+    from avance3_dw import FleetLogixETL
+    etl = FleetLogixETL(DuckDBBackend(':memory:').connect())
+    etl.pg_conn = source
+    yield etl
+    etl.dw_conn.close()
+
+
+def run(etl):
+    """extract -> transform -> dimensiones -> hechos -> totales, como run_etl"""
+    etl.populate_dim_date()
+    etl.populate_dim_time()
+    with warnings.catch_warnings():
+        # pandas avisa que sólo prueba read_sql con SQLAlchemy/sqlite3
+        warnings.simplefilter('ignore', UserWarning)
+        df = etl.extract_daily_data()
+    df = etl.transform_data(df)
+    etl.load_dimensions(df)
+    etl.load_facts(df)
+    etl._calculate_daily_totals()
+    return df
+
+
+def test_etl_completo(etl):
+    df = run(etl)
+    # El extract toma las entregadas desde el último día programado menos 1 día: todas
+    assert etl.metrics['errors'] == 0
+    assert etl.metrics['records_extracted'] == len(df) == 18
+    assert etl.metrics['records_loaded'] == 18
+
+    facts = etl.dw_conn.fetch_df("SELECT * FROM fact_deliveries")
+    assert sorted(facts['delivery_id']) == sorted(df['delivery_id'])
+    for column in ('vehicle_key', 'driver_key', 'route_key', 'customer_key'):
+        assert facts[column].notna().all(), column
+
+    totals = etl.dw_conn.fetch_df(
+        "SELECT * FROM daily_delivery_totals ORDER BY date_key"
+    ).set_index('date_key')
+    expected = facts.groupby('date_key').agg(
+        total_deliveries=('delivery_id', 'count'),
+        on_time_deliveries=('is_on_time', 'sum'),
+        total_revenue=('revenue_per_delivery', 'sum'),
+    )
+    assert list(totals.index) == list(expected.index) == [20240501, 20240502]
+    assert list(totals['total_deliveries']) == list(expected['total_deliveries'])
+    assert list(totals['on_time_deliveries']) == list(expected['on_time_deliveries'])
+    assert [float(v) for v in totals['total_revenue']] == pytest.approx(list(expected['total_revenue']))
+    assert list(totals['total_delayed'] + totals['on_time_deliveries']) == list(totals['total_deliveries'])
+
+    operations = etl.dw_conn.fetch_df("SELECT * FROM v_operations_deliveries")
+    assert len(operations) == 18
+    assert set(operations['route_code']) == {'R-001', 'R-002'}
+    assert set(operations['conductor']) == {'Ana Pérez', 'Luis Pérez'}
+    sales = etl.dw_conn.fetch_df("SELECT * FROM v_sales_deliveries")
+    assert len(sales) == 18
+
+
+def test_totales_diarios_idempotentes(etl):
+    run(etl)
+    before = etl.dw_conn.fetch_df("SELECT date_key, total_deliveries, total_revenue FROM daily_delivery_totals")
+    # Reprocesar el mismo batch reemplaza los días tocados en lugar de duplicarlos
+    etl._calculate_daily_totals()
+    after = etl.dw_conn.fetch_df("SELECT date_key, total_deliveries, total_revenue FROM daily_delivery_totals")
+    pd.testing.assert_frame_equal(before.sort_values('date_key').reset_index(drop=True),
+                                  after.sort_values('date_key').reset_index(drop=True))
@@ -0,0 +1,53 @@
+"""Exportación de hechos al Data Lake (avance3/lake_export.py) sobre un directorio local"""
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from lake_export import LAKE_COLUMNS, PARTITION_FILE, export_fact_partitions
+
+
+def delivery(delivery_id, scheduled='2024-05-01 09:00', weight=10.0):
+    row = {column: None for column in LAKE_COLUMNS}
+    row.update({
+        'delivery_id': delivery_id, 'trip_id': 1, 'tracking_number': f'FL{delivery_id:06d}',
+        'vehicle_id': 1, 'driver_id': 1, 'route_id': 1,
+        'customer_name': 'Cliente', 'destination_city': 'Bogotá',
+        'package_weight_kg': weight, 'distance_km': 12.5, 'fuel_consumed_liters': 1.5,
+        'scheduled_datetime': scheduled, 'delivered_datetime': scheduled,
+        'delivery_time_minutes': 30, 'delay_minutes': 0, 'is_on_time': True,
+        'delivery_status': 'delivered'
+    })
+    return row
+
+
+def read_partition(root, date_key):
+    return pq.read_table(root / f'date_key={date_key}' / PARTITION_FILE).to_pandas()
+
+
+def test_exporta_una_particion_por_fecha(tmp_path):
+    df = pd.DataFrame([delivery(1), delivery(2), delivery(3, '2024-05-02 10:00')])
+    assert export_fact_partitions(df, str(tmp_path), batch_id=1) == 3
+    assert sorted(read_partition(tmp_path, 20240501)['delivery_id']) == [1, 2]
+    assert list(read_partition(tmp_path, 20240502)['delivery_id']) == [3]
+
+
+def test_reexportar_cuenta_solo_filas_nuevas_o_modificadas(tmp_path):
+    export_fact_partitions(pd.DataFrame([delivery(1)]), str(tmp_path), batch_id=1)
+
+    # Una fila nueva en una partición no vacía: 1, no el tamaño de la partición
+    assert export_fact_partitions(pd.DataFrame([delivery(2)]), str(tmp_path), batch_id=2) == 1
+    # Re-exportar sin cambios (otro lote): 0
+    assert export_fact_partitions(pd.DataFrame([delivery(1), delivery(2)]), str(tmp_path), batch_id=3) == 0
+    # Un valor modificado: 1, y la última carga gana
+    assert export_fact_partitions(pd.DataFrame([delivery(2, weight=11.0)]), str(tmp_path), batch_id=4) == 1
+
+    partition = read_partition(tmp_path, 20240501).set_index('delivery_id')
+    assert len(partition) == 2
+    assert partition.loc[2, 'package_weight_kg'] == 11.0
+    assert partition.loc[2, 'etl_batch_id'] == 4
+
+
+def test_exportar_vacio(tmp_path):
+    assert export_fact_partitions(pd.DataFrame(columns=LAKE_COLUMNS), str(tmp_path), batch_id=1) == 0
@@ -0,0 +1,185 @@
+"""Despacho de alertas de desvío (AlertDispatcher, publish_alerts) con moto"""
+
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from benchmark_lambda import event_for
+
+DEVIATED = {
+    'vehicle_id': 'VH-001',
+    'driver_id': 'DRV-001',
+    'route_id': 'R-001',
+    'current_location': {'lat': 4.90, 'lon': -74.40}
+}
+
+
+def alert(vehicle_id='VH-001', timestamp='2024-05-01T10:00:00+00:00'):
+    return {
+        'vehicle_id': vehicle_id,
+        'timestamp': timestamp,
+        'driver_id': 'DRV-001',
+        'route_id': 'R-001',
+        'deviation_km': 12.5,
+        'current_location': {'lat': 4.90, 'lon': -74.40},
+        'alert_type': 'ROUTE_DEVIATION'
+    }
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'PublishBatch')
+
+
+class FailingSNS:
+    """publish_batch que lanza los errores indicados y después delega en el cliente real"""
+
+    def __init__(self, real, errors):
+        self.real = real
+        self.errors = list(errors)
+        self.calls = 0
+
+    def publish_batch(self, **params):
+        self.calls += 1
+        if self.errors:
+            raise client_error(self.errors.pop(0))
+        return self.real.publish_batch(**params)
+
+
+class FakeLambda:
+    """invoke asíncrono: guarda los eventos como haría Lambda antes del 202"""
+
+    def __init__(self):
+        self.events = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        assert InvocationType == 'Event'
+        self.events.append((FunctionName, json.loads(Payload)))
+        return {'StatusCode': 202}
+
+
+@pytest.fixture
+def subscriber(handler):
+    """Cola SQS suscrita al tópico: devuelve los mensajes publicados"""
+    sqs = handler.get_client('sqs')
+    queue_url = sqs.create_queue(QueueName='alertas')['QueueUrl']
+    queue_arn = sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=['QueueArn'])['Attributes']['QueueArn']
+    handler.get_client('sns').subscribe(TopicArn=handler.ALERTS_TOPIC_ARN, Protocol='sqs', Endpoint=queue_arn)
+
+    def received():
+        messages = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10).get('Messages', [])
+        return [json.loads(json.loads(m['Body'])['Message']) for m in messages]
+    return received
+
+
+@pytest.fixture
+def no_sleep(handler, monkeypatch):
+    monkeypatch.setattr(handler.time, 'sleep', lambda seconds: None)
+
+
+def window_of(handler, vehicle_id):
+    item = handler.get_table('alerts_history').get_item(
+        Key={'vehicle_id': vehicle_id, 'timestamp': handler.ALERT_STATE_SORT_KEY}
+    ).get('Item', {})
+    return item.get('ROUTE_DEVIATION_notified_at')
+
+
+def test_desvio_publica_antes_de_responder(handler, subscriber, capsys):
+    body = json.loads(handler.lambda_alerta_desvio(event_for(DEVIATED), None)['body'])
+    assert body['alert_status'] == 'published'
+    assert body['alert_sent'] is True
+    assert [m['vehicle_id'] for m in subscriber()] == ['VH-001']
+    # Métricas EMF en el log de la misma invocación
+    assert '"AlertsPublished": 1' in capsys.readouterr().out
+
+    # Sigue fuera de ruta: sin transición no hay alerta nueva
+    body = json.loads(handler.lambda_alerta_desvio(event_for(DEVIATED), None)['body'])
+    assert body['is_deviated'] is True
+    assert body['alert_status'] is None
+    assert body['alert_sent'] is False
+    assert subscriber() == []
+
+
+def test_dos_contenedores_notifican_una_vez(handler, load_handler, subscriber):
+    other = load_handler()
+    assert handler.alert_dispatcher.dispatch([alert()]) == ['published']
+    assert other.alert_dispatcher.dispatch([alert()]) == ['deduplicated']
+    assert len(subscriber()) == 1
+
+
+def test_lote_suprime_repetidos_del_mismo_vehiculo(handler, subscriber):
+    statuses = handler.alert_dispatcher.dispatch([alert('VH-001'), alert('VH-002'), alert('VH-001')])
+    assert statuses == ['published', 'published', 'suppressed']
+    assert sorted(m['vehicle_id'] for m in subscriber()) == ['VH-001', 'VH-002']
+
+
+def test_publish_reintenta_errores_transitorios(handler, monkeypatch, no_sleep, subscriber):
+    sns = FailingSNS(handler.get_client('sns'), ['Throttling', 'InternalError'])
+    monkeypatch.setitem(handler._clients, 'sns', sns)
+    published, failed = handler.publish_alerts([alert()], handler.ALERTS_TOPIC_ARN)
+    assert (published, failed) == (1, [])
+    assert sns.calls == 3
+    assert len(subscriber()) == 1
+
+
+def test_error_no_reintentable_libera_la_ventana(handler, monkeypatch, no_sleep, subscriber):
+    sns = FailingSNS(handler.get_client('sns'), ['AuthorizationError'])
+    monkeypatch.setitem(handler._clients, 'sns', sns)
+    assert handler.alert_dispatcher.dispatch([alert()]) == ['failed']
+    assert sns.calls == 1
+    assert window_of(handler, 'VH-001') is None
+
+    # El reintento no queda suprimido ni deduplicado
+    assert handler.alert_dispatcher.dispatch([alert()]) == ['published']
+    assert len(subscriber()) == 1
+
+
+def test_por_defecto_entrega_a_la_publicadora(load_handler, monkeypatch):
+    monkeypatch.delenv('ALERT_DISPATCH_MODE')
+    assert load_handler().alert_dispatcher.mode == 'async'
+
+
+def test_modo_async_entrega_a_la_publicadora(handler, monkeypatch, subscriber):
+    invoker = FakeLambda()
+    monkeypatch.setitem(handler._clients, 'lambda', invoker)
+    monkeypatch.setattr(handler.alert_dispatcher, 'mode', 'async')
+
+    body = json.loads(handler.lambda_alerta_desvio(event_for(DEVIATED), None)['body'])
+    assert body['alert_status'] == 'handed_off'
+    assert body['alert_sent'] is False
+    # El request no tocó alerts_history ni SNS: eso lo hace la publicadora
+    assert window_of(handler, 'VH-001') is None
+    [(function_name, event)] = invoker.events
+    assert function_name == handler.ALERTS_PUBLISHER_FUNCTION
+    assert subscriber() == []
+
+    assert handler.lambda_publicar_alertas(event, None) == {'published': 1}
+    assert window_of(handler, 'VH-001') is not None
+    assert [m['vehicle_id'] for m in subscriber()] == ['VH-001']
+
+
+def test_entrega_fallida_libera_la_ventana_del_contenedor(handler, monkeypatch, no_sleep):
+    class Unavailable:
+        def invoke(self, **params):
+            raise client_error('ServiceException')
+
+    monkeypatch.setitem(handler._clients, 'lambda', Unavailable())
+    monkeypatch.setattr(handler.alert_dispatcher, 'mode', 'async')
+    assert handler.alert_dispatcher.dispatch([alert()]) == ['failed']
+    monkeypatch.setitem(handler._clients, 'lambda', FakeLambda())
+    assert handler.alert_dispatcher.dispatch([alert()]) == ['handed_off']
+
+
+def test_reintento_de_la_publicadora_no_duplica(handler, monkeypatch, no_sleep, subscriber):
+    event = {'alerts': [alert('VH-001'), alert('VH-002')]}
+    sns = FailingSNS(handler.get_client('sns'), ['AuthorizationError'])
+    monkeypatch.setitem(handler._clients, 'sns', sns)
+    with pytest.raises(RuntimeError):
+        handler.lambda_publicar_alertas(event, None)
+    assert window_of(handler, 'VH-001') is None
+
+    # Lambda reintenta el mismo evento
+    monkeypatch.setitem(handler._clients, 'sns', sns.real)
+    assert handler.lambda_publicar_alertas(event, None) == {'published': 2}
+    assert handler.lambda_publicar_alertas(event, None) == {'deduplicated': 2}
+    assert len(subscriber()) == 2
@@ -0,0 +1,185 @@
+"""Desvíos con histéresis (lambda_evaluar_desvios, lambda_alerta_desvio) con moto"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from botocore.exceptions import ClientError
+
+START = datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc)
+# Waypoint 50 de R-001 y una dirección que se aleja de la ruta
+BASE = np.array([5.45, -74.82])
+AWAY = np.array([0.0148, 0.016]) / np.hypot(0.0148, 0.016)
+
+
+def location_at(handler, km):
+    """Punto a km de R-001 (bisección sobre la distancia del índice de la ruta)"""
+    route, _ = handler.get_route_index('R-001')
+    low, high = 0.0, 0.2
+    for _ in range(60):
+        middle = (low + high) / 2
+        if route.distance_km(*(BASE + middle * AWAY)) < km:
+            low = middle
+        else:
+            high = middle
+    lat, lon = BASE + low * AWAY
+    return {'lat': float(lat), 'lon': float(lon)}
+
+
+def position(handler, km, minute, vehicle_id='VH-H'):
+    return {
+        'vehicle_id': vehicle_id,
+        'driver_id': 'DRV-001',
+        'route_id': 'R-001',
+        'current_location': location_at(handler, km),
+        'timestamp': (START + timedelta(minutes=minute)).isoformat()
+    }
+
+
+def evaluate(handler, positions):
+    response = handler.lambda_evaluar_desvios({'body': json.dumps({'positions': positions})}, None)
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])
+
+
+def sqs_event(bodies):
+    return {'Records': [{'messageId': f'msg-{i}', 'body': body} for i, body in enumerate(bodies)]}
+
+
+def failures(response):
+    return sorted(f['itemIdentifier'] for f in response['batchItemFailures'])
+
+
+def stored_state(handler, vehicle_id):
+    return handler.get_table('alerts_history').get_item(
+        Key={'vehicle_id': vehicle_id, 'timestamp': handler.ALERT_STATE_SORT_KEY}
+    ).get('Item', {})
+
+
+def epoch(minute):
+    return (START + timedelta(minutes=minute)).timestamp()
+
+
+class RejectingSNS:
+    def publish_batch(self, **params):
+        raise ClientError({'Error': {'Code': 'AuthorizationError', 'Message': 'denegado'}}, 'PublishBatch')
+
+
+def test_histeresis_ignora_el_ruido_alrededor_del_umbral(handler):
+    distances = [4, 6, 4, 5.5, 2.5, 4, 7]
+    # El lote llega desordenado: se recorre por timestamp
+    body = evaluate(handler, [position(handler, km, minute) for minute, km in reversed(list(enumerate(distances)))])
+    assert [e['event'] for e in body['events']] == ['OFF_ROUTE_ENTER', 'OFF_ROUTE_EXIT', 'OFF_ROUTE_ENTER']
+    assert [e['deviation_km'] for e in body['events']] == pytest.approx([6.0, 2.5, 7.0], abs=0.01)
+    # La segunda entrada cae dentro de la ventana de supresión
+    assert body['alerts'] == {'published': 1, 'suppressed': 1}
+    assert body['off_route'] == 1
+    state = stored_state(handler, 'VH-H')
+    assert state['off_route'] is True
+    assert float(state['off_route_at']) == pytest.approx(epoch(6))
+
+
+def test_puntos_atrasados_se_descartan(handler):
+    assert [e['event'] for e in evaluate(handler, [position(handler, 6, 10)])['events']] == ['OFF_ROUTE_ENTER']
+    body = evaluate(handler, [position(handler, 1, 5)])
+    assert body['late'] == 1
+    assert body['events'] == []
+    assert body['off_route'] == 0  # el punto atrasado no se evaluó
+    state = stored_state(handler, 'VH-H')
+    assert state['off_route'] is True
+    assert float(state['off_route_at']) == pytest.approx(epoch(10))
+
+
+def test_contenedor_que_pierde_la_carrera_relee_el_estado(handler, load_handler):
+    other = load_handler()
+    evaluate(handler, [position(handler, 6, 0)])
+    # Otro contenedor lee la entrada y registra una salida posterior
+    assert [e['event'] for e in evaluate(other, [position(other, 1, 20)])['events']] == ['OFF_ROUTE_EXIT']
+
+    # El primero, con estado viejo, intenta guardar una salida anterior: pierde
+    body = evaluate(handler, [position(handler, 1, 10)])
+    assert body['failed'] == []
+    assert 'VH-H' not in handler._geofence_state
+    state = stored_state(handler, 'VH-H')
+    assert state['off_route'] is False
+    assert float(state['off_route_at']) == pytest.approx(epoch(20))
+
+    # Y la próxima invocación parte del estado guardado por el otro
+    assert [e['event'] for e in evaluate(handler, [position(handler, 6, 30)])['events']] == ['OFF_ROUTE_ENTER']
+
+
+def test_alerta_fallida_no_guarda_el_estado(handler, monkeypatch):
+    monkeypatch.setattr(handler.time, 'sleep', lambda seconds: None)
+    monkeypatch.setitem(handler._clients, 'sns', RejectingSNS())
+    bodies = [
+        json.dumps(position(handler, 6, 0, 'VH-A')),
+        json.dumps(position(handler, 1, 0, 'VH-B')),
+        '{bad'
+    ]
+    response = handler.lambda_evaluar_desvios(sqs_event(bodies), None)
+    assert response['alerts'] == {'failed': 1}
+    assert response['failed'] == ['VH-A']
+    assert failures(response) == ['msg-0', 'msg-2']
+    # Ni la transición ni la ventana de la alerta quedaron guardadas
+    assert set(stored_state(handler, 'VH-A')) == {'vehicle_id', 'timestamp'}
+    assert not handler._geofence_state['VH-A']['off_route']
+
+    # El reintento vuelve a ver la entrada y esta vez la alerta sale
+    monkeypatch.undo()
+    response = handler.lambda_evaluar_desvios(sqs_event(bodies[:1]), None)
+    assert [e['event'] for e in response['events']] == ['OFF_ROUTE_ENTER']
+    assert response['alerts'] == {'published': 1}
+    assert failures(response) == []
+    assert stored_state(handler, 'VH-A')['off_route'] is True
+
+
+def test_estado_sin_guardar_reintenta_sin_perder_ni_duplicar_la_alerta(handler, load_handler, monkeypatch):
+    def unavailable(vehicle_id, state):
+        raise ClientError({'Error': {'Code': 'InternalServerError', 'Message': 'caído'}}, 'UpdateItem')
+
+    monkeypatch.setattr(handler, '_save_geofence_state', unavailable)
+    bodies = [json.dumps(position(handler, 6, 0, 'VH-A'))]
+    response = handler.lambda_evaluar_desvios(sqs_event(bodies), None)
+    # La alerta salió antes de guardar el estado
+    assert response['alerts'] == {'published': 1}
+    assert failures(response) == ['msg-0']
+    assert 'VH-A' not in handler._geofence_state
+
+    # El reintento (en otro contenedor) ve otra vez la transición; la ventana compartida evita el duplicado
+    other = load_handler()
+    response = other.lambda_evaluar_desvios(sqs_event(bodies), None)
+    assert [e['event'] for e in response['events']] == ['OFF_ROUTE_ENTER']
+    assert response['alerts'] == {'deduplicated': 1}
+    assert failures(response) == []
+    assert stored_state(handler, 'VH-A')['off_route'] is True
+
+
+def test_estado_sin_leer_devuelve_los_registros(handler, throttle_reads):
+    client = throttle_reads('alerts_history')
+    bodies = [json.dumps(position(handler, 6, 0, 'VH-A')), json.dumps(position(handler, 1, 0, 'VH-B'))]
+    response = handler.lambda_evaluar_desvios(sqs_event(bodies), None)
+    assert client.calls == handler.BATCH_MAX_ATTEMPTS
+    assert response['unavailable'] == ['VH-A', 'VH-B']
+    assert response['evaluated'] == 0
+    assert failures(response) == ['msg-0', 'msg-1']
+
+
+def test_alerta_desvio_usa_la_misma_histeresis(handler):
+    def ping(km, minute):
+        body = position(handler, km, minute)
+        response = handler.lambda_alerta_desvio({'httpMethod': 'POST', 'body': json.dumps(body)}, None)
+        return json.loads(response['body'])
+
+    entered = ping(6, 0)
+    assert (entered['is_deviated'], entered['event'], entered['alert_status']) == (True, 'OFF_ROUTE_ENTER', 'published')
+    assert entered['threshold_km'] == handler.GEOFENCE_ENTER_KM
+    # Entre los umbrales sigue fuera de ruta, sin alerta nueva
+    inside = ping(4, 1)
+    assert (inside['is_deviated'], inside['event'], inside['alert_status']) == (True, None, None)
+
+    # El estado es el mismo que usa evaluar-desvios
+    assert evaluate(handler, [position(handler, 4.5, 2)])['events'] == []
+    exited = ping(2.5, 3)
+    assert (exited['is_deviated'], exited['event']) == (False, 'OFF_ROUTE_EXIT')
+    assert ping(1, 2)['late'] is True
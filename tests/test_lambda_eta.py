@@ -0,0 +1,54 @@
+"""Modelo de ETA de lambda_calcular_eta (perfil de velocidades o velocidad actual) con moto"""
+
+import json
+
+import numpy as np
+import pytest
+
+PING = {
+    'vehicle_id': 'VH-001',
+    'current_location': {'lat': 4.65, 'lon': -74.08},
+    'destination': {'lat': 6.25, 'lon': -75.56},
+    'current_speed_kmh': 62.5
+}
+
+
+def calcular_eta(handler):
+    response = handler.lambda_calcular_eta({'body': json.dumps(PING)}, None)
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])
+
+
+@pytest.fixture
+def profile_file(tmp_path):
+    """Perfil con 50 km/h en todas las franjas (sólo la fila global)"""
+    path = tmp_path / 'speed_profile.npz'
+    np.savez(path, route_codes=np.array([], dtype=str), speeds=np.full((1, 7, 24), 50.0))
+    return path
+
+
+def test_sin_perfil_usa_la_velocidad_actual(handler):
+    body = calcular_eta(handler)
+    assert body['eta_model'] == 'current_speed'
+    assert body['estimated_minutes'] == round(body['distance_remaining_km'] / 62.5 * 60)
+
+
+def test_con_perfil_usa_el_perfil_una_vez_por_request(load_handler, monkeypatch, profile_file):
+    monkeypatch.setenv('SPEED_PROFILE_URI', str(profile_file))
+    handler = load_handler()
+    calls = []
+    get_speed_profile = handler.get_speed_profile
+    monkeypatch.setattr(handler, 'get_speed_profile', lambda: calls.append(1) or get_speed_profile())
+
+    body = calcular_eta(handler)
+    assert body['eta_model'] == 'speed_profile'
+    assert body['estimated_minutes'] == pytest.approx(body['distance_remaining_km'] / 50 * 60, abs=1)
+    # eta_model sale de compute_etas, no de una segunda consulta al perfil
+    assert len(calls) == 1
+
+
+def test_perfil_configurado_que_no_carga_informa_velocidad_actual(load_handler, monkeypatch, tmp_path):
+    monkeypatch.setenv('SPEED_PROFILE_URI', str(tmp_path / 'no_existe.npz'))
+    body = calcular_eta(load_handler())
+    assert body['eta_model'] == 'current_speed'
+    assert body['eta'] != 'No disponible'
@@ -0,0 +1,92 @@
+"""Ingesta de posiciones por lotes (lambda_ingesta_tracking) con moto"""
+
+import base64
+import json
+
+from benchmark_lambda import vehicle_position
+
+
+def sqs_event(bodies):
+    return {'Records': [{'messageId': f'msg-{i}', 'body': body} for i, body in enumerate(bodies)]}
+
+
+def failures(response):
+    return [f['itemIdentifier'] for f in response['batchItemFailures']]
+
+
+def test_sqs_reporta_mensajes_ilegibles_e_invalidos(handler):
+    event = sqs_event([
+        json.dumps(vehicle_position(0, 0)),
+        '{bad',
+        json.dumps({'vehicle_id': 'VH-X'}),
+        json.dumps([vehicle_position(1, 0), vehicle_position(2, 0)])
+    ])
+    response = handler.lambda_ingesta_tracking(event, None)
+    assert response['received'] == 5
+    assert response['rejected'] == 2
+    assert response['written'] == 6  # LATEST + histórico de 3 vehículos
+    assert failures(response) == ['msg-1', 'msg-2']
+
+
+def test_kinesis_lote_valido_sin_fallos(handler):
+    event = {'Records': [
+        {'kinesis': {'sequenceNumber': str(i), 'data': base64.b64encode(json.dumps(vehicle_position(i, 0)).encode()).decode()}}
+        for i in range(3)
+    ]}
+    response = handler.lambda_ingesta_tracking(event, None)
+    assert response['written'] == 6
+    assert response['batchItemFailures'] == []
+
+
+def test_error_de_escritura_devuelve_los_mensajes_sin_relanzar(handler):
+    handler.get_client('dynamodb').delete_table(TableName='vehicle_tracking')
+    event = sqs_event([json.dumps(vehicle_position(0, 0)), '{bad', json.dumps(vehicle_position(1, 0))])
+    response = handler.lambda_ingesta_tracking(event, None)
+    assert response['written'] == 0
+    assert sorted(failures(response)) == ['msg-0', 'msg-1', 'msg-2']
+    # El estado del contenedor no avanzó: el reintento vuelve a escribir
+    assert not handler._tracking_state
+
+
+def test_api_gateway_sin_posiciones_validas(handler):
+    response = handler.lambda_ingesta_tracking({'body': json.dumps({'positions': [{'x': 1}]})}, None)
+    assert response['statusCode'] == 400
+
+
+def test_estado_sin_leer_tras_reintentos_devuelve_el_lote(handler, throttle_reads):
+    client = throttle_reads('vehicle_tracking')
+    response = handler.lambda_ingesta_tracking(sqs_event([json.dumps(vehicle_position(0, 0))]), None)
+    assert client.calls == handler.BATCH_MAX_ATTEMPTS
+    assert failures(response) == ['msg-0']
+
+
+def history_keys(handler, vehicle_id):
+    items = handler.get_table('vehicle_tracking').query(
+        KeyConditionExpression='vehicle_id = :v', ExpressionAttributeValues={':v': vehicle_id}
+    )['Items']
+    return sorted(item['timestamp'] for item in items if item['timestamp'] != handler.LATEST_SORT_KEY)
+
+
+def test_timestamp_se_guarda_en_utc_y_el_invalido_se_rechaza(handler):
+    bogota = dict(vehicle_position(0, 0), timestamp='2024-05-01T05:00:00-05:00')
+    # 1 h después en UTC: como texto sin normalizar ordenaría antes que el primero
+    later = dict(vehicle_position(0, 0), timestamp='2024-05-01T11:00:00+00:00')
+    event = sqs_event([
+        json.dumps(bogota),
+        json.dumps(dict(vehicle_position(1, 0), timestamp='ayer')),
+        json.dumps(dict(vehicle_position(2, 0), timestamp=1714557600)),
+        json.dumps(later)
+    ])
+    response = handler.lambda_ingesta_tracking(event, None)
+    assert response['rejected'] == 2
+    assert failures(response) == ['msg-1', 'msg-2']
+    assert history_keys(handler, 'VH-000') == ['2024-05-01T10:00:00+00:00', '2024-05-01T11:00:00+00:00']
+    assert history_keys(handler, 'VH-001') == []
+
+
+def test_sin_timestamp_usa_la_hora_de_llegada_en_utc(handler):
+    position = vehicle_position(0, 0)
+    del position['timestamp']
+    handler.lambda_ingesta_tracking(sqs_event([json.dumps(position)]), None)
+    [key] = history_keys(handler, 'VH-000')
+    assert key.endswith('+00:00')
@@ -0,0 +1,33 @@
+"""Caché y precarga de rutas del handler de Lambda con moto"""
+
+
+def test_precarga_en_la_primera_invocacion(handler, monkeypatch):
+    monkeypatch.setattr(handler, 'ROUTE_WARMUP_IDS', ['R-001', 'R-DENSE', 'R-NO-EXISTE'])
+    assert len(handler.route_cache) == 0  # nada al importar
+
+    handler.lambda_alerta_desvio({'body': '{}'}, None)
+    assert len(handler.route_cache) == 2
+    _, status = handler.get_route_index('R-DENSE')
+    assert status == 'hit'
+
+
+def test_batch_get_keys_reintenta_con_tope(handler, throttle_reads, monkeypatch):
+    client = throttle_reads('routes_waypoints')
+    sleeps = []
+    monkeypatch.setattr(handler.time, 'sleep', sleeps.append)
+
+    keys = [{'route_id': f'R-{i}'} for i in range(150)]
+    items, unprocessed = handler.batch_get_keys('routes_waypoints', keys)
+    assert items == []
+    assert unprocessed == keys
+    assert client.calls == 2 * handler.BATCH_MAX_ATTEMPTS
+    assert max(sleeps) <= 1.0
+
+
+def test_warm_up_routes_informa_solo_fallos(handler, throttle_reads, capsys):
+    assert handler.warm_up_routes(['R-001']) == 1
+    assert capsys.readouterr().out == ''
+
+    throttle_reads('routes_waypoints')
+    assert handler.warm_up_routes(['R-DENSE']) == 0
+    assert 'sin precargar' in capsys.readouterr().out
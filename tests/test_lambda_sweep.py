@@ -0,0 +1,72 @@
+"""Barrido de entregas pendientes (lambda_verificar_entrega con sweep) con moto"""
+
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+
+@pytest.fixture
+def deliveries(handler):
+    """30 entregas: viajes 10, 11 y 12; las de índice par siguen pendientes"""
+    with handler.get_table('deliveries_status').batch_writer() as writer:
+        for i in range(30):
+            writer.put_item(Item={
+                'delivery_id': f'D-{i}',
+                'trip_id': 10 + i // 10,
+                'tracking_number': f'FL{i:06d}',
+                'status': 'pending' if i % 2 == 0 else 'delivered'
+            })
+    return handler
+
+
+class QueryFails:
+    """Cliente de la tabla cuyo Query falla con el error dado; Scan va a moto"""
+
+    def __init__(self, real, message):
+        self.real = real
+        self.message = message
+
+    def query(self, **params):
+        raise ClientError({'Error': {'Code': 'ValidationException', 'Message': self.message}}, 'Query')
+
+    def scan(self, **params):
+        return self.real.scan(**params)
+
+
+def sweep(handler, **body):
+    response = handler.lambda_verificar_entrega({'body': json.dumps(dict(body, sweep=True))}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_trip_id_como_texto_se_convierte(deliveries):
+    status, body = sweep(deliveries, trip_id='12')
+    assert status == 200
+    assert (body['source'], body['pending'], body['complete']) == ('index', 5, True)
+    assert sweep(deliveries, trip_id=11.0)[1]['pending'] == 5
+    assert sweep(deliveries)[1]['pending'] == 15
+
+
+@pytest.mark.parametrize('trip_id', ['doce', '12.5', 12.5, True, [12]])
+def test_trip_id_invalido_es_400(deliveries, trip_id):
+    assert sweep(deliveries, trip_id=trip_id)[0] == 400
+
+
+def test_sin_indice_cae_al_scan(deliveries, monkeypatch):
+    table = deliveries.get_table('deliveries_status')
+    monkeypatch.setattr(table.meta, 'client', QueryFails(
+        table.meta.client, 'The table does not have the specified index: status-trip_id-index'
+    ))
+    status, body = sweep(deliveries, trip_id=12)
+    assert status == 200
+    assert (body['source'], body['pending']) == ('scan', 5)
+
+
+def test_otro_validation_exception_no_cae_al_scan(deliveries, monkeypatch):
+    table = deliveries.get_table('deliveries_status')
+    monkeypatch.setattr(table.meta, 'client', QueryFails(
+        table.meta.client, 'One or more parameter values were invalid: Condition parameter type does not match schema type'
+    ))
+    status, body = sweep(deliveries, trip_id=12)
+    assert status == 500
+    assert 'schema type' in body['error']
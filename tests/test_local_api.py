@@ -0,0 +1,82 @@
+"""Emulador local de API Gateway (avance4/local_api.py): contenedores por función"""
+
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip('moto')
+
+from local_api import create_server
+
+
+@pytest.fixture
+def api():
+    server = create_server('127.0.0.1', 0, deliveries=50, concurrency=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    yield server, f'http://{host}:{port}/{server.stage}'
+    server.shutdown()
+    server.server_close()
+    server.mock.stop()
+
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_ruta_no_configurada(api):
+    _, base = api
+    assert post(f'{base}/no-existe', {})[0] == 403
+
+
+def test_requests_concurrentes_usan_contenedores_separados(api):
+    server, base = api
+    pool = server.routes['/verificar-entrega']
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(
+            lambda i: post(f'{base}/verificar-entrega', {'delivery_id': str(i % 50 + 1)}), range(40)
+        ))
+    assert all(status == 200 for status, _ in results)
+    assert 1 <= pool.cold_starts <= 2
+    # Cada contenedor es una instancia propia del módulo (cachés y clientes separados)
+    assert len({id(container) for container in pool._idle}) == pool.cold_starts
+    # Otra función tiene sus propios contenedores
+    assert server.routes['/calcular-eta'].cold_starts == 0
+
+
+def test_un_contenedor_atiende_una_invocacion_a_la_vez(monkeypatch):
+    import time
+    import types
+
+    import local_api
+
+    def fake_container(path, name):
+        state = {'active': 0, 'max_active': 0}
+        lock = threading.Lock()
+
+        def entry(event, context):
+            with lock:
+                state['active'] += 1
+                state['max_active'] = max(state['max_active'], state['active'])
+            time.sleep(0.01)
+            with lock:
+                state['active'] -= 1
+            return {'statusCode': 200}
+        return types.SimpleNamespace(entry=entry, state=state)
+
+    monkeypatch.setattr(local_api, 'load_module', fake_container)
+    pool = local_api.ContainerPool('fn', 'entry', max_containers=3)
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        list(executor.map(lambda _: pool.invoke({}, None), range(30)))
+    assert pool.cold_starts == 3
+    assert all(container.state['max_active'] == 1 for container in pool._idle)
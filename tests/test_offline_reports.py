@@ -0,0 +1,127 @@
+"""Reportes offline (avance2/offline_reports.py) sobre un snapshot Parquet pequeño"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+pytest.importorskip('duckdb')
+
+import offline_reports
+from offline_reports import SNAPSHOT_TABLES, OfflineReports, rows_match
+from report_service import DriverRank, VehicleTypeCount
+
+KG = pa.decimal128(10, 2)
+
+# tabla -> (esquema, filas) con las columnas que leen OFFLINE_REPORTS
+FIXTURES = {
+    'vehicles': ([('vehicle_id', pa.int32()), ('vehicle_type', pa.string())], [
+        (1, 'Camión Grande'), (2, 'Camión Grande'), (3, 'Van')
+    ]),
+    'drivers': ([('driver_id', pa.int32()), ('first_name', pa.string()), ('last_name', pa.string()),
+                 ('license_number', pa.string()), ('license_expiry', pa.date32()), ('status', pa.string())], [
+        (1, 'Ana', 'Pérez', 'LIC1', date(2030, 1, 1), 'active'),
+        (2, 'Luis', 'Gómez', 'LIC2', date(2030, 1, 1), 'active'),
+        (3, 'Eva', 'Ruiz', 'LIC3', date(2030, 1, 1), 'inactive')
+    ]),
+    'routes': ([('route_id', pa.int32()), ('origin_city', pa.string()), ('destination_city', pa.string()),
+                ('distance_km', KG)], [
+        (1, 'Bogotá', 'Medellín', Decimal('415.00')), (2, 'Bogotá', 'Tunja', Decimal('140.00'))
+    ]),
+    'trips': ([('trip_id', pa.int32()), ('vehicle_id', pa.int32()), ('driver_id', pa.int32()),
+               ('route_id', pa.int32()), ('departure_datetime', pa.timestamp('us')),
+               ('fuel_consumed_liters', KG), ('status', pa.string())], [
+        (1, 1, 1, 1, datetime(2024, 5, 1, 8), Decimal('40.00'), 'completed'),
+        (2, 2, 2, 1, datetime(2024, 5, 1, 9), Decimal('42.00'), 'completed'),
+        (3, 3, 3, 2, datetime(2024, 5, 2, 8), Decimal('15.00'), 'completed')
+    ]),
+    'deliveries': ([('delivery_id', pa.int32()), ('trip_id', pa.int32()), ('package_weight_kg', KG),
+                    ('scheduled_datetime', pa.timestamp('us')), ('delivered_datetime', pa.timestamp('us'))], [
+        # Conductores 1 y 2 empatan: 30 kg, 1 de 2 a tiempo
+        (1, 1, Decimal('10.00'), datetime(2024, 5, 1, 10), datetime(2024, 5, 1, 9, 50)),
+        (2, 1, Decimal('20.00'), datetime(2024, 5, 1, 11), datetime(2024, 5, 1, 11, 30)),
+        (3, 2, Decimal('15.00'), datetime(2024, 5, 1, 10), datetime(2024, 5, 1, 10)),
+        (4, 2, Decimal('15.00'), datetime(2024, 5, 1, 11), datetime(2024, 5, 1, 12)),
+        (5, 3, Decimal('5.50'), datetime(2024, 5, 2, 10), datetime(2024, 5, 2, 10))
+    ]),
+    'maintenance': ([('vehicle_id', pa.int32()), ('cost', KG)], [
+        (1, Decimal('1000.00')), (3, Decimal('300.00'))
+    ])
+}
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    for table in SNAPSHOT_TABLES:
+        fields, rows = FIXTURES[table]
+        schema = pa.schema(fields)
+        columns = list(zip(*rows))
+        pq.write_table(pa.Table.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+        ), tmp_path / f'{table}.parquet')
+    return tmp_path
+
+
+@pytest.fixture
+def offline(snapshot_dir):
+    reports = OfflineReports(str(snapshot_dir))
+    yield reports
+    reports.close()
+
+
+def test_reportes_sobre_el_snapshot(offline):
+    assert offline.run('vehicles_by_type') == (VehicleTypeCount('Camión Grande', 2), VehicleTypeCount('Van', 1))
+    ranking = offline.run('driver_ranking', 20)
+    assert [(r.rank, r.driver_id) for r in ranking] == [(1, 1), (1, 2), (3, 3)]
+    assert all(isinstance(r, DriverRank) for r in ranking)
+
+
+def test_coincide_con_postgres_aunque_cambie_el_orden_de_los_empates(offline):
+    # Lo que devolvería ReportService: Decimal, y el empate en el otro orden
+    expected = (
+        DriverRank(1, 2, 'Luis Gómez', Decimal('30.00'), 1, 2, Decimal('50.00')),
+        DriverRank(1, 1, 'Ana Pérez', Decimal('30.00'), 1, 2, Decimal('50.00')),
+        DriverRank(3, 3, 'Eva Ruiz', Decimal('5.50'), 1, 1, Decimal('100.00'))
+    )
+    assert rows_match(expected, offline.run('driver_ranking', 20))
+    assert not rows_match(expected[:2], offline.run('driver_ranking', 20))
+
+
+def test_rows_match():
+    rows = ((1, 'a', Decimal('10.25')), (2, 'b', 3.0))
+    assert rows_match(rows, rows)
+    assert rows_match(rows, tuple(reversed(rows)))
+    # Decimal de PostgreSQL contra DOUBLE de DuckDB con error de redondeo
+    assert rows_match(((1, 'a', Decimal('66.6667')),), ((1, 'a', 66.66666666666667),))
+    assert rows_match(((1, 'a', Decimal('1234567.89')),), ((1, 'a', 1234567.8900001),))
+    assert not rows_match(((1, 'a', Decimal('10.25')),), ((1, 'a', 10.26),))
+    assert not rows_match(((1, 'a', 1.0),), ((1, 'b', 1.0),))
+    assert not rows_match(rows, rows[:1])
+
+
+def test_snapshot_sin_check_no_abre_report_service(snapshot_dir, monkeypatch):
+    class NoService:
+        def __init__(self):
+            raise AssertionError('ReportService sólo se usa con --check')
+
+    class Reader:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    class Router:
+        def reader(self):
+            return reader
+
+    reader = Reader()
+    taken = []
+    monkeypatch.setattr(offline_reports, 'ReportService', NoService)
+    monkeypatch.setattr(offline_reports, 'router_from_env', lambda config: Router())
+    monkeypatch.setattr(offline_reports, 'snapshot_tables', lambda conn, path: taken.append((conn, path)))
+
+    assert offline_reports.main(['--snapshot', '--snapshot-dir', str(snapshot_dir)]) == 0
+    assert taken == [(reader, str(snapshot_dir))]
+    assert reader.closed
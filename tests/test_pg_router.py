@@ -0,0 +1,95 @@
+"""Enrutamiento a réplicas (avance2/pg_router.py) con conexiones simuladas"""
+
+import psycopg2
+import pytest
+
+import pg_router
+from pg_router import ConnectionRouter
+
+
+class FakeConnection:
+    def __init__(self, host, lag):
+        self.host = host
+        self.lag = lag
+        self.closed = False
+        self.readonly = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def set_session(self, readonly=False):
+        self.readonly = readonly
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql):
+        if isinstance(self.conn.lag, Exception):
+            raise self.conn.lag
+
+    def fetchone(self):
+        return (self.conn.lag,)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    """host -> lag (o excepción) de cada servidor; registra las conexiones abiertas"""
+    lags = {}
+    opened = []
+
+    def connect(**config):
+        lag = lags[config['host']]
+        if isinstance(lag, psycopg2.OperationalError):
+            raise lag
+        conn = FakeConnection(config['host'], lag)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(pg_router.psycopg2, 'connect', connect)
+    return lags, opened
+
+
+def make_router(replicas, max_lag=30.0):
+    return ConnectionRouter({'host': 'primary', 'user': 'u'}, [f'host={h}' for h in replicas], max_lag)
+
+
+def test_usa_la_replica_con_lag_aceptable(servers):
+    lags, _ = servers
+    lags.update({'primary': 0.0, 'r1': 2.0})
+    conn = make_router(['r1']).reader()
+    assert conn.host == 'r1' and conn.readonly
+
+
+def test_descarta_replica_atrasada(servers):
+    lags, opened = servers
+    lags.update({'primary': 0.0, 'r1': float('inf'), 'r2': 1.0})
+    router = make_router(['r1', 'r2'])
+    assert router.reader().host == 'r2'
+    assert opened[0].closed
+
+
+def test_error_midiendo_lag_cierra_la_conexion_y_sigue(servers):
+    lags, opened = servers
+    lags.update({'primary': 0.0, 'r1': psycopg2.errors.InsufficientPrivilege('denegado')})
+    router = make_router(['r1'])
+    conn = router.reader()
+    assert conn.host == 'primary' and conn.readonly
+    assert opened[0].host == 'r1' and opened[0].closed
+    assert router.stats['fallback'] == 1
+
+
+def test_replica_caida_va_al_primario(servers):
+    lags, _ = servers
+    lags.update({'primary': 0.0, 'r1': psycopg2.OperationalError('caída')})
+    assert make_router(['r1']).reader().host == 'primary'
@@ -0,0 +1,204 @@
+"""Servicio de reportes (avance2/report_service.py) con conexiones simuladas"""
+
+import pytest
+
+import report_service
+from report_service import CityDeliveries, ReportCache, ReportService
+
+
+class FakeConnection:
+    """
+    Registra el SQL ejecutado. results: patrón del SQL -> filas (o función de
+    los parámetros que devuelve las filas), como respondería PostgreSQL.
+    """
+
+    def __init__(self, results):
+        self.results = results
+        self.executed = []
+        self.closed = False
+        self.autocommit = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((sql, params))
+        for pattern, rows in self.conn.results.items():
+            if pattern in sql:
+                self.rows = rows(params) if callable(rows) else list(rows)
+                return
+        self.rows = []
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(report_service.time, 'monotonic', clock)
+    return clock
+
+
+def service_with(results, has_high_water=True, **kwargs):
+    conn = FakeConnection(dict({'to_regclass': [(has_high_water,)], 'FROM high_water_marks': [('t1', 10)]}, **results))
+    return ReportService(conn, **kwargs), conn
+
+
+def executed(conn, pattern):
+    return [(sql, params) for sql, params in conn.executed if pattern in sql]
+
+
+def test_cache_lru_descarta_la_menos_usada(clock):
+    cache = ReportCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == (True, 1)
+    cache.put('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.get('c') == (True, 3)
+    assert (len(cache), cache.hits, cache.misses) == (2, 3, 1)
+
+
+def test_cache_expira_por_ttl(clock):
+    cache = ReportCache(ttl_seconds=10)
+    cache.put('a', 1)
+    clock.now += 10
+    assert cache.get('a') == (True, 1)
+    clock.now += 0.5
+    assert cache.get('a') == (False, None)
+    assert len(cache) == 0
+
+
+def test_run_prepara_una_vez_con_el_ancla_de_high_water(clock):
+    service, conn = service_with({'EXECUTE': [('Bogotá', 12, 340.5)]})
+    assert service.deliveries_by_city(2) == (CityDeliveries('Bogotá', 12, 340.5),)
+    assert service.deliveries_by_city(3) == (CityDeliveries('Bogotá', 12, 340.5),)
+
+    [(prepare, _)] = executed(conn, 'PREPARE')
+    assert prepare.startswith('PREPARE report_deliveries_by_city(integer) AS')
+    assert '$1' in prepare and '{' not in prepare
+    assert "where table_name = 'trips' and column_name = 'departure_datetime'" in prepare
+    assert executed(conn, 'EXECUTE') == [
+        ('EXECUTE report_deliveries_by_city(%s)', (2,)),
+        ('EXECUTE report_deliveries_by_city(%s)', (3,))
+    ]
+
+
+def test_run_sin_high_water_usa_max_y_sin_parametros_no_usa_parentesis(clock):
+    service, conn = service_with({'EXECUTE': []}, has_high_water=False)
+    service.deliveries_by_city(2)
+    service.vehicles_by_type()
+    [prepare, _] = [sql for sql, _ in executed(conn, 'PREPARE')]
+    assert '(select max(departure_datetime) from trips)' in prepare
+    assert 'high_water_marks' not in prepare
+    assert executed(conn, 'EXECUTE report_vehicles_by_type') == [('EXECUTE report_vehicles_by_type', ())]
+    # Sin high_water_marks sólo el TTL invalida la caché
+    assert executed(conn, 'FROM high_water_marks') == []
+
+
+def test_hit_de_cache_no_llega_a_postgres(clock):
+    service, conn = service_with({'EXECUTE': [('camión', 3)]})
+    first = service.vehicles_by_type()
+    count = len(conn.executed)
+    assert service.vehicles_by_type() is first
+    assert len(conn.executed) == count
+    assert (service.cache.hits, service.cache.misses) == (1, 1)
+
+
+def test_check_high_water_vacia_la_cache_cuando_cambia_el_token(clock):
+    tokens = [('t1', 10)]
+    service, conn = service_with({
+        'EXECUTE': [('camión', 3)],
+        'FROM high_water_marks': lambda params: [tokens[-1]]
+    }, hw_check_seconds=5)
+    service.vehicles_by_type()
+    assert len(executed(conn, 'FROM high_water_marks')) == 1
+    assert executed(conn, 'FROM high_water_marks')[0][0] == (
+        'SELECT max(updated_at), sum(row_count) FROM high_water_marks'
+    )
+
+    # Dentro del intervalo no se consulta aunque haya cambiado
+    tokens.append(('t2', 11))
+    clock.now += 4
+    service.vehicles_by_type()
+    assert len(executed(conn, 'FROM high_water_marks')) == 1
+    assert len(executed(conn, 'EXECUTE')) == 1
+
+    # Vencido el intervalo, el token nuevo vacía la caché
+    clock.now += 1
+    service.vehicles_by_type()
+    assert len(executed(conn, 'FROM high_water_marks')) == 2
+    assert len(executed(conn, 'EXECUTE')) == 2
+
+    # Mismo token: la caché se conserva
+    clock.now += 5
+    service.vehicles_by_type()
+    assert len(executed(conn, 'FROM high_water_marks')) == 3
+    assert len(executed(conn, 'EXECUTE')) == 2
+
+
+
+# Modo aproximado: estimaciones sobre filas de muestra conocidas
+def test_entregas_aproximadas_escalan_el_conteo(clock):
+    service, conn = service_with({'EXECUTE': [('Ana Pérez', 8), ('Luis Gómez', 50)]})
+    result = service.driver_monthly_deliveries_approx(months=6, sample_pct=10, method='bernoulli', seed=7)
+    # total = n / q; error = 1.96 * sqrt(n (1 - q)) / q; promedio = total // meses
+    assert [tuple(r) for r in result] == [('Luis Gómez', 500, 131, 83), ('Ana Pérez', 80, 53, 13)]
+    assert executed(conn, 'EXECUTE') == [('EXECUTE report_driver_deliveries_sample_bernoulli(%s, %s, %s)', (6, 10, 7))]
+
+
+def test_ranking_aproximado_horvitz_thompson_y_empates(clock):
+    service, _ = service_with({'EXECUTE': [
+        # driver_id, nombre, muestra, Σkg, Σkg², a tiempo
+        (3, 'C', 10, 200, 5000, 10),
+        (1, 'A', 40, 800, 20000, 30),
+        (4, 'D', 5, 300, 18000, 5),
+        (2, 'B', 20, 600, 19000, 10),
+    ]})
+    result = service.driver_ranking_approx(sample_pct=25)
+    # Puntaje = (Σkg / q) × proporción a tiempo: A 2400, B 1200, D 1200, C 800
+    assert [(r.rank, r.driver_id) for r in result] == [(1, 1), (2, 2), (2, 4), (4, 3)]
+    a = result[0]
+    assert (a.total_kg, a.on_time_pct, a.sample_size) == (3200.0, 75.0, 40)
+    # Errores al 95%: 1.96 √((1-q) Σkg²) / q y 1.96 √(p (1-p) / n · (1-q))
+    assert a.total_kg_error == 960.2
+    assert a.on_time_pct_error == 11.62
+    c = result[3]
+    assert (c.total_kg, c.total_kg_error, c.on_time_pct, c.on_time_pct_error) == (800.0, 480.1, 100.0, 0.0)
+    assert [r.driver_id for r in service.driver_ranking_approx(limit=2, sample_pct=25)] == [1, 2]
+
+
+@pytest.mark.parametrize('approx', ['driver_monthly_deliveries_approx', 'driver_ranking_approx'])
+def test_metodo_o_porcentaje_invalido(clock, approx):
+    service, conn = service_with({'EXECUTE': []})
+    with pytest.raises(ValueError, match='tablesample'):
+        getattr(service, approx)(method='tablesample')
+    with pytest.raises(ValueError):
+        getattr(service, approx)(sample_pct=0)
+    # Se rechaza antes de conectar o preparar nada
+    assert conn.executed == []
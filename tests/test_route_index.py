@@ -0,0 +1,87 @@
+"""Índice espacial de rutas (RouteIndex de avance4/04_lambda_handler.py)"""
+
+import numpy as np
+import pytest
+
+from benchmark_lambda import HANDLER_FILE, load_module
+
+lh = load_module(HANDLER_FILE, 'lambda_handler_geometry')
+
+
+def zigzag_route(n=2000):
+    """Ruta densa en zigzag: ejercita la grilla (más de ROUTE_BRUTE_FORCE_SEGMENTS segmentos)"""
+    i = np.arange(n)
+    return np.column_stack([4.65 + i * 0.0005, -74.08 - i * 0.0004 + 0.002 * np.sin(i / 15)])
+
+
+def brute_force_km(route, lat, lon):
+    """Distancia exacta contra todos los segmentos, sin grilla"""
+    return route._nearest(route._project(lat, lon), np.arange(len(route)))[0]
+
+
+def test_haversine_bogota_medellin():
+    assert lh.haversine_km(4.711, -74.0721, 6.2442, -75.5812) == pytest.approx(239.4, abs=1.0)
+    assert lh.haversine_km(4.7, -74.1, 4.7, -74.1) == 0.0
+
+
+def test_geometria_codificada_conserva_la_ruta():
+    coords = zigzag_route(500)
+    waypoints = [{'lat': lat, 'lon': lon} for lat, lon in coords]
+    item = lh.build_route_item('R-X', waypoints)
+    decoded = lh.decode_route_geometry(item['polyline'])
+    assert item['waypoint_count'] == 500
+    assert np.abs(decoded - coords).max() < 1e-5  # float32: ~1 m
+    assert len(lh.route_index_from_item(item)) == 499
+
+
+def test_ruta_sin_waypoints():
+    with pytest.raises(ValueError):
+        lh.route_index_from_item({'route_id': 'R-X'})
+
+
+def test_locate_coincide_con_busqueda_completa():
+    route = lh.RouteIndex(zigzag_route())
+    assert len(route) > lh.ROUTE_BRUTE_FORCE_SEGMENTS
+    rng = np.random.default_rng(7)
+    lats = rng.uniform(4.5, 5.8, 300)
+    lons = rng.uniform(-75.0, -73.9, 300)
+    for lat, lon in zip(lats, lons):
+        planar = brute_force_km(route, lat, lon)
+        # haversine y plano local difieren en metros a estas escalas
+        assert route.distance_km(lat, lon) == pytest.approx(planar, rel=1e-3, abs=1e-3)
+
+
+def test_punto_sobre_la_ruta_y_recorrido():
+    coords = zigzag_route()
+    route = lh.RouteIndex(coords)
+    distance, along = route.locate(*coords[1000])
+    assert distance < 0.01
+    assert along == pytest.approx(route.cumulative_km[1000], abs=0.01)
+
+
+def test_remaining_km():
+    coords = zigzag_route()
+    route = lh.RouteIndex(coords)
+    remaining = route.remaining_km(*coords[200], *coords[1800])
+    assert remaining == pytest.approx(route.cumulative_km[1800] - route.cumulative_km[200], rel=1e-3)
+    # Destino ya recorrido: la ruta no describe lo que falta
+    assert route.remaining_km(*coords[1800], *coords[200]) is None
+
+
+@pytest.mark.parametrize('n', [50, 2000])
+def test_distances_km_por_lotes_coincide_con_locate(n):
+    # 50 puntos: todos contra todos; 2000: bloques por celda con cota de vértices ancla
+    route = lh.RouteIndex(zigzag_route(n))
+    rng = np.random.default_rng(11)
+    coords = zigzag_route(n)
+    near = coords[rng.integers(0, n, 200)] + rng.normal(0, 0.02, (200, 2))
+    far = np.column_stack([rng.uniform(3.0, 7.5, 200), rng.uniform(-77.0, -72.0, 200)])
+    points = np.vstack([near, far])
+    batch = route.distances_km(points[:, 0], points[:, 1])
+    single = np.array([route.locate(lat, lon)[0] for lat, lon in points])
+    np.testing.assert_allclose(batch, single, rtol=1e-9, atol=1e-9)
+
+
+def test_distances_km_lote_vacio():
+    route = lh.RouteIndex(zigzag_route(500))
+    assert len(route.distances_km([], [])) == 0